@@ -2,16 +2,26 @@
     extensions and reusable packages as well as the configuration settings.
 '''
 
-from flask import Flask, jsonify
+from flask import Flask, current_app, jsonify
 from flask_jwt_extended import JWTManager
 
 from instance.config import app_config
-from app.models.blacklist import Blacklist
 from .db import db
+from . import counters, ingredients  # noqa (registers the model events)
+from .conditional import ConditionalRequests
+from .hashing import password_hasher
+from .query_stats import QueryStats
+from .replicas import read_replicas
+from .response_cache import ResponseCache
+from .revocation_cache import RevocationCache
 from flask_cors import CORS
 
 cors = CORS()
 jwt = JWTManager()
+revocation_cache = RevocationCache()
+query_stats = QueryStats()
+conditional_requests = ConditionalRequests()
+response_cache = ResponseCache()
 
 
 def create_app(config_name):
@@ -28,10 +38,16 @@ def create_app(config_name):
     app.config.from_pyfile('config.py')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['JWT_BLACKLIST_ENABLED'] = True
-    app.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access']
+    app.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access', 'refresh']
     db.init_app(app)
     cors.init_app(app)
     jwt.init_app(app)
+    revocation_cache.init_app(app)
+    password_hasher.init_app(app)
+    query_stats.init_app(app)
+    response_cache.init_app(app)
+    conditional_requests.init_app(app)
+    read_replicas.init_app(app)
 
     from app.apis import apiv1_blueprint as api_v1
     from app.apis import apiv2_blueprint as api_v2
@@ -45,16 +61,20 @@ def create_app(config_name):
 @jwt.token_in_blacklist_loader
 def check_if_token_in_blacklist(decrypted_token):
     """ Call back function that checks if a the token is valid on all the
-        endpoints that require a token
+        endpoints that require a token.
+        Only refresh tokens are revoked. Access tokens are short-lived and
+        never looked up, except that the long-lived ones issued before
+        refresh tokens existed are refused so their holders log in again.
 
         :param decrypted_token: -- [description]
         :Return: Boolean
     """
-    jti = decrypted_token['jti']
+    if decrypted_token['type'] == 'access':
+        lifetime = decrypted_token['exp'] - decrypted_token['iat']
+        max_lifetime = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+        return lifetime > max_lifetime.total_seconds()
 
-    if Blacklist.query.filter_by(token=jti).first() is None:
-        return False
-    return True
+    return revocation_cache.is_revoked(decrypted_token['jti'])
 
 
 @jwt.revoked_token_loader
@@ -2,9 +2,12 @@ from flask import Blueprint, jsonify, make_response
 from flask_restplus import Api
 
 from app import jwt
+from ..serializers import output_json
+from .admin import api as ns_admin
 from .auth import api as ns_auth
 from .categories import api as ns_categories
 from .recipes import api as ns_recipes
+from .transfer import api as ns_transfer
 from .hello import api as ns_hello
 
 authorization = {
@@ -29,9 +32,13 @@ api_2 = Api(apiv2_blueprint,
             version='2.0',
             description='Another API version')
 
+api.representation('application/json')(output_json)
+
 api.add_namespace(ns_auth)
 api.add_namespace(ns_categories)
 api.add_namespace(ns_recipes)
+api.add_namespace(ns_transfer)
+api.add_namespace(ns_admin)
 
 api_2.add_namespace(ns_hello)
 
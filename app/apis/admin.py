@@ -0,0 +1,95 @@
+''' This script handles the administrative endpoints '''
+
+from functools import wraps
+
+from flask import current_app, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_restplus import Namespace, Resource, reqparse
+
+from app import response_cache
+from app.db import db
+from app.hashing import password_hasher
+from app.pool import pool_stats
+from app.models.user import User
+from ..provisioning import FORMATS, read_users, provision_users
+
+api = Namespace('admin', description='Administering the service')
+
+BULK_PARSER = reqparse.RequestParser(bundle_errors=True)
+BULK_PARSER.add_argument('format', required=False, choices=FORMATS,
+                         default='ndjson', location='args',
+                         help='Try again: {error_msg}')
+
+
+def admin_required(func):
+    ''' Restricts an endpoint to admin users '''
+    @wraps(func)
+    @jwt_required
+    def wrapper(*args, **kwargs):
+        the_user = User.query.filter_by(user_id=get_jwt_identity()).first()
+        if the_user is None or not the_user.is_admin:
+            return {'message': 'You need to be an admin to access this '
+                               'page'}, 403
+        return func(*args, **kwargs)
+    return wrapper
+
+
+@api.route('/users/')
+class BulkUsers(Resource):
+    ''' This class provisions users in bulk '''
+
+    @api.expect(BULK_PARSER)
+    @api.response(200, 'Users were provisioned')
+    @admin_required
+    def post(self):
+        ''' This method creates users from a CSV or NDJSON request body.
+            Rows that are invalid or already exist are reported and skipped.
+            The passwords are hashed on the threads of the password hasher,
+            waiting for slots instead of being turned away.
+
+            :return: A dictionary with the counts and the rows not created
+        '''
+        args = BULK_PARSER.parse_args()
+        report = provision_users(
+            read_users(request.stream, args.format),
+            password_hasher.hash_many,
+            chunk_size=current_app.config['PROVISION_CHUNK_SIZE'])
+        created, failed = 0, []
+        for row in report:
+            if row['status'] == 'created':
+                created += 1
+            else:
+                failed.append(row)
+        return {'message': f'{created} users were created',
+                'created': created,
+                'failed': failed}, 200
+
+
+@api.route('/cache/')
+class CacheStats(Resource):
+    ''' This class reports on the response cache '''
+
+    @api.response(200, 'The cache statistics')
+    @admin_required
+    def get(self):
+        ''' This method returns the hits and misses of the response cache
+
+            :return: A dictionary with the backend, hits, misses and hit rate
+        '''
+        return response_cache.stats(), 200
+
+
+@api.route('/pool/')
+class PoolStats(Resource):
+    ''' This class reports on the database connection pool '''
+
+    @api.response(200, 'The pool statistics')
+    @admin_required
+    def get(self):
+        ''' This method returns the connections in use and the checkout
+            waits of the worker that answers
+
+            :return: A dictionary with the pool class, the worker pid and
+                the counters of the pool
+        '''
+        return pool_stats(db.engine), 200
@@ -1,11 +1,14 @@
 ''' This script handles user registration, login, logout and password reset '''
 
-from datetime import timedelta
+from datetime import datetime
 from flask_jwt_extended import (
-    get_jwt_identity, create_access_token, jwt_required, get_raw_jwt)
+    get_jwt_identity, create_access_token, create_refresh_token, jwt_required,
+    jwt_refresh_token_required, get_raw_jwt)
 from flask_restplus import fields, Namespace, Resource, reqparse
 
 
+from app import revocation_cache
+from app.hashing import HashingBusy
 from app.models.user import User
 from app.models.blacklist import Blacklist
 from ..db import db
@@ -43,6 +46,14 @@ AUTH_PARSER.add_argument('old_password', required=True)
 AUTH_PARSER.add_argument('new_password', required=True)
 
 
+@api.errorhandler(HashingBusy)
+def handle_hashing_busy(error):
+    ''' Return a custom message and 503 status code when too many passwords
+        are waiting to be hashed
+    '''
+    return {'message': 'The server is busy, try again shortly'}, 503
+
+
 @api.route('/register/')
 class UserRegistration(Resource):
     ''' This class registers a new user. '''
@@ -106,40 +117,63 @@ class UserLogin(Resource):
         username = args.username
         password = args.password
         username = username.lower()
-        if User.query.filter_by(username=username).first() is not None:
-            the_user = User.query.filter_by(username=username).first()
+        the_user = User.query.filter_by(username=username).first()
+        if the_user is not None:
             a_user = the_user.password_checker(password)
 
             if a_user:
-                expires = timedelta(days=365)
+                if the_user.password_needs_rehash():
+                    the_user.password_hasher(password)
+                    db.session.commit()
                 access_token = create_access_token(
-                    identity=the_user.user_id, expires_delta=expires)
+                    identity=the_user.user_id)
+                refresh_token = create_refresh_token(
+                    identity=the_user.user_id)
 
                 the_response = {
                     'status': 'successful Login',
                     'message': 'You have been signed in',
-                    'access_token': access_token
+                    'access_token': access_token,
+                    'refresh_token': refresh_token
                 }
                 return the_response, 200
             return {'message': 'Credentials do not match, try again'}, 401
         return {'message': 'Username does not exist, signup'}, 401
 
 
+@api.route('/refresh/')
+class TokenRefresh(Resource):
+    ''' This class issues a new access token for a refresh token. '''
+
+    @api.response(200, 'Token refreshed')
+    @jwt_refresh_token_required
+    def post(self):
+        ''' This method exchanges a valid refresh token for an access token
+            :return: A dictionary with a message and the access token
+        '''
+        access_token = create_access_token(identity=get_jwt_identity())
+        return {'message': 'Token refreshed',
+                'access_token': access_token}, 200
+
+
 @api.route('/logout/')
 class UserLogout(Resource):
     ''' This class logs out a currently logged in user. '''
 
     @api.response(200, 'You have been logged out')
-    @jwt_required
+    @jwt_refresh_token_required
     def delete(self):
         ''' This method logs out a logged in user
-            Checks if the logged users token is valid.
+            Revokes the refresh token the request was made with, the access
+            tokens issued with it expire on their own shortly after.
             :return: A dictionary with a message
         '''
-        jti = get_raw_jwt()['jti']
-        blacklisted = Blacklist(jti)
+        raw_jwt = get_raw_jwt()
+        jti = raw_jwt['jti']
+        blacklisted = Blacklist(jti, datetime.fromtimestamp(raw_jwt['exp']))
         db.session.add(blacklisted)
         db.session.commit()
+        revocation_cache.add(jti)
         the_response = {"message": "Successfully logged out"}
         return the_response, 200
 
@@ -1,15 +1,20 @@
 ''' This script handles the categories CRUD '''
 
-from flask import request, jsonify
+from flask import current_app, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_restplus import fields, Namespace, Resource, reqparse
-from sqlalchemy import func
+from sqlalchemy import func, select
 
-from app import db
+from app import db, response_cache
 from app.models.category import Category
-from ..serializers import CategorySchema
+from app.models.recipe import Recipe
+from app.models.user import User
+from .. import bulk
 from ..validation_helper import name_validator
-from ..get_helper import PER_PAGE_MAX, PER_PAGE_MIN
+from ..conditional import check_conditional, fingerprint
+from ..get_helper import (
+    PER_PAGE_MAX, PER_PAGE_MIN, dump_categories, expanded,
+    paginate_by_cursor, paginate_with_total)
 
 
 api = Namespace(
@@ -22,6 +27,14 @@ CATEGORY = api.model('Category', {
                                  description='category description')
 })
 
+BULK_CATEGORIES = api.model('BulkCategories', {
+    'categories': fields.List(fields.Nested(CATEGORY), required=True)
+})
+
+BULK_IDS = api.model('BulkCategoryIds', {
+    'ids': fields.List(fields.Integer, required=True)
+})
+
 PARSER = reqparse.RequestParser(bundle_errors=True)
 PARSER.add_argument('category_name', required=True,
                     help='Try again: {error_msg}')
@@ -34,13 +47,43 @@ EDIT_PARSER.add_argument('category_name', required=False,
 EDIT_PARSER.add_argument('description', required=False,
                          help='Try again: {error_msg}', default='')
 
-Q_PARSER = reqparse.RequestParser(bundle_errors=True)
+FIELDS_PARSER = reqparse.RequestParser(bundle_errors=True)
+FIELDS_PARSER.add_argument('fields', required=False, location='args',
+                           help='comma separated category fields to return')
+FIELDS_PARSER.add_argument('expand', required=False, location='args',
+                           help='relations to embed, recipes by default')
+
+Q_PARSER = FIELDS_PARSER.copy()
 Q_PARSER.add_argument('q', required=False,
                       help='search for word', location='args')
 Q_PARSER.add_argument('page', required=False, type=int,
                       help='Number of pages', location='args')
 Q_PARSER.add_argument('per_page', required=False, type=int,
                       help='categories per page', default=10, location='args')
+Q_PARSER.add_argument('cursor', required=False, location='args',
+                      help='page after this cursor, empty for the first page')
+
+
+def check_category_fingerprints(args, *criteria, collection=True,
+                                extra=()):
+    ''' Answers a conditional GET of categories, counting in the recipes
+        of the categories when they are embedded
+
+        :param dict args: The parsed fields and expand parameters
+        :param criteria: The filters picking the categories
+        :param bool collection: Whether the response lists categories
+        :param list extra: Scalar selects read in the same query
+        :return: A tuple of a 304 response or None, and the category count
+            followed by the extra values
+    '''
+    fingerprints = [fingerprint(Category, *criteria)]
+    if 'recipes' in expanded(args):
+        fingerprints.append(fingerprint(
+            Recipe, Recipe.category_id.in_(
+                db.session.query(Category.category_id).filter(*criteria))))
+    not_modified, counts = check_conditional(
+        fingerprints, collection, extra)
+    return not_modified, [counts[0]] + counts[len(fingerprints):]
 
 
 @api.route('/')
@@ -50,8 +93,10 @@ class Categories(Resource):
     @api.response(200, 'Category found successfully')
     @api.expect(Q_PARSER)
     @jwt_required
+    @response_cache.cached
     def get(self):
-        ''' This method returns all the categories
+        ''' This method returns all the categories, a numbered page at a time
+            or the page after a cursor
 
             :return: A dictionary of the category\'s properties
         '''
@@ -61,6 +106,12 @@ class Categories(Resource):
         the_categories = Category.query.filter_by(
             created_by=user_id).order_by("category_id desc")
         args = Q_PARSER.parse_args(request)
+        not_modified, (_, total) = check_category_fingerprints(
+            args, Category.created_by == user_id, extra=[
+                select([User.category_count]).where(
+                    User.user_id == user_id).as_scalar()])
+        if not_modified:
+            return not_modified
         q = args.get('q', '')
         page = args.get('page', 1)
         per_page = args.get('per_page', 10)
@@ -69,37 +120,51 @@ class Categories(Resource):
         if per_page > PER_PAGE_MAX:
             per_page = PER_PAGE_MAX
 
+        cursor = args.get('cursor')
+        if cursor is not None:
+            if q:
+                return {'message': 'Searches can only be paginated by '
+                                   'page'}, 400
+            try:
+                items, next_cursor = paginate_by_cursor(
+                    the_categories, Category.category_id, cursor, per_page)
+                categories = dump_categories(items, args)
+            except ValueError as error:
+                return {'message': str(error)}, 400
+            return {"categories": categories,
+                    "message": "These are your categories",
+                    "next_cursor": next_cursor}
+
         if q:
             q = q.lower()
             the_categories = Category.query.filter(
                 (Category.created_by == user_id),
                 (func.lower(Category.category_name).ilike("%" + q + "%")))
-            # print("qqqqqqqqqqqqqqqqqqqq", the_categories.all())
-            if the_categories.all():
-                categorieschema = CategorySchema(many=True)
-                the_categories = categorieschema.dump(the_categories)
-                # print("<<<<<<<<<<<<<<<<>>>>>>>>>>>>>",
-                #       the_categories.data)
-
-                response = {"categories": the_categories.data,
-                            "message": "These are the category search results"
-                            }
-                return response
-        pag_categories = the_categories.paginate(
-            page, per_page, error_out=False)
+            results = the_categories.all()
+            if not results:
+                return {'message': f'There are no categories on page {page}'}
+            try:
+                categories = dump_categories(results, args)
+            except ValueError as error:
+                return {'message': str(error)}, 400
+            response = {"categories": categories,
+                        "message": "These are the category search results"
+                        }
+            return response
+
+        pag_categories = paginate_with_total(
+            the_categories, page, per_page, total)
 
         pages = pag_categories.pages
         page = pag_categories.page
 
         if not pag_categories.items:
             return {'message': f'There are no categories on page {page}'}
-        paginated = []
-        for a_category in pag_categories.items:
-            paginated.append(a_category)
-        categoriesschema = CategorySchema(many=True)
-        all_categories = categoriesschema.dump(paginated)
-        # print("<><><><><><><><><><><><><><><>", all_categories.data)
-        response = {"categories": all_categories.data,
+        try:
+            all_categories = dump_categories(pag_categories.items, args)
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        response = {"categories": all_categories,
                     "message": "These are your categories",
                     "categoryPages": pages,
                     "categoryPage": page
@@ -109,6 +174,7 @@ class Categories(Resource):
     @api.expect(CATEGORY)
     @api.response(201, 'Category created successfully')
     @jwt_required
+    @response_cache.invalidates
     def post(self):
         ''' This method adds a new category to the DB
 
@@ -145,28 +211,87 @@ class Categories(Resource):
                 'more than one word'}, 400
 
 
+@api.route('/bulk/')
+class BulkCategories(Resource):
+    ''' This class creates and deletes many categories in one request '''
+
+    @api.expect(BULK_CATEGORIES, validate=False)
+    @api.response(200, 'The result of each category')
+    @jwt_required
+    @response_cache.invalidates
+    def post(self):
+        ''' This method creates the valid categories of a list in one
+            transaction and reports on each of them
+
+            :return: A dictionary with the count and the result of each item
+        '''
+        try:
+            items = bulk.read_items(
+                request.get_json(silent=True), 'categories',
+                current_app.config['BULK_MAX_ITEMS'])
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        results = bulk.create_categories(get_jwt_identity(), items)
+        created = sum(result['status'] == 'created' for result in results)
+        return {'message': f'{created} categories were created',
+                'created': created,
+                'results': results}, 200
+
+    @api.expect(BULK_IDS, validate=False)
+    @api.response(200, 'The result of each id')
+    @jwt_required
+    @response_cache.invalidates
+    def delete(self):
+        ''' This method deletes the categories with the ids of a list and
+            their recipes in one transaction
+
+            :return: A dictionary with the count and the result of each id
+        '''
+        try:
+            ids = bulk.read_items(request.get_json(silent=True), 'ids',
+                                  current_app.config['BULK_MAX_ITEMS'])
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        results = bulk.delete_categories(get_jwt_identity(), ids)
+        deleted = sum(result['status'] == 'deleted' for result in results)
+        return {'message': f'{deleted} categories were deleted',
+                'deleted': deleted,
+                'results': results}, 200
+
+
 @api.route('/<int:category_id>/')
 class Categoryy(Resource):
     ''' This class handles a single category GET, PUT AND DELETE functionality
     '''
 
     @api.response(200, 'Category found successfully')
+    @api.expect(FIELDS_PARSER)
     @jwt_required
+    @response_cache.cached
     def get(self, category_id):
         ''' This method returns a category '''
         user_id = get_jwt_identity()
+        args = FIELDS_PARSER.parse_args(request)
+        not_modified, (found,) = check_category_fingerprints(
+            args, Category.created_by == user_id,
+            Category.category_id == category_id, collection=False)
+        if not found:
+            return {'message': 'You don\'t have a category with id '
+                               f'{category_id}'}, 404
+        if not_modified:
+            return not_modified
         the_category = Category.query.filter_by(created_by=user_id,
                                                 category_id=category_id).first()
-
-        if the_category is None:
-            return {'message': f'You don\'t have a category with id {category_id}'}, 404
-        categoryschema = CategorySchema()
-        get_response = categoryschema.dump(the_category)
-        return jsonify(get_response.data)
+        try:
+            a_category, = dump_categories([the_category], args)
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        return a_category
 
     @api.expect(EDIT_PARSER)
     @api.response(204, 'Successfully edited')
     @jwt_required
+    @response_cache.invalidates
     def put(self, category_id):
         ''' This method edits a category.
 
@@ -211,6 +336,7 @@ class Categoryy(Resource):
 
     @api.response(204, 'Category was deleted')
     @jwt_required
+    @response_cache.invalidates
     def delete(self, category_id):
         ''' This method deletes a Category. The method is passed the category
             name in the url and it deletes the category that matches that name.
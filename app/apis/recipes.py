@@ -2,17 +2,23 @@
 
 ''' This script handles the recipes CRUD '''
 
-from flask import request
+from flask import current_app, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_restplus import fields, Namespace, Resource, reqparse
-from sqlalchemy import func
+from sqlalchemy import and_, select
 
-from app import db
+from app import db, response_cache
+from app.models.category import Category
 from app.models.recipe import Recipe
+from app.models.user import User
+from .. import bulk
+from ..conditional import check_conditional, fingerprint
 from ..validation_helper import name_validator
 from ..get_helper import (
-    manage_get_recipes, manage_get_recipe, PER_PAGE_MAX, PER_PAGE_MIN)
-from ..serializers import RecipeSchema
+    manage_get_recipes, manage_get_recipe, PER_PAGE_MAX, PER_PAGE_MIN,
+    THE_PAGE)
+from ..ingredients import pantry_recipes, parse_ingredients
+from ..serializers import recipe_serializer
 
 api = Namespace(
     'recipes', description='Creating, viewing, editing and deleting recipes')
@@ -23,6 +29,14 @@ recipe = api.model('Recipe', {
                                  description='Recipe ingredients'),
 })
 
+BULK_RECIPES = api.model('BulkRecipes', {
+    'recipes': fields.List(fields.Nested(recipe), required=True)
+})
+
+BULK_IDS = api.model('BulkRecipeIds', {
+    'ids': fields.List(fields.Integer, required=True)
+})
+
 RECIPE_PARSER = reqparse.RequestParser(bundle_errors=True)
 RECIPE_PARSER.add_argument(
     'recipe_name', required=True, help='Try again: {error_msg}')
@@ -39,6 +53,16 @@ Q_PARSER.add_argument(
     'page', type=int, help='Try again: {error_msg}', location='args')
 Q_PARSER.add_argument('per_page', type=int,
                       help='Try again: {error_msg}', location='args')
+Q_PARSER.add_argument('cursor', help='page after this cursor, empty for the '
+                      'first page', location='args')
+
+PANTRY_PARSER = reqparse.RequestParser(bundle_errors=True)
+PANTRY_PARSER.add_argument('ingredients', required=True, location='args',
+                           help='Comma separated ingredients you have')
+PANTRY_PARSER.add_argument(
+    'page', type=int, help='Try again: {error_msg}', location='args')
+PANTRY_PARSER.add_argument('per_page', type=int,
+                           help='Try again: {error_msg}', location='args')
 
 # Not consumed
 
@@ -50,18 +74,18 @@ class Recipess(Resource):
     @api.response(200, 'Success')
     @api.expect(Q_PARSER)
     @jwt_required
+    @response_cache.cached
     def get(self):
         ''' A method to get all the recipes
-            Returns all the recipes created by a user or a recipe that matches
-            a search keyword
+            Returns all the recipes created by a user or the ones whose name
+            or ingredients match the search words, best match first
 
-            :return: A recipe that matches the search or a list of recipe\'s
+            :return: A page of recipe\'s
         '''
         user_id = get_jwt_identity()
         the_recipes = Recipe.query.filter_by(created_by=user_id)
 
         args = Q_PARSER.parse_args(request)
-        q = args.get('q', ' ')
         #  page = args.get('page', THE_PAGE)
         per_page = args.get('per_page', PER_PAGE_MAX)
         if per_page is None or per_page < PER_PAGE_MIN:
@@ -69,14 +93,58 @@ class Recipess(Resource):
         if per_page > PER_PAGE_MAX:
             per_page = PER_PAGE_MAX
 
-        if q:
-            q = q.lower()
-            the_recipes = Recipe.query.filter(
-                (Recipe.created_by == user_id),
-                ((Recipe.recipe_name).ilike("%" + q + "%"))
-            )
+        not_modified, (_, total) = check_conditional(
+            [fingerprint(Recipe, Recipe.created_by == user_id)],
+            collection=True, extra=[select([User.recipe_count]).where(
+                User.user_id == user_id).as_scalar()])
+        if not_modified:
+            return not_modified
+        return manage_get_recipes(the_recipes, args, total)
+
 
-        return manage_get_recipes(the_recipes, args)
+@api.route('/pantry/')
+class Pantry(Resource):
+    ''' The class finds the recipes that can be cooked with what you have '''
+
+    @api.response(200, 'Success')
+    @api.expect(PANTRY_PARSER)
+    @jwt_required
+    @response_cache.cached
+    def get(self):
+        ''' A method to find recipes by the ingredients at hand.
+            Returns the user\'s recipes that use any of the ingredients, the
+            ones with the most of their ingredients covered first
+
+            :return: A page of recipe\'s with the ingredients matched
+        '''
+        user_id = get_jwt_identity()
+        args = PANTRY_PARSER.parse_args(request)
+        page = args.get('page') or THE_PAGE
+        per_page = args.get('per_page') or PER_PAGE_MAX
+        per_page = min(max(per_page, PER_PAGE_MIN), PER_PAGE_MAX)
+
+        not_modified, _ = check_conditional(
+            [fingerprint(Recipe, Recipe.created_by == user_id)],
+            collection=True)
+        if not_modified:
+            return not_modified
+
+        names = parse_ingredients(args.ingredients)
+        pag_recipes = pantry_recipes(user_id, names).paginate(
+            page, per_page, error_out=False)
+        if not pag_recipes.items:
+            return {'message': 'None of your recipes use these ingredients'}
+
+        the_recipes = []
+        for a_recipe, matched in pag_recipes.items:
+            the_recipe = recipe_serializer.dump(a_recipe)
+            the_recipe['matched'] = matched
+            the_recipe['missing'] = a_recipe.ingredient_count - matched
+            the_recipes.append(the_recipe)
+        return {"recipes": the_recipes,
+                "message": "These are the recipes you can cook",
+                "recipePages": pag_recipes.pages,
+                "recipePage": pag_recipes.page}
 
 # Consumed for view and search
 
@@ -88,14 +156,15 @@ class Recipes(Resource):
     @api.response(200, 'Success')
     @api.expect(Q_PARSER)
     @jwt_required
+    @response_cache.cached
     def get(self, category_id):
         ''' A method to get recipes in a category.
             Checks if a category ID exists and returns all the recipes in the
-            category or one with a recipe_name that matches a search keyword
+            category or the ones whose name or ingredients match the search
+            words, best match first
 
             :param int category_id: The category id to which the recipe belongs
-            :return: A recipe that matches the search keyword or all the
-            recipes in a category
+            :return: A page of the recipes in a category
         '''
 
         user_id = get_jwt_identity()
@@ -104,31 +173,27 @@ class Recipes(Resource):
         # print("the_recipes", the_recipes)
 
         args = Q_PARSER.parse_args(request)
-        q = args.get('q', ' ')
 
-        if not the_recipes.all():
+        # the counter tells an empty or missing category apart without
+        # loading its recipes
+        not_modified, (_, total) = check_conditional(
+            [fingerprint(Recipe, Recipe.created_by == user_id,
+                         Recipe.category_id == category_id)],
+            collection=True, extra=[select([Category.recipe_count]).where(
+                and_(Category.created_by == user_id,
+                     Category.category_id == category_id)).as_scalar()])
+        if not total:
             return {'message': f'No recipes in category {category_id}'}, 404
+        if not_modified:
+            return not_modified
 
-        if q:
-            q = q.lower()
-            the_recipes = Recipe.query.filter(
-                (Recipe.created_by == user_id),
-                (func.lower(Recipe.recipe_name).like("%" + q + "%"))
-            )
-            recipesschema = RecipeSchema(many=True)
-            search_recipes = recipesschema.dump(the_recipes)
-
-            response = {
-                "recipes": search_recipes.data,
-                "message": "These are your recipes",
-            }
-            return response
-        return manage_get_recipes(the_recipes, args)
+        return manage_get_recipes(the_recipes, args, total)
 
     # specifies the expected input fields
     @api.expect(recipe)
     @api.response(201, 'Success')
     @jwt_required
+    @response_cache.invalidates
     def post(self, category_id):
         ''' A method to create a recipe.
             Checks if a recipe id exists in the given category, if it doesn\'t
@@ -169,6 +234,63 @@ class Recipes(Resource):
                 'than one word'}, 400
 
 
+@api.route('/<int:category_id>/bulk/')
+class BulkRecipes(Resource):
+    ''' This class creates and deletes many recipes of a category in one
+        request
+    '''
+
+    @api.expect(BULK_RECIPES, validate=False)
+    @api.response(200, 'The result of each recipe')
+    @jwt_required
+    @response_cache.invalidates
+    def post(self, category_id):
+        ''' A method to create the valid recipes of a list in a category in
+            one transaction and report on each of them
+
+            :param int category_id: The category id to which the recipes belong
+            :return: A dictionary with the count and the result of each item
+        '''
+        user_id = get_jwt_identity()
+        if Category.query.filter_by(created_by=user_id,
+                                    category_id=category_id).first() is None:
+            return {'message': f'You don\'t have a category with id '
+                    f'{category_id}'}, 404
+        try:
+            items = bulk.read_items(
+                request.get_json(silent=True), 'recipes',
+                current_app.config['BULK_MAX_ITEMS'])
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        results = bulk.create_recipes(user_id, category_id, items)
+        created = sum(result['status'] == 'created' for result in results)
+        return {'message': f'{created} recipes were created',
+                'created': created,
+                'results': results}, 200
+
+    @api.expect(BULK_IDS, validate=False)
+    @api.response(200, 'The result of each id')
+    @jwt_required
+    @response_cache.invalidates
+    def delete(self, category_id):
+        ''' A method to delete the recipes of a category with the ids of a
+            list in one transaction
+
+            :param int category_id: The category id to which the recipes belong
+            :return: A dictionary with the count and the result of each id
+        '''
+        try:
+            ids = bulk.read_items(request.get_json(silent=True), 'ids',
+                                  current_app.config['BULK_MAX_ITEMS'])
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        results = bulk.delete_recipes(get_jwt_identity(), category_id, ids)
+        deleted = sum(result['status'] == 'deleted' for result in results)
+        return {'message': f'{deleted} recipes were deleted',
+                'deleted': deleted,
+                'results': results}, 200
+
+
 @api.route('/<int:category_id>/<recipe_id>/')
 class Recipee(Resource):
     """This class handles a single recipe GET, PUT AND DELETE functionality
@@ -176,6 +298,7 @@ class Recipee(Resource):
 
     @api.response(200, 'Category found successfully')
     @jwt_required
+    @response_cache.cached
     def get(self, category_id, recipe_id):
         ''' A method to get a recipe in a category by id.
             Checks if the given recipe id exists in the given category and
@@ -186,16 +309,24 @@ class Recipee(Resource):
             :return: The details of the recipe
         '''
         user_id = get_jwt_identity()
+        not_modified, (found,) = check_conditional([fingerprint(
+            Recipe, Recipe.created_by == user_id,
+            Recipe.category_id == category_id,
+            Recipe.recipe_id == recipe_id)])
+        if not found:
+            return {'message': 'You don\'t have a recipe with id '
+                               f'{recipe_id}'}, 404
+        if not_modified:
+            return not_modified
         the_recipe = Recipe.query.filter_by(created_by=user_id,
                                             category_id=category_id,
                                             recipe_id=recipe_id).first()
-        if the_recipe is not None:
-            return manage_get_recipe(the_recipe)
-        return {'message': f'You don\'t have a recipe with id {recipe_id}'}, 404
+        return manage_get_recipe(the_recipe)
 
     @api.expect(EDIT_PARSER)
     @api.response(204, 'Success')
     @jwt_required
+    @response_cache.invalidates
     def put(self, category_id, recipe_id):
         ''' A method for editing a recipe.
             Checks if the given recipe id exists in the given category and
@@ -242,6 +373,7 @@ class Recipee(Resource):
 
     @api.response(204, 'Success')
     @jwt_required
+    @response_cache.invalidates
     def delete(self, category_id, recipe_id):
         ''' A method to delete a recipe
             Checks if the given recipe id exists in the given category and
@@ -0,0 +1,81 @@
+''' This script handles exporting and importing the recipe book of a
+    user
+'''
+
+import json
+
+from flask import Response, current_app, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_restplus import Namespace, Resource, reqparse
+
+from app import response_cache
+from ..transfer import (
+    FORMATS, MIMETYPES, export_book, import_book, read_records)
+
+api = Namespace('transfer', description='Exporting and importing recipe books')
+
+EXPORT_PARSER = reqparse.RequestParser(bundle_errors=True)
+EXPORT_PARSER.add_argument('format', required=False, choices=FORMATS,
+                           default='ndjson', location='args',
+                           help='Try again: {error_msg}')
+
+
+@api.route('/export/')
+class Export(Resource):
+    ''' This class streams out the categories and recipes of a user '''
+
+    @api.expect(EXPORT_PARSER)
+    @api.response(200, 'The recipe book')
+    @jwt_required
+    def get(self):
+        ''' This method streams every category and recipe of the user as
+            NDJSON or CSV, gzipped when the client accepts it
+
+            :return: A streamed response
+        '''
+        args = EXPORT_PARSER.parse_args(request)
+        gzip = request.accept_encodings['gzip'] > 0
+        body = export_book(
+            get_jwt_identity(), args.format, gzip=gzip,
+            batch_size=current_app.config['EXPORT_BATCH_SIZE'],
+            chunk_size=current_app.config['EXPORT_CHUNK_SIZE'])
+        response = Response(stream_with_context(body),
+                            mimetype=MIMETYPES[args.format])
+        response.headers['Content-Disposition'] = \
+            f'attachment; filename=recipes.{args.format}'
+        response.vary.add('Accept-Encoding')
+        if gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+
+@api.route('/import/')
+class Import(Resource):
+    ''' This class reads categories and recipes streamed in by a user '''
+
+    @api.response(200, 'A report on each line')
+    @jwt_required
+    def post(self):
+        ''' This method creates the categories and recipes of an NDJSON
+            request body. Each line is a category or a recipe naming its
+            category, lines that are invalid or already exist are reported
+            and skipped. Lines are committed in batches and the report of
+            a batch is streamed back once it is written, so a client can
+            resume after the last reported line.
+
+            :return: A streamed NDJSON report with one line per record
+        '''
+        user_id = get_jwt_identity()
+        reports = import_book(
+            user_id, read_records(request.stream),
+            batch_size=current_app.config['IMPORT_BATCH_SIZE'])
+
+        def body():
+            try:
+                for report in reports:
+                    yield json.dumps(report) + '\n'
+            finally:
+                response_cache.invalidate(user_id)
+
+        return Response(stream_with_context(body()),
+                        mimetype=MIMETYPES['ndjson'])
@@ -0,0 +1,232 @@
+''' This script creates and deletes categories and recipes in bulk.
+
+    A batch is validated up front, checked against the names that already
+    exist with one query and written with multi-row statements in a single
+    transaction. The rows don't go through the ORM, so the counters and the
+    ingredient index are kept up to date here.
+'''
+
+from .counters import count_categories, count_recipes
+from .db import db
+from .ingredients import link_ingredients, parse_ingredients
+from .models.category import Category
+from .models.recipe import Recipe
+from .validation_helper import name_validator
+
+# rows per INSERT, kept under the bound variables SQLite allows
+ROWS_PER_STATEMENT = 100
+
+
+def read_items(body, key, max_items):
+    ''' Reads the list of items of a bulk request body
+
+        :param dict body: The decoded JSON body
+        :param str key: The key of the list in the body
+        :param int max_items: The most items allowed in one request
+        :return: The list or ValueError if the body is not valid
+    '''
+    if not isinstance(body, dict) or not isinstance(body.get(key), list):
+        raise ValueError(f'Send a JSON object with a list of {key}')
+    if len(body[key]) > max_items:
+        raise ValueError(f'Send at most {max_items} {key} at a time')
+    return body[key]
+
+
+def check_item(item, name_key, text_key, existing, seen):
+    ''' Validates one item to create, returns None if it is valid or the
+        status and message of the failure
+    '''
+    if not isinstance(item, dict):
+        return 'invalid', 'Each item must be an object'
+    name, text = item.get(name_key), item.get(text_key, '')
+    if not isinstance(name, str) or not isinstance(text, str):
+        return 'invalid', f'{name_key} and {text_key} must be strings'
+    if not name_validator(name) or len(name) > 100:
+        return 'invalid', (f'{name} is not a valid name. Names can only '
+                           'comprise of alphabetical characters')
+    if len(text) > 256:
+        return 'invalid', f'{text_key} can be at most 256 characters'
+    if name in existing or name in seen:
+        return 'conflict', f'{name} already exists'
+    return None
+
+
+def insert_rows(table, rows):
+    ''' Inserts rows with multi-row INSERT statements '''
+    for start in range(0, len(rows), ROWS_PER_STATEMENT):
+        db.session.execute(
+            table.insert().values(rows[start:start + ROWS_PER_STATEMENT]))
+
+
+def create_items(model, name_key, text_key, items, scope, columns=None):
+    ''' Validates the items and inserts the valid ones
+
+        :param class model: Category or Recipe
+        :param str name_key: The name column of the model
+        :param str text_key: The other text column of the model
+        :param list items: The items of the request
+        :param dict scope: The columns every row shares
+        :param function columns: Returns more columns of a valid item
+        :return: A tuple of the results and a dictionary of the new ids by
+            name
+    '''
+    name_column = getattr(model, name_key)
+    filters = [getattr(model, column) == value
+               for column, value in scope.items()]
+    names = [item.get(name_key) for item in items if isinstance(item, dict)]
+    names = [name for name in names if isinstance(name, str)]
+    existing = {name for name, in db.session.query(name_column).filter(
+        name_column.in_(names or ['']), *filters)}
+
+    results, rows, seen = [], [], set()
+    for index, item in enumerate(items):
+        failure = check_item(item, name_key, text_key, existing, seen)
+        if failure is not None:
+            status, message = failure
+            results.append({'index': index, 'status': status,
+                            'message': message})
+            continue
+        seen.add(item[name_key])
+        row = dict(scope, **{name_key: item[name_key],
+                             text_key: item.get(text_key, '')})
+        if columns is not None:
+            row.update(columns(row))
+        rows.append(row)
+        results.append({'index': index, 'status': 'created',
+                        name_key: item[name_key]})
+    if not rows:
+        return results, {}
+
+    insert_rows(model.__table__, rows)
+    key = model.__mapper__.primary_key[0]
+    ids = dict(db.session.query(name_column, key).filter(
+        name_column.in_(seen), *filters))
+    for result in results:
+        if result['status'] == 'created':
+            result[key.key] = ids[result[name_key]]
+    return results, ids
+
+
+def add_categories(user_id, items):
+    ''' Inserts the valid categories of a batch without committing
+
+        :param int user_id: The owner of the categories
+        :param list items: Dictionaries of category_name and description
+        :return: A tuple of the result of each item and a dictionary of the
+            new ids by name
+    '''
+    results, ids = create_items(
+        Category, 'category_name', 'description', items,
+        {'created_by': user_id})
+    if ids:
+        count_categories(db.session.connection(), user_id, len(ids))
+    return results, ids
+
+
+def create_categories(user_id, items):
+    ''' Creates the valid categories of a batch
+
+        :return: A list with the result of each item
+    '''
+    results, _ = add_categories(user_id, items)
+    db.session.commit()
+    return results
+
+
+def add_recipes(user_id, category_id, items):
+    ''' Inserts the valid recipes of a batch in a category and indexes
+        their ingredients without committing
+
+        :param int user_id: The owner of the recipes
+        :param int category_id: The category of the recipes
+        :param list items: Dictionaries of recipe_name and ingredients
+        :return: A list with the result of each item
+    '''
+    parsed = {}
+
+    def ingredient_count(row):
+        parsed[row['recipe_name']] = parse_ingredients(row['ingredients'])
+        return {'ingredient_count': len(parsed[row['recipe_name']])}
+
+    results, ids = create_items(
+        Recipe, 'recipe_name', 'ingredients', items,
+        {'created_by': user_id, 'category_id': category_id},
+        ingredient_count)
+    if ids:
+        count_recipes(db.session.connection(), category_id, user_id,
+                      len(ids))
+        link_ingredients(db.session, [
+            (ids[recipe_name], names)
+            for recipe_name, names in parsed.items()])
+    return results
+
+
+def create_recipes(user_id, category_id, items):
+    ''' Creates the valid recipes of a batch in a category
+
+        :return: A list with the result of each item
+    '''
+    results = add_recipes(user_id, category_id, items)
+    db.session.commit()
+    return results
+
+
+def read_ids(ids):
+    ''' Splits a list of ids into the valid ones and the results of the
+        invalid ones
+    '''
+    valid, results = [], []
+    for an_id in ids:
+        if isinstance(an_id, int) and not isinstance(an_id, bool):
+            valid.append(an_id)
+        else:
+            results.append({'id': an_id, 'status': 'invalid',
+                            'message': 'Ids must be integers'})
+    return valid, results
+
+
+def delete_categories(user_id, ids):
+    ''' Deletes the categories of a user with the given ids and their
+        recipes
+
+        :return: A list with the result of each id
+    '''
+    ids, results = read_ids(ids)
+    found = dict(db.session.query(
+        Category.category_id, Category.recipe_count).filter(
+            Category.created_by == user_id,
+            Category.category_id.in_(ids or [0])))
+    if found:
+        # the database deletes their recipes and ingredient index rows
+        db.session.execute(Category.__table__.delete().where(
+            Category.category_id.in_(found)))
+        connection = db.session.connection()
+        count_recipes(connection, None, user_id, -sum(found.values()))
+        count_categories(connection, user_id, -len(found))
+        db.session.commit()
+    return results + [
+        {'category_id': category_id,
+         'status': 'deleted' if category_id in found else 'not_found'}
+        for category_id in ids]
+
+
+def delete_recipes(user_id, category_id, ids):
+    ''' Deletes the recipes of a user in a category with the given ids
+
+        :return: A list with the result of each id
+    '''
+    ids, results = read_ids(ids)
+    found = {recipe_id for recipe_id, in db.session.query(
+        Recipe.recipe_id).filter(Recipe.created_by == user_id,
+                                 Recipe.category_id == category_id,
+                                 Recipe.recipe_id.in_(ids or [0]))}
+    if found:
+        db.session.execute(Recipe.__table__.delete().where(
+            Recipe.recipe_id.in_(found)))
+        count_recipes(db.session.connection(), category_id, user_id,
+                      -len(found))
+        db.session.commit()
+    return results + [
+        {'recipe_id': recipe_id,
+         'status': 'deleted' if recipe_id in found else 'not_found'}
+        for recipe_id in ids]
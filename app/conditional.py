@@ -0,0 +1,96 @@
+''' This script answers conditional GET requests.
+
+    A handler describes the rows behind its response as fingerprints: the
+    count, the latest date_modified and the sums of the ids and versions of
+    a set of rows, read in one aggregate query before anything is loaded.
+    They make up a strong ETag together with the user and the URL, and the
+    latest date_modified is the Last-Modified date. When the client already has
+    the response a 304 is returned right away.
+'''
+
+import hashlib
+
+from flask import current_app, g, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import and_, func, select
+
+from .db import db
+
+
+def fingerprint(model, *criteria):
+    ''' Builds the aggregate query of a set of rows
+
+        :param class model: The model of the rows
+        :param criteria: The filters picking the rows
+        :return: A one row select of rows, modified, ids and versions
+    '''
+    key = model.__mapper__.primary_key[0]
+    return select([func.count(key).label('rows'),
+                   func.max(model.date_modified).label('modified'),
+                   func.sum(key).label('ids'),
+                   func.sum(model.version).label('versions')]).where(
+                       and_(*criteria)).alias()
+
+
+def check_conditional(fingerprints, collection=False, extra=()):
+    ''' Reads the fingerprints and compares them with the request headers.
+        The validators are kept for the response, see add_validators.
+        Deleting a row doesn't move the latest date_modified of a
+        collection, so collections only honour If-None-Match.
+
+        :param list fingerprints: The fingerprint selects of the response
+        :param bool collection: Whether the response lists rows
+        :param list extra: Scalar selects the handler needs, read in the
+            same query
+        :return: A tuple of a 304 response, or None if the client needs the
+            full response, and the row count of each fingerprint followed
+            by the extra values
+    '''
+    columns = [column for a_fingerprint in fingerprints
+               for column in a_fingerprint.c]
+    row = db.session.query(*columns, *extra).one()
+    aggregates, values = row[:len(columns)], row[len(columns):]
+    counts = list(aggregates[::4]) + list(values)
+    dates = [modified for modified in aggregates[1::4]
+             if modified is not None]
+    last_modified = max(dates).replace(microsecond=0) if dates else None
+
+    state = (get_jwt_identity(), request.full_path,
+             current_app.config['FAST_JSON'], tuple(aggregates))
+    etag = hashlib.sha1(repr(state).encode('utf-8')).hexdigest()
+    g.validators = (etag, last_modified)
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since and not collection:
+        fresh = (last_modified is not None and
+                 last_modified <= request.if_modified_since)
+    else:
+        fresh = False
+    if not fresh:
+        return None, counts
+    response = make_response('', 304)
+    add_validators(response)
+    return response, counts
+
+
+def add_validators(response):
+    ''' Adds the ETag and Last-Modified headers of a successful GET '''
+    if 'validators' not in g or response.status_code not in (200, 304):
+        return response
+    etag, last_modified = g.validators
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+class ConditionalRequests(object):
+    ''' Adds the validators read by check_conditional to the responses '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(add_validators)
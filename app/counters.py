@@ -0,0 +1,87 @@
+''' This script keeps the denormalised row counters up to date.
+
+    Categories count their recipes and users count their categories and
+    recipes, so paginated responses don't need a COUNT(*) over the user's
+    rows. The counters are updated in the same flush as the rows they count.
+    The database deletes the recipes of a deleted category without them
+    being loaded, so the owner's counter drops by the category's counter.
+'''
+
+from sqlalchemy import event, func, select
+
+from .db import db
+from .models.category import Category
+from .models.recipe import Recipe
+from .models.user import User
+
+categories = Category.__table__
+recipes = Recipe.__table__
+users = User.__table__
+
+
+def _bump(connection, table, key, value, column, step):
+    ''' Adds a step to a counter column of one row '''
+    if value is None:
+        return
+    connection.execute(table.update().where(key == value).values(
+        {column: table.c[column] + step}))
+
+
+def count_recipes(connection, category_id, user_id, step):
+    ''' Adds step to the recipe counters of a category and its owner, for
+        recipes written without the ORM
+    '''
+    _bump(connection, categories, categories.c.category_id, category_id,
+          'recipe_count', step)
+    _bump(connection, users, users.c.user_id, user_id, 'recipe_count', step)
+
+
+def count_categories(connection, user_id, step):
+    ''' Adds step to the category counter of a user, for categories written
+        without the ORM
+    '''
+    _bump(connection, users, users.c.user_id, user_id, 'category_count',
+          step)
+
+
+@event.listens_for(Recipe, 'after_insert')
+def recipe_inserted(mapper, connection, target):
+    count_recipes(connection, target.category_id, target.created_by, 1)
+
+
+@event.listens_for(Recipe, 'after_delete')
+def recipe_deleted(mapper, connection, target):
+    count_recipes(connection, target.category_id, target.created_by, -1)
+
+
+@event.listens_for(Category, 'after_insert')
+def category_inserted(mapper, connection, target):
+    count_categories(connection, target.created_by, 1)
+
+
+@event.listens_for(Category, 'before_delete')
+def category_deleted(mapper, connection, target):
+    # read from the row, recipes deleted earlier in the flush already
+    # took themselves off it
+    remaining = select([categories.c.recipe_count]).where(
+        categories.c.category_id == target.category_id).as_scalar()
+    connection.execute(users.update().where(
+        users.c.user_id == target.created_by).values(
+            recipe_count=users.c.recipe_count - func.coalesce(remaining, 0),
+            category_count=users.c.category_count - 1))
+
+
+def rebuild_counters():
+    ''' Recounts every counter from the rows, in case they have drifted '''
+    recipes_per_category = select([func.count()]).where(
+        recipes.c.category_id == categories.c.category_id).as_scalar()
+    recipes_per_user = select([func.count()]).where(
+        recipes.c.created_by == users.c.user_id).as_scalar()
+    categories_per_user = select([func.count()]).where(
+        categories.c.created_by == users.c.user_id).as_scalar()
+
+    db.session.execute(categories.update().values(
+        recipe_count=recipes_per_category))
+    db.session.execute(users.update().values(
+        recipe_count=recipes_per_user, category_count=categories_per_user))
+    db.session.commit()
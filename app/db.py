@@ -1,5 +1,52 @@
 ''' This script creates the db instance '''
 
+import sqlite3
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+from .pool import InstrumentedQueuePool
+from .replicas import RoutingSession
+
+# the options only a queue of connections takes
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+class Database(SQLAlchemy):
+    ''' Picks the connection pool of the engines from the config and sends
+        the reads of GET requests to the read replicas
+    '''
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, info, options):
+        if info.drivername.startswith('sqlite'):
+            # SQLite connections are opened per checkout, or shared in memory
+            for option in QUEUE_POOL_OPTIONS:
+                options.pop(option, None)
+        elif app.config['DATABASE_PGBOUNCER']:
+            # PgBouncer pools the server connections
+            for option in QUEUE_POOL_OPTIONS:
+                options.pop(option, None)
+            options['poolclass'] = NullPool
+        else:
+            options['poolclass'] = InstrumentedQueuePool
+            options['pool_pre_ping'] = app.config['SQLALCHEMY_POOL_PRE_PING']
+        super().apply_driver_hacks(app, info, options)
+
+
+db = Database()
+
 
-db = SQLAlchemy()
+@event.listens_for(Engine, 'connect')
+def enforce_foreign_keys(dbapi_connection, connection_record):
+    ''' SQLite ignores foreign keys, and so ON DELETE CASCADE, unless it is
+        turned on for each connection
+    '''
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
@@ -0,0 +1,118 @@
+''' This script reports the query plans of the queries the endpoints run.
+
+    Each query shape is built the way its endpoint builds it, for the user
+    with the most recipes, and explained: with EXPLAIN ANALYZE on Postgres
+    and EXPLAIN QUERY PLAN on SQLite. Plans that read a whole table are
+    flagged, they are the ones to look at before the table grows. The
+    planner only shows what it will do on real data, so run it against a
+    seeded database.
+'''
+
+from sqlalchemy import func
+
+from .conditional import fingerprint
+from .db import db
+from .ingredients import pantry_recipes
+from .models.category import Category
+from .models.recipe import Recipe
+from .models.user import User
+from .search import search_recipes
+
+EXPLAIN = {'postgresql': 'EXPLAIN ANALYZE ', 'sqlite': 'EXPLAIN QUERY PLAN '}
+
+
+def query_shapes(user_id):
+    ''' Builds the queries of the endpoints for a user
+
+        :param int user_id: The user the queries are run for
+        :return: A list of (name, query) tuples
+    '''
+    a_recipe = Recipe.query.filter_by(created_by=user_id).first()
+    category_id = a_recipe.category_id if a_recipe else 0
+    recipe_id = a_recipe.recipe_id if a_recipe else 0
+    recipe_name = a_recipe.recipe_name if a_recipe else ''
+    category_name = db.session.query(Category.category_name).filter_by(
+        category_id=category_id).scalar() or ''
+    ingredient = (a_recipe.ingredients.split(',')[0].strip()
+                  if a_recipe else '')
+
+    return [
+        ('categories page', Category.query.filter_by(
+            created_by=user_id).order_by(
+                Category.category_id.desc()).limit(10)),
+        ('category search', Category.query.filter(
+            Category.created_by == user_id,
+            func.lower(Category.category_name).ilike(
+                f'%{category_name[:3]}%'))),
+        ('category by name', Category.query.filter_by(
+            created_by=user_id, category_name=category_name)),
+        ('category', Category.query.filter_by(
+            created_by=user_id, category_id=category_id)),
+        ('category fingerprint', db.session.query(*fingerprint(
+            Category, Category.created_by == user_id).c)),
+        ('recipe previews', Recipe.query.filter(
+            Recipe.category_id.in_([category_id])).order_by(
+                Recipe.recipe_id.desc())),
+        ('recipes page', Recipe.query.filter_by(
+            created_by=user_id).order_by(Recipe.recipe_id.desc()).limit(10)),
+        ('category recipes page', Recipe.query.filter_by(
+            created_by=user_id, category_id=category_id).order_by(
+                Recipe.recipe_id.desc()).limit(10)),
+        ('recipe by name', Recipe.query.filter_by(
+            created_by=user_id, category_id=category_id,
+            recipe_name=recipe_name)),
+        ('recipe', Recipe.query.filter_by(
+            created_by=user_id, category_id=category_id,
+            recipe_id=recipe_id)),
+        ('recipe search', search_recipes(
+            Recipe.query.filter_by(created_by=user_id),
+            recipe_name.split(' ')[0] or 'recipe').limit(10)),
+        ('pantry', pantry_recipes(user_id, [ingredient]).limit(10)),
+    ]
+
+
+def full_scan(line, dialect):
+    ''' Tells if a line of a plan reads a whole table, scans of subquery
+        results don't count
+    '''
+    if dialect == 'postgresql':
+        return 'Seq Scan' in line
+    words = line.replace(' TABLE ', ' ', 1).split()
+    return (len(words) > 1 and words[0] == 'SCAN' and
+            words[1] in db.metadata.tables and 'INDEX' not in line)
+
+
+def explain(query):
+    ''' Returns the lines of the plan of a query '''
+    connection = db.session.connection()
+    dialect = connection.dialect
+    compiled = query.statement.compile(dialect=dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    rows = connection.execute(
+        EXPLAIN.get(dialect.name, 'EXPLAIN ') + str(compiled), params)
+    # SQLite describes each step in the last column
+    return [str(row[-1]) for row in rows]
+
+
+def explain_endpoints():
+    ''' Explains every query shape for the user with the most recipes
+
+        :return: A list of (name, plan lines, whether a table is scanned)
+            tuples or ValueError if the database has no users
+    '''
+    the_user = User.query.order_by(User.recipe_count.desc()).first()
+    if the_user is None:
+        raise ValueError('The database has no users, seed it first')
+    dialect = db.session.connection().dialect.name
+    report = []
+    try:
+        for name, query in query_shapes(the_user.user_id):
+            plan = explain(query)
+            report.append((name, plan, any(full_scan(line, dialect)
+                                           for line in plan)))
+    finally:
+        # EXPLAIN ANALYZE runs the queries, leave nothing behind
+        db.session.rollback()
+    return report
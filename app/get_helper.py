@@ -1,23 +1,183 @@
 # get_helper.py
 ''' This script handles pagination of recipe get request data '''
 
-from flask import jsonify
+import base64
+import binascii
+import json
+
+from flask import current_app
+from flask_sqlalchemy import Pagination
+from sqlalchemy import func
+
+from .db import db
+from .models.recipe import Recipe
+from .search import search_recipes
+from .serializers import category_serializer, recipe_serializer
 
-from .serializers import RecipeSchema
 THE_PAGE = 1
 PER_PAGE_MIN = 5
 PER_PAGE_MAX = 10
+# the category fields a client can ask for, the recipes are expanded instead
+CATEGORY_FIELDS = category_serializer.fields - {'recipes'}
+CATEGORY_EXPANSIONS = frozenset(['recipes'])
+
+
+def encode_cursor(last_id):
+    """ Function to turn the id of the last row of a page into an opaque
+        cursor for the next page
+
+        :param int last_id: The id of the last row on the page
+        :return: The cursor string
+    """
+    return base64.urlsafe_b64encode(
+        json.dumps([last_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """ Function to read the id of the last row seen back from a cursor
+
+        :param str cursor: The cursor string
+        :return: The id or ValueError if the cursor is not valid
+    """
+    try:
+        last_id, = json.loads(base64.urlsafe_b64decode(
+            cursor.encode('ascii')).decode('utf-8'))
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError(f'{cursor} is not a valid cursor')
+    if not isinstance(last_id, int):
+        raise ValueError(f'{cursor} is not a valid cursor')
+    return last_id
+
+
+def paginate_by_cursor(query, key, cursor, per_page):
+    """ Function to fetch the page of rows after a cursor.
+        The rows are ordered by the key descending and the page is read as a
+        range of the key, so there is no OFFSET scan and no COUNT query.
+
+        :param object query: A BaseQuery object
+        :param object key: The unique column the rows are ordered by
+        :param str cursor: The cursor of the page, empty for the first page
+        :param int per_page: The number of rows per page
+        :return: A tuple of the rows and the cursor of the next page
+    """
+    query = query.order_by(None).order_by(key.desc())
+    if cursor:
+        query = query.filter(key < decode_cursor(cursor))
+    # one more row than needed tells if there is a next page
+    items = query.limit(per_page + 1).all()
+    if len(items) <= per_page:
+        return items, None
+    items = items[:per_page]
+    return items, encode_cursor(getattr(items[-1], key.key))
+
+
+def paginate_with_total(query, page, per_page, total):
+    """ Function to fetch a numbered page when the total number of rows is
+        already known, so no COUNT query is run
+
+        :param object query: A BaseQuery object
+        :param int page: The page number
+        :param int per_page: The number of rows per page
+        :param int total: The number of rows the query returns
+        :return: A Pagination object
+    """
+    if page is None or page < 1:
+        page = 1
+    items = query.limit(per_page).offset((page - 1) * per_page).all()
+    return Pagination(query, page, per_page, total, items)
+
 
+def split_names(value):
+    """ Function to read a comma separated query parameter
 
-def manage_get_recipes(the_recipes, args):
+        :param str value: The parameter value, None if it wasn't passed
+        :return: A list of the names in it
+    """
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def expanded(args):
+    """ Function to read the relations a client asked to embed, the
+        recipes unless the expand parameter says otherwise
+
+        :param dict args: The parsed expand parameter
+        :return: A list of the relation names
+    """
+    expand = args.get('expand')
+    return split_names('recipes' if expand is None else expand)
+
+
+def load_recipe_previews(categories, size):
+    """ Function to load the newest recipes of many categories in one query.
+        The recipes are numbered per category by a window function so at
+        most size of them are read for each category. They are returned
+        apart rather than set as the recipes of the categories, which would
+        leave the ORM with a truncated collection to flush from.
+
+        :param list categories: The Category objects
+        :param int size: The most recipes kept per category
+        :return: A dictionary of the lists of recipes by category id
+    """
+    if not categories:
+        return {}
+    previews = {a_category.category_id: [] for a_category in categories}
+    position = func.row_number().over(
+        partition_by=Recipe.category_id,
+        order_by=Recipe.recipe_id.desc()).label('position')
+    ranked = db.session.query(Recipe.recipe_id, position).filter(
+        Recipe.category_id.in_(list(previews))).subquery()
+    the_recipes = Recipe.query.join(
+        ranked, ranked.c.recipe_id == Recipe.recipe_id).filter(
+            ranked.c.position <= size).order_by(Recipe.recipe_id.desc())
+    for a_recipe in the_recipes:
+        previews[a_recipe.category_id].append(a_recipe)
+    return previews
+
+
+def dump_categories(categories, args):
+    """ Function to serialise categories with the fields a client asked for.
+        The fields parameter lists the category fields to return, all of
+        them when it's empty. The expand parameter lists the relations to
+        embed and defaults to the recipes, which are a preview of the newest
+        RECIPE_PREVIEW_SIZE recipes of each category; recipe_count has the
+        full number. An empty expand leaves the recipes out.
+
+        :param list categories: The Category objects
+        :param dict args: The parsed fields and expand parameters
+        :return: A list of dictionaries or ValueError for unknown names
+    """
+    only = split_names(args.get('fields')) or sorted(CATEGORY_FIELDS)
+    for name in only:
+        if name not in CATEGORY_FIELDS:
+            raise ValueError(f'{name} is not a category field')
+    expand = expanded(args)
+    for name in expand:
+        if name not in CATEGORY_EXPANSIONS:
+            raise ValueError(f'{name} can\'t be expanded')
+
+    dumped = category_serializer.dump_many(categories, only)
+    if 'recipes' in expand:
+        previews = load_recipe_previews(
+            categories, current_app.config['RECIPE_PREVIEW_SIZE'])
+        for a_category, row in zip(categories, dumped):
+            row['recipes'] = recipe_serializer.dump_many(
+                previews[a_category.category_id])
+    return dumped
+
+
+def manage_get_recipes(the_recipes, args, total=None):
     """ Function to handle search and pagination
         It receives a BaseQuery object of recipes, checks if the search
-        parameter was passed a value and searches for that value.
+        parameter was passed a value and narrows the recipes down to the ones
+        matching it, best match first.
         If the pagination parameters were passed values, checks if they are
-        within the min/max range per page and paginates accordingly.
+        within the min/max range per page and paginates accordingly. If a
+        cursor was passed, returns the page after it instead of a numbered
+        page.
 
         :param object the_recipes: -- [description]
         :param list args: -- [description]
+        :param int total: The number of recipes, from the counters, if known
         :return:
     """
 
@@ -29,30 +189,40 @@ def manage_get_recipes(the_recipes, args):
     if per_page > PER_PAGE_MAX:
         per_page = PER_PAGE_MAX
 
-    for a_recipe in the_recipes.all():
-        if q:
-            q = q.lower()
-            if q in a_recipe.recipe_name:
-                recipeschema = RecipeSchema()
-                the_recipe = recipeschema.dump(a_recipe)
-                return jsonify(the_recipe.data)
+    message = "These are the recipes"
+    cursor = args.get('cursor')
+    searching = bool(q and q.strip())
+    if searching:
+        if cursor is not None:
+            return {'message': 'Searches can only be paginated by page'}, 400
+        the_recipes = search_recipes(the_recipes, q)
+        message = "These are the recipe search results"
 
-    pag_recipes = the_recipes.paginate(
-        page, per_page, error_out=False)
+    if cursor is not None:
+        try:
+            items, next_cursor = paginate_by_cursor(
+                the_recipes, Recipe.recipe_id, cursor, per_page)
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        return {"recipes": recipe_serializer.dump_many(items),
+                "message": message,
+                "next_cursor": next_cursor}
+
+    if total is None or searching:
+        pag_recipes = the_recipes.paginate(
+            page, per_page, error_out=False)
+    else:
+        pag_recipes = paginate_with_total(the_recipes, page, per_page, total)
 
     pages = pag_recipes.pages
     page = pag_recipes.page
     categoryId = 0
     if not pag_recipes.items:
         return {'message': f'There are no recipes on page {page}'}
-    paginated = []
-    for a_recipe in pag_recipes.items:
-        paginated.append(a_recipe)
-    recipesschema = RecipeSchema(many=True)
-    all_recipes = recipesschema.dump(paginated)
-
-    response = {"recipes": all_recipes.data,
-                "message": "These are the recipes",
+    all_recipes = recipe_serializer.dump_many(pag_recipes.items)
+
+    response = {"recipes": all_recipes,
+                "message": message,
                 "recipePages": pages,
                 "recipePage": page,
                 "categoryId": categoryId,
@@ -62,6 +232,4 @@ def manage_get_recipes(the_recipes, args):
 
 
 def manage_get_recipe(the_recipe):
-    recipeschema = RecipeSchema()
-    get_response = recipeschema.dump(the_recipe)
-    return jsonify(get_response.data)
+    return recipe_serializer.dump(the_recipe)
@@ -0,0 +1,208 @@
+''' This script handles password hashing and verification.
+
+    bcrypt is run on a pool of threads (bcrypt releases the GIL). The
+    workers of a node share a number of slots, lock files a hash holds while
+    it runs or waits for a thread, so once the cores are busy a burst of
+    logins or registrations is turned away with a 503 before it ties up
+    every worker. The bcrypt cost can be calibrated to take a target time;
+    gunicorn.conf.py does it once in the master so that every worker forked
+    from it hashes with the same cost.
+
+    Under gevent the threading module is patched to make greenlets, which
+    would run bcrypt on the event loop, so gevent's pool of real threads
+    is used instead.
+'''
+
+import fcntl
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from flask import current_app
+from flask_bcrypt import check_password_hash, generate_password_hash
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+# seconds a bulk hash sleeps between tries for a slot
+SLOT_WAIT = 0.05
+
+# costs calibrated in this process, inherited by the processes forked from it
+_calibrated = {}
+
+
+class HashingBusy(Exception):
+    ''' Raised when every hashing slot of the node is taken '''
+
+
+def calibrate_rounds(target_ms, min_rounds=MIN_ROUNDS):
+    ''' Picks the bcrypt cost whose hash takes closest to a target time.
+        Each extra round doubles the work, so one timed hash is enough to
+        extrapolate from.
+
+        :param int target_ms: The time one hash should take in milliseconds
+        :param int min_rounds: The lowest cost that may be picked
+        :return: The number of log rounds
+    '''
+    start = time.perf_counter()
+    generate_password_hash('calibration', min_rounds)
+    elapsed_ms = max((time.perf_counter() - start) * 1000, 0.001)
+    rounds = min_rounds + round(math.log2(target_ms / elapsed_ms))
+    return max(min_rounds, min(rounds, MAX_ROUNDS))
+
+
+def calibrated_rounds(target_ms, min_rounds=MIN_ROUNDS):
+    ''' Returns the cost calibrated for a target time, calibrating it the
+        first time only
+    '''
+    if (target_ms, min_rounds) not in _calibrated:
+        _calibrated[target_ms, min_rounds] = calibrate_rounds(target_ms,
+                                                              min_rounds)
+    return _calibrated[target_ms, min_rounds]
+
+
+def executor_class():
+    ''' Returns the thread pool class that runs bcrypt off the event loop '''
+    try:
+        from gevent import monkey
+    except ImportError:
+        return ThreadPoolExecutor
+    if monkey.is_module_patched('threading'):
+        from gevent.threadpool import ThreadPoolExecutor as GeventExecutor
+        return GeventExecutor
+    return ThreadPoolExecutor
+
+
+def hash_rounds(hashed):
+    ''' Returns the cost a bcrypt hash was generated with '''
+    return int(hashed.split('$')[2])
+
+
+class HashingSlots(object):
+    ''' Slot files shared by the processes of a node. A slot is taken by
+        locking its file, and the lock goes away with the process if it dies.
+    '''
+
+    def __init__(self, path, count):
+        ''' Initialise the slots with the path their files start with and
+            how many there are
+        '''
+        self.path = path
+        self.count = count
+
+    def acquire(self):
+        ''' Takes a free slot without waiting
+
+            :return: The descriptor holding the slot, None if all are taken
+        '''
+        for slot in range(self.count):
+            # each open file gets its own lock, even within a process
+            fd = os.open(f'{self.path}.{slot}', os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def release(self, fd):
+        ''' Frees a slot, closing its file drops the lock '''
+        os.close(fd)
+
+
+class PasswordHasher(object):
+    ''' Runs bcrypt for the app on a bounded pool of worker threads '''
+
+    def __init__(self, app=None):
+        self._pid = None
+        self._pool = None
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Sets the bcrypt cost of the app in BCRYPT_LOG_ROUNDS, calibrating
+            it if a target time is configured, and the slots its hashes take
+        '''
+        if app.config.get('BCRYPT_TARGET_MS'):
+            app.config['BCRYPT_LOG_ROUNDS'] = calibrated_rounds(
+                app.config['BCRYPT_TARGET_MS'],
+                app.config['BCRYPT_MIN_ROUNDS'])
+        app.extensions['password_hasher'] = {
+            'slots': HashingSlots(app.config['BCRYPT_SLOTS_PATH'],
+                                  app.config['BCRYPT_SLOTS']),
+        }
+
+    @property
+    def rounds(self):
+        return current_app.config['BCRYPT_LOG_ROUNDS']
+
+    def _get_pool(self):
+        ''' Returns the pool of this process, starting it on first use since
+            threads don't survive a fork of the gunicorn master
+        '''
+        with self._lock:
+            if self._pid != os.getpid():
+                workers = current_app.config['BCRYPT_WORKERS']
+                self._pool = executor_class()(max_workers=workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, func, *args):
+        ''' Runs a function on the pool and waits for its result.
+            Raises HashingBusy if every slot of the node is taken.
+        '''
+        slots = current_app.extensions['password_hasher']['slots']
+        slot = slots.acquire()
+        if slot is None:
+            raise HashingBusy()
+        try:
+            future = self._get_pool().submit(func, *args)
+        except Exception:
+            slots.release(slot)
+            raise
+        future.add_done_callback(lambda _: slots.release(slot))
+        return future.result()
+
+    def hash(self, password):
+        ''' Hashes a password with the current cost '''
+        return self._run(
+            generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def hash_many(self, passwords):
+        ''' Hashes passwords with the current cost, as many at a time as the
+            pool has threads. Each hash waits for a slot of the node instead
+            of being turned away, so a bulk run is slowed down by the logins
+            rather than failing half way.
+
+            :param list passwords: The passwords to hash
+            :return: A list of the hashes in the order of the passwords
+        '''
+        slots = current_app.extensions['password_hasher']['slots']
+        rounds = self.rounds
+
+        def hash_in_slot(password):
+            slot = slots.acquire()
+            while slot is None:
+                time.sleep(SLOT_WAIT)
+                slot = slots.acquire()
+            try:
+                return generate_password_hash(password, rounds)
+            finally:
+                slots.release(slot)
+
+        return [hashed.decode('utf-8') for hashed in
+                self._get_pool().map(hash_in_slot, passwords)]
+
+    def check(self, hashed, password):
+        ''' Checks a password against a hash '''
+        return self._run(check_password_hash, hashed, password)
+
+    def needs_rehash(self, hashed):
+        ''' Checks if a hash was made with a lower cost than the current '''
+        return hash_rounds(hashed) < self.rounds
+
+
+password_hasher = PasswordHasher()
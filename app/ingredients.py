@@ -0,0 +1,176 @@
+''' This script parses recipe ingredients into the ingredient index and
+    answers "what can I cook" searches from it.
+
+    The free-text ingredients of a recipe are split into items, stripped of
+    quantities and units and normalised so that "2 cups of Tomatoes" and
+    "tomato" index the same ingredient. The index is refreshed whenever a
+    recipe's ingredients are written.
+'''
+
+import re
+
+from sqlalchemy import Float, cast, event, func, inspect
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from .db import db
+from .models.ingredient import Ingredient, recipe_ingredients
+from .models.recipe import Recipe
+
+SEPARATOR = re.compile(r'[,;\n]|\band\b|&')
+NON_LETTERS = re.compile(r'[^a-z\s]')
+UNITS = {
+    'cup', 'cups', 'tbsp', 'tsp', 'tablespoon', 'tablespoons', 'teaspoon',
+    'teaspoons', 'g', 'kg', 'gram', 'grams', 'ml', 'l', 'litre', 'litres',
+    'liter', 'liters', 'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound',
+    'pounds', 'pinch', 'handful', 'clove', 'cloves', 'piece', 'pieces',
+    'slice', 'slices', 'can', 'cans', 'of', 'a', 'an', 'some'}
+
+
+def singular(word):
+    ''' Returns a rough singular form of an english word '''
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def normalise_ingredient(item):
+    ''' Normalises one ingredient item, returns None if nothing is left
+
+        :param str item: An ingredient as written in a recipe
+        :return: The ingredient name used in the index
+    '''
+    words = NON_LETTERS.sub(' ', item.lower()).split()
+    while words and words[0] in UNITS:
+        words.pop(0)
+    if not words:
+        return None
+    words[-1] = singular(words[-1])
+    return ' '.join(words)[:100]
+
+
+def parse_ingredients(text):
+    ''' Splits free-text ingredients into normalised ingredient names
+
+        :param str text: The ingredients of a recipe
+        :return: A sorted list of unique ingredient names
+    '''
+    names = {normalise_ingredient(item)
+             for item in SEPARATOR.split(text or '')}
+    names.discard(None)
+    return sorted(names)
+
+
+def insert_ingredients(session, names):
+    ''' Adds ingredients to the index, leaving out the names that are
+        already there, even when another transaction has just added them
+    '''
+    table = Ingredient.__table__
+    statement = table.insert()
+    dialect = session.get_bind(clause=statement).dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table).on_conflict_do_nothing(
+            index_elements=[table.c.name])
+    elif dialect == 'sqlite':
+        statement = statement.prefix_with('OR IGNORE')
+    session.execute(statement, [{'name': name} for name in names])
+
+
+def resolve_ingredients(session, names):
+    ''' Returns the Ingredient rows for names, adding the missing ones '''
+    if not names:
+        return []
+    with session.no_autoflush:
+        found = {an_ingredient.name: an_ingredient for an_ingredient in
+                 session.query(Ingredient).filter(Ingredient.name.in_(names))}
+        missing = [name for name in names if name not in found]
+        if missing:
+            insert_ingredients(session, missing)
+            found.update(
+                (an_ingredient.name, an_ingredient) for an_ingredient in
+                session.query(Ingredient).filter(
+                    Ingredient.name.in_(missing)))
+    return [found[name] for name in names]
+
+
+def index_recipe(session, a_recipe):
+    ''' Points a recipe at the ingredients parsed from its text '''
+    names = parse_ingredients(a_recipe.ingredients)
+    a_recipe.ingredient_items = resolve_ingredients(session, names)
+    a_recipe.ingredient_count = len(names)
+
+
+def link_ingredients(session, parsed):
+    ''' Indexes recipes inserted without the ORM
+
+        :param list parsed: (recipe_id, ingredient names) pairs
+    '''
+    names = sorted({name for _, recipe_names in parsed
+                    for name in recipe_names})
+    found = {an_ingredient.name: an_ingredient for an_ingredient in
+             resolve_ingredients(session, names)}
+    rows = [{'recipe_id': recipe_id,
+             'ingredient_id': found[name].ingredient_id}
+            for recipe_id, recipe_names in parsed for name in recipe_names]
+    if rows:
+        session.execute(recipe_ingredients.insert(), rows)
+
+
+@event.listens_for(Session, 'before_flush')
+def index_changed_recipes(session, flush_context, instances):
+    ''' Reindexes the recipes whose ingredients are about to be written '''
+    for instance in list(session.new) + list(session.dirty):
+        if not isinstance(instance, Recipe):
+            continue
+        if (instance in session.new or
+                inspect(instance).attrs.ingredients.history.has_changes()):
+            index_recipe(session, instance)
+
+
+def pantry_recipes(user_id, names):
+    ''' Builds a query of the recipes of a user that use any of the given
+        ingredients, ranked by the share of their ingredients covered.
+        The ranking comes from the index: the matches per recipe are counted
+        over the index rows of the given ingredients only.
+
+        :param int user_id: The owner of the recipes
+        :param list names: The normalised names of the ingredients at hand
+        :return: A BaseQuery object of (Recipe, matched) tuples
+    '''
+    ingredient_ids = db.session.query(Ingredient.ingredient_id).filter(
+        Ingredient.name.in_(names or ['']))
+    matches = db.session.query(
+        recipe_ingredients.c.recipe_id,
+        func.count().label('matched')).join(
+            Recipe, Recipe.recipe_id == recipe_ingredients.c.recipe_id).filter(
+                Recipe.created_by == user_id,
+                recipe_ingredients.c.ingredient_id.in_(ingredient_ids)
+    ).group_by(recipe_ingredients.c.recipe_id).subquery()
+    coverage = cast(matches.c.matched, Float) / Recipe.ingredient_count
+    return Recipe.query.join(
+        matches, matches.c.recipe_id == Recipe.recipe_id).add_columns(
+            matches.c.matched).order_by(
+                coverage.desc(), matches.c.matched.desc(),
+                Recipe.recipe_id.desc())
+
+
+def reindex_recipes(batch_size=1000):
+    ''' Indexes the ingredients of every recipe, a batch at a time
+
+        :return: The number of recipes indexed
+    '''
+    indexed, last_id = 0, 0
+    while True:
+        batch = Recipe.query.filter(Recipe.recipe_id > last_id).order_by(
+            Recipe.recipe_id).limit(batch_size).all()
+        if not batch:
+            return indexed
+        for a_recipe in batch:
+            index_recipe(db.session, a_recipe)
+        last_id = batch[-1].recipe_id
+        db.session.commit()
+        indexed += len(batch)
@@ -10,11 +10,69 @@ class Blacklist(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     token = db.Column(db.String(500), unique=True, nullable=False)
-    blacklist_date = db.Column(db.DateTime, nullable=False)
+    blacklist_date = db.Column(db.DateTime, nullable=False, index=True)
+    # when the token stops validating, so the row can then be dropped
+    expires = db.Column(db.DateTime, nullable=True, index=True)
 
-    def __init__(self, token):
+    def __init__(self, token, expires=None):
         self.token = token
         self.blacklist_date = datetime.now()
+        self.expires = expires
+
+    @classmethod
+    def purge_expired(cls, max_age, batch_size=1000, now=None):
+        ''' Deletes the rows of tokens that can no longer validate, in
+            batches so that the table isn't locked for long.
+            Rows without an expiry are kept for the longest token lifetime.
+            The generation of the table is bumped once rows are gone so every
+            node rebuilds its revocation cache.
+
+            :param timedelta max_age: The longest lifetime of a token
+            :param int batch_size: The number of rows deleted per transaction
+            :return: The number of rows deleted
+        '''
+        now = now or datetime.now()
+        expired = db.or_(
+            cls.expires < now,
+            db.and_(cls.expires.is_(None), cls.blacklist_date < now - max_age))
+        purged = 0
+        while True:
+            ids = [row.id for row in db.session.query(cls.id).filter(
+                expired).limit(batch_size)]
+            if not ids:
+                if purged:
+                    BlacklistGeneration.bump()
+                return purged
+            cls.query.filter(cls.id.in_(ids)).delete(
+                synchronize_session=False)
+            db.session.commit()
+            purged += len(ids)
 
     def __repr__(self):
         return '<id: token: {}'.format(self.token)
+
+
+class BlacklistGeneration(db.Model):
+    ''' Class representing the blacklist_generation table, a single row
+        counting the purges of the blacklisted table
+    '''
+
+    __tablename__ = 'blacklist_generation'
+
+    id = db.Column(db.Integer, primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def current(cls):
+        ''' Returns the number of purges that removed rows so far '''
+        return db.session.query(cls.generation).scalar() or 0
+
+    @classmethod
+    def bump(cls):
+        ''' Records a purge that removed rows '''
+        if not cls.query.update({cls.generation: cls.generation + 1}):
+            db.session.add(cls(id=1, generation=1))
+        db.session.commit()
+
+    def __repr__(self):
+        return '<generation: {}>'.format(self.generation)
@@ -7,6 +7,13 @@ class Category(db.Model):
     ''' Class representing the categories table '''
 
     __tablename__ = 'categories'
+    __table_args__ = (
+        db.Index('ix_categories_created_by_category_id',
+                 'created_by', 'category_id'),
+        # the duplicate name checks and the name lookups of imports
+        db.Index('ix_categories_created_by_category_name',
+                 'created_by', 'category_name'),
+    )
 
     category_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     category_name = db.Column(db.String(100), nullable=False)
@@ -15,9 +22,17 @@ class Category(db.Model):
     date_modified = db.Column(
         db.DateTime, default=db.func.current_timestamp(),
         onupdate=db.func.current_timestamp())
-    created_by = db.Column(db.Integer, db.ForeignKey('users.user_id'))
+    # bumped by every update, date_modified only moves once a second on SQLite
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        onupdate=db.literal_column('version') + 1)
+    created_by = db.Column(
+        db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'))
+    # kept up to date by app.counters
+    recipe_count = db.Column(db.Integer, nullable=False, default=0)
+    # the database deletes the recipes, they aren't loaded to be deleted
     recipes = db.relationship(
-        'Recipe', backref='category', cascade='all, delete-orphan')
+        'Recipe', backref='category', cascade='all, delete-orphan',
+        passive_deletes=True)
 
     def __init__(self, category_name, description, created_by):
         ''' Initialise the category with a name, description and created by '''
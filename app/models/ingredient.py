@@ -0,0 +1,30 @@
+''' This script holds the ingredient model and the recipe ingredients index '''
+
+from ..db import db
+
+# inverted index of the ingredients each recipe uses
+recipe_ingredients = db.Table(
+    'recipe_ingredients',
+    db.Column('recipe_id', db.Integer,
+              db.ForeignKey('recipes.recipe_id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('ingredient_id', db.Integer,
+              db.ForeignKey('ingredients.ingredient_id'), primary_key=True),
+    db.Index('ix_recipe_ingredients_ingredient_id_recipe_id',
+             'ingredient_id', 'recipe_id'))
+
+
+class Ingredient(db.Model):
+    ''' Class representing the ingredients table '''
+
+    __tablename__ = 'ingredients'
+
+    ingredient_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+
+    def __init__(self, name):
+        ''' Initialise the ingredient with its normalised name '''
+        self.name = name
+
+    def __repr__(self):
+        return '<Ingredient: {}>'.format(self.name)
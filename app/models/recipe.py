@@ -1,22 +1,44 @@
 from ..db import db
+from .ingredient import recipe_ingredients
 
 
 class Recipe(db.Model):
     ''' Class representing the recipes table '''
 
     __tablename__ = 'recipes'
+    __table_args__ = (
+        db.Index('ix_recipes_created_by_recipe_id', 'created_by', 'recipe_id'),
+        db.Index('ix_recipes_created_by_category_id_recipe_id',
+                 'created_by', 'category_id', 'recipe_id'),
+        # the recipe previews of categories and the cascade of their deletes
+        db.Index('ix_recipes_category_id_recipe_id',
+                 'category_id', 'recipe_id'),
+        # the duplicate name checks
+        db.Index('ix_recipes_category_id_recipe_name',
+                 'category_id', 'recipe_name'),
+    )
 
     # table columns
     recipe_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     recipe_name = db.Column(db.String(100), nullable=False)
     ingredients = db.Column(db.String(256), nullable=False)
-    created_by = db.Column(db.Integer, db.ForeignKey('users.user_id'))
+    created_by = db.Column(
+        db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'))
     date_created = db.Column(db.DateTime, default=db.func.current_timestamp())
     date_modified = db.Column(
         db.DateTime, default=db.func.current_timestamp(),
         onupdate=db.func.current_timestamp())
+    # bumped by every update, date_modified only moves once a second on SQLite
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        onupdate=db.literal_column('version') + 1)
     category_id = db.Column(
-        db.Integer, db.ForeignKey('categories.category_id'))
+        db.Integer, db.ForeignKey('categories.category_id',
+                                  ondelete='CASCADE'))
+    # the parsed ingredients, kept up to date by app.ingredients
+    ingredient_items = db.relationship('Ingredient',
+                                       secondary=recipe_ingredients,
+                                       passive_deletes=True)
+    ingredient_count = db.Column(db.Integer, nullable=False, default=0)
 
     def __init__(self, recipe_name, ingredients, category_id, created_by):
         ''' Initialise the recipe with a name, ingredients and created by '''
@@ -1,6 +1,5 @@
-from flask_bcrypt import Bcrypt
-
 from ..db import db
+from ..hashing import password_hasher
 
 
 class User(db.Model):
@@ -13,10 +12,17 @@ class User(db.Model):
     username = db.Column(db.String(50), nullable=False, unique=True)
     password = db.Column(db.String(256), nullable=False)
     email = db.Column(db.String(256), nullable=False, unique=True)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False)
+    # kept up to date by app.counters
+    category_count = db.Column(db.Integer, nullable=False, default=0)
+    recipe_count = db.Column(db.Integer, nullable=False, default=0)
+    # the database deletes a user's rows, see the ondelete of their keys
     categories = db.relationship(
-        'Category', backref='user', cascade='all, delete-orphan')
+        'Category', backref='user', cascade='all, delete-orphan',
+        passive_deletes=True)
     recipes = db.relationship(
-        'Recipe', backref='user', cascade='all, delete-orphan')
+        'Recipe', backref='user', cascade='all, delete-orphan',
+        passive_deletes=True)
 
     def __init__(self, username, email):
         ''' Initialise the user with a username '''
@@ -25,11 +31,15 @@ class User(db.Model):
 
     def password_hasher(self, password):
         ''' hashes the password '''
-        self.password = Bcrypt().generate_password_hash(password).decode('utf-8')
+        self.password = password_hasher.hash(password)
 
     def password_checker(self, password):
         ''' Check if hashed password and password match '''
-        return Bcrypt().check_password_hash(self.password, password)
+        return password_hasher.check(self.password, password)
+
+    def password_needs_rehash(self):
+        ''' Check if the password was hashed with an outdated cost '''
+        return password_hasher.needs_rehash(self.password)
 
     def __repr__(self):
         return '<User: {}>'.format(self.username)
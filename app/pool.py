@@ -0,0 +1,136 @@
+''' This script holds the connection pool of the app and the statement
+    timeout of its transactions.
+
+    The pool is a QueuePool that also counts how long checkouts wait for a
+    connection, how many of them give up and how many connections were
+    found dead, so it can be sized against the number of gunicorn workers.
+    The dead connections are the ones SQLAlchemy invalidates, either when
+    its pre-ping finds them closed or when a statement does.
+
+    Behind PgBouncer in transaction mode the app keeps no pool of its own,
+    and the statement timeout is set with SET LOCAL so it ends with the
+    transaction whichever server connection runs it.
+'''
+
+import os
+import threading
+import time
+
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+class CheckoutStats(object):
+    ''' The counters of a pool, carried over when the pool is recreated '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.dead = 0
+
+    def count_dead(self, dbapi_connection, connection_record, exception):
+        ''' Counts a connection invalidated by the pre-ping or by a
+            statement that found it disconnected
+        '''
+        with self.lock:
+            self.dead += 1
+
+
+class InstrumentedQueuePool(QueuePool):
+    ''' A QueuePool that reports its saturation '''
+
+    def __init__(self, creator, checkout_stats=None, **kw):
+        super().__init__(creator, **kw)
+        if checkout_stats is None:
+            checkout_stats = CheckoutStats()
+            # a recreated pool inherits the listeners with the dispatch
+            event.listen(self, 'invalidate', checkout_stats.count_dead)
+        self._checkout_stats = checkout_stats
+
+    def _do_get(self):
+        stats = self._checkout_stats
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with stats.lock:
+                stats.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with stats.lock:
+                stats.checkouts += 1
+                stats.wait_total += waited
+                stats.wait_max = max(stats.wait_max, waited)
+
+    def recreate(self):
+        the_pool = super().recreate()
+        the_pool._checkout_stats = self._checkout_stats
+        return the_pool
+
+    def stats(self):
+        ''' Returns the pool usage and the checkout waits since the engine
+            started
+        '''
+        stats = self._checkout_stats
+        with stats.lock:
+            checkouts, wait_total = stats.checkouts, stats.wait_total
+            wait_max, timeouts, dead = (stats.wait_max, stats.timeouts,
+                                        stats.dead)
+        return {'size': self.size(),
+                'checked_out': self.checkedout(),
+                'idle': self.checkedin(),
+                # negative while fewer than size connections were opened
+                'overflow': self.overflow(),
+                'max_overflow': self._max_overflow,
+                'checkouts': checkouts,
+                'wait_ms_avg': round(wait_total * 1000 / checkouts, 3)
+                if checkouts else 0.0,
+                'wait_ms_max': round(wait_max * 1000, 3),
+                'timeouts': timeouts,
+                'dead_connections': dead}
+
+
+def pool_stats(engine):
+    ''' Describes the pool of an engine in the worker process
+
+        :return: A dictionary with the pool class, the process id and the
+            counters of an instrumented pool
+    '''
+    stats = {'pool': type(engine.pool).__name__, 'pid': os.getpid()}
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        stats.update(engine.pool.stats())
+    return stats
+
+
+def statement_timeout():
+    ''' Returns the statement timeout of the current request in
+        milliseconds, endpoints are named without their blueprint. Outside
+        of a request, in a manage.py command, it is the command timeout.
+    '''
+    config = current_app.config
+    if not has_request_context():
+        return config['DATABASE_COMMAND_STATEMENT_TIMEOUT']
+    if request.endpoint:
+        endpoint = request.endpoint.rpartition('.')[2]
+        if endpoint in config['DATABASE_STATEMENT_TIMEOUTS']:
+            return config['DATABASE_STATEMENT_TIMEOUTS'][endpoint]
+    return config['DATABASE_STATEMENT_TIMEOUT']
+
+
+@event.listens_for(Engine, 'begin')
+def limit_statements(conn):
+    ''' Caps how long each statement of a transaction may run on Postgres.
+        It goes through the DBAPI cursor so the query stats don't count it.
+    '''
+    if conn.dialect.name != 'postgresql' or not has_app_context():
+        return
+    cursor = conn.connection.cursor()
+    cursor.execute('SET LOCAL statement_timeout = %s',
+                   (int(statement_timeout()),))
+    cursor.close()
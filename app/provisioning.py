@@ -0,0 +1,191 @@
+''' This script handles provisioning users in bulk from CSV or NDJSON.
+
+    Rows are validated with the same rules as registration, passwords are
+    hashed a chunk at a time and each chunk of users is inserted in a single
+    transaction. The command line hashes across a pool of processes, the
+    admin endpoint on the threads of the app's password hasher. Rows that
+    are invalid or clash with an existing user are reported instead of
+    stopping the run.
+'''
+
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+from flask_bcrypt import generate_password_hash
+from sqlalchemy.exc import IntegrityError
+
+from .db import db
+from .models.user import User
+from .validation_helper import (
+    username_validator, password_validator, email_validator)
+
+FORMATS = ('csv', 'ndjson')
+FIELDS = ('username', 'password', 'email')
+
+
+def read_users(stream, fmt):
+    ''' Reads user records from a binary stream
+
+        :param stream: The file or request stream to read from
+        :param str fmt: Either csv or ndjson
+        :return: A generator of (line number, record) tuples
+    '''
+    text = io.TextIOWrapper(stream, encoding='utf-8')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_no, record if isinstance(record, dict) else None
+
+
+def hash_password(password, rounds):
+    ''' Hashes a password, run in the worker processes '''
+    return generate_password_hash(password, rounds).decode('utf-8')
+
+
+@contextmanager
+def hashing_processes(rounds, processes=None):
+    ''' Starts a pool of processes to hash passwords with, for the command
+        line only since the forks would share a web worker's connections
+
+        :param int rounds: The bcrypt cost to hash the passwords with
+        :param int processes: The number of processes, defaults to the
+                              number of cores
+        :return: A function that hashes a list of passwords
+    '''
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        def hash_passwords(passwords):
+            return list(pool.map(
+                hash_password, passwords, [rounds] * len(passwords),
+                chunksize=max(1, len(passwords) // (4 * processes))))
+        yield hash_passwords
+
+
+def validate_user(record):
+    ''' Checks a record with the registration rules
+
+        :return: An error message or None if the record is valid
+    '''
+    if record is None:
+        return 'The line is not a valid record'
+    for field in FIELDS:
+        if not isinstance(record.get(field) or '', str):
+            return f'The {field} should be a string'
+    username = record.get('username') or ''
+    password = record.get('password') or ''
+    email = record.get('email') or ''
+    if not username_validator(username):
+        return f'{username} is not a valid username'
+    if not password_validator(password):
+        return 'Password can only comprise of alphanumeric values & an ' \
+            'underscore and between 6 to 25 characters long'
+    if not email_validator(email):
+        return f'{email} is not a valid email'
+    return None
+
+
+def _existing(column, values):
+    ''' Returns the values of a unique user column that are already taken '''
+    if not values:
+        return set()
+    return {value for value, in db.session.query(column).filter(
+        column.in_(values))}
+
+
+def _insert_chunk(rows):
+    ''' Inserts a chunk of users in one transaction. If another writer took
+        one of the names in the meantime, falls back to inserting the rows
+        one at a time so only the clashing rows fail.
+
+        :return: The line numbers of the rows that clashed
+    '''
+    try:
+        db.session.execute(User.__table__.insert(),
+                           [row for _, row in rows])
+        db.session.commit()
+        return set()
+    except IntegrityError:
+        db.session.rollback()
+    clashed = set()
+    for line_no, row in rows:
+        try:
+            db.session.execute(User.__table__.insert(), row)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            clashed.add(line_no)
+    return clashed
+
+
+def provision_users(records, hash_passwords, chunk_size=1000):
+    ''' Creates users from records in chunks
+
+        :param records: An iterable of (line number, record) tuples
+        :param hash_passwords: A function that hashes a list of passwords
+        :param int chunk_size: The number of users inserted per transaction
+        :return: A generator of per-row report dictionaries
+    '''
+    seen_usernames, seen_emails = set(), set()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        valid = []
+        for line_no, record in chunk:
+            error = validate_user(record)
+            if error:
+                yield {'line': line_no, 'status': 'invalid',
+                       'message': error}
+                continue
+            valid.append((line_no, record['username'].lower(),
+                          record['email'].lower(), record['password']))
+
+        taken_usernames = _existing(
+            User.username, [username for _, username, _, _ in valid])
+        taken_emails = _existing(
+            User.email, [email for _, _, email, _ in valid])
+        rows = []
+        for line_no, username, email, password in valid:
+            if username in taken_usernames or username in seen_usernames:
+                yield {'line': line_no, 'username': username,
+                       'status': 'conflict',
+                       'message': f'The username {username} already exists'}
+            elif email in taken_emails or email in seen_emails:
+                yield {'line': line_no, 'username': username,
+                       'status': 'conflict',
+                       'message': f'The email {email} already exists'}
+            else:
+                seen_usernames.add(username)
+                seen_emails.add(email)
+                rows.append((line_no, username, email, password))
+
+        hashes = hash_passwords([password for _, _, _, password in rows])
+        inserts = [(line_no, {'username': username, 'email': email,
+                              'password': hashed, 'is_admin': False,
+                              'category_count': 0, 'recipe_count': 0})
+                   for (line_no, username, email, _), hashed
+                   in zip(rows, hashes)]
+        clashed = _insert_chunk(inserts) if inserts else set()
+        for line_no, row in inserts:
+            if line_no in clashed:
+                yield {'line': line_no, 'username': row['username'],
+                       'status': 'conflict',
+                       'message': 'The username or email already exists'}
+            else:
+                yield {'line': line_no, 'username': row['username'],
+                       'status': 'created'}
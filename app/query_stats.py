@@ -0,0 +1,60 @@
+''' This script counts and times the SQL statements run by each request.
+
+    The totals are logged when a request ends and, when
+    QUERY_STATS_HEADERS is set, returned in the X-Query-Count and
+    X-Query-Time (milliseconds) response headers.
+'''
+
+import logging
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def statement_started(conn, cursor, statement, parameters, context,
+                      executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def statement_finished(conn, cursor, statement, parameters, context,
+                       executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+        g.query_time += elapsed
+
+
+class QueryStats(object):
+    ''' Reports the SQL statements each request of the app ran '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.start)
+        app.after_request(self.report)
+
+    @staticmethod
+    def start():
+        g.query_count = 0
+        g.query_time = 0.0
+
+    @staticmethod
+    def report(response):
+        ''' Logs the totals of the request and adds them to the response '''
+        if 'query_count' not in g:
+            return response
+        query_time = round(g.query_time * 1000, 2)
+        logger.info('%s %s ran %d queries in %.2fms', request.method,
+                    request.path, g.query_count, query_time)
+        if current_app.config['QUERY_STATS_HEADERS']:
+            response.headers['X-Query-Count'] = str(g.query_count)
+            response.headers['X-Query-Time'] = str(query_time)
+        return response
@@ -0,0 +1,152 @@
+''' This script sends the reads of GET requests to read replicas.
+
+    The replicas are the SQLALCHEMY_BINDS whose names start with replica.
+    A GET or HEAD request reads from one of them picked at random, unless
+    the user wrote something in the last REPLICA_STICKY_SECONDS, in which
+    case it reads from the primary so they see their own edits. The window
+    is kept in the backend of REPLICA_STICKY_URL. Flushes and INSERT,
+    UPDATE and DELETE statements always go to the primary.
+
+    A replica that fails to give a connection is skipped for
+    REPLICA_RETRY_SECONDS and the read moves to another one, or to the
+    primary while none is up. Dropped connections are caught by the pool's
+    pre-ping.
+'''
+
+import logging
+import random
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy import SignallingSession, get_state
+from sqlalchemy import exc
+from sqlalchemy.sql.expression import UpdateBase
+
+from .response_cache import make_backend
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def replica_names(app):
+    ''' Returns the names of the replica binds of an app '''
+    return sorted(name for name in app.config['SQLALCHEMY_BINDS'] or {}
+                  if name.startswith('replica'))
+
+
+class ReadReplicas(object):
+    ''' Picks the database each request of the app reads from '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        sticky = make_backend(app.config['REPLICA_STICKY_URL'],
+                              app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        if sticky is None and replica_names(app):
+            raise ValueError('Read replicas need REPLICA_STICKY_URL, a '
+                             'redis:// URL the workers share')
+        app.extensions['read_replicas'] = {'sticky': sticky, 'down': {}}
+        # runs after a streamed response is done, like an import
+        app.teardown_request(self.stick)
+
+    @property
+    def _state(self):
+        return current_app.extensions['read_replicas']
+
+    def sticky_key(self, user_id):
+        return f'read_replicas:sticky:{user_id}'
+
+    def stick(self, exception=None):
+        ''' Keeps the reads of a user who wrote on the primary for a while '''
+        if (request.method in READ_METHODS or self._state['sticky'] is None
+                or not replica_names(current_app)):
+            return
+        user_id = get_jwt_identity()
+        if user_id is not None:
+            self._state['sticky'].set(
+                self.sticky_key(user_id), '1',
+                current_app.config['REPLICA_STICKY_SECONDS'])
+
+    def is_sticky(self, user_id):
+        ''' Tells if a user wrote in the last REPLICA_STICKY_SECONDS '''
+        sticky = self._state['sticky']
+        if sticky is None:
+            return True
+        return sticky.get(self.sticky_key(user_id)) is not None
+
+    def _engine_of(self, name):
+        return get_state(current_app).db.get_engine(current_app, bind=name)
+
+    def pick(self):
+        ''' Returns the engine of a replica that is up, None if none is '''
+        down, now = self._state['down'], time.monotonic()
+        names = [name for name in replica_names(current_app)
+                 if down.get(name, 0) <= now]
+        return self._engine_of(random.choice(names)) if names else None
+
+    def fail_over(self, engine, error):
+        ''' Skips a replica that failed to give a connection and picks the
+            one the request reads from next
+
+            :return: False if the engine isn't the one of a replica
+        '''
+        if not has_request_context():
+            return False
+        for name in replica_names(current_app):
+            if self._engine_of(name) is engine:
+                break
+        else:
+            return False
+        logger.warning('Read replica %s is unavailable: %s', name, error)
+        self._state['down'][name] = (
+            time.monotonic() + current_app.config['REPLICA_RETRY_SECONDS'])
+        g.read_replica = self.pick()
+        return True
+
+    def engine(self):
+        ''' Returns the engine the current request reads from, None for the
+            primary
+        '''
+        if (not has_request_context() or request.method not in READ_METHODS
+                or 'read_replicas' not in current_app.extensions
+                or not replica_names(current_app)):
+            return None
+        # the identity is only known once the token is checked
+        user_id = get_jwt_identity()
+        if user_id is not None:
+            if g.get('replica_user') != user_id:
+                g.replica_user = user_id
+                g.replica_sticky = self.is_sticky(user_id)
+            if g.replica_sticky:
+                return None
+        if 'read_replica' not in g:
+            g.read_replica = self.pick()
+        return g.read_replica
+
+
+read_replicas = ReadReplicas()
+
+
+class RoutingSession(SignallingSession):
+    ''' A session that reads from a replica during GET requests '''
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and not isinstance(clause, UpdateBase):
+            engine = read_replicas.engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+    def _connection_for_bind(self, engine, execution_options=None, **kw):
+        while True:
+            try:
+                return super()._connection_for_bind(
+                    engine, execution_options, **kw)
+            except exc.DBAPIError as error:
+                if not read_replicas.fail_over(engine, error):
+                    raise
+                engine = self.get_bind()
@@ -0,0 +1,208 @@
+''' This script holds the cache of GET responses of the categories and
+    recipes endpoints.
+
+    Responses are cached per user, route and sorted query arguments. Each
+    user has a generation number that is part of the keys of their entries;
+    a write by the user bumps it so none of the old entries is read again,
+    and they are left to expire. The entries live in an in-process LRU, or
+    in Redis so that every worker shares them.
+'''
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt_identity
+
+# headers stored with a cached body, the others belong to one request
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class MemoryBackend(object):
+    ''' An in-process LRU of at most max_entries values, each expiring after
+        its ttl. Counters are kept apart so they are never evicted.
+    '''
+
+    name = 'memory'
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key])
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend(object):
+    ''' Keeps the values in Redis through a redis-py compatible client '''
+
+    name = 'redis'
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        value = self.client.get(key)
+        return None if value is None else value.decode('utf-8')
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=ttl)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+def make_backend(url, max_entries):
+    ''' Returns the backend of a RESPONSE_CACHE_URL or REPLICA_STICKY_URL,
+        None for none
+
+        :param str url: memory:// or a redis:// URL
+        :param int max_entries: The size of the in-process LRU
+    '''
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return MemoryBackend(max_entries)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        import redis
+        return RedisBackend(redis.StrictRedis.from_url(url))
+    raise ValueError(f'{url} is not a supported response cache URL')
+
+
+class ResponseCache(object):
+    ''' Caches the GET responses of the endpoints decorated with cached and
+        drops a user's entries when an endpoint decorated with invalidates
+        is called
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['response_cache'] = make_backend(
+            app.config['RESPONSE_CACHE_URL'],
+            app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        # after_request functions run last to first, so this one sees the
+        # validators added by the ones registered after it
+        app.after_request(self.store)
+
+    @property
+    def backend(self):
+        return current_app.extensions['response_cache']
+
+    def generation_key(self, user_id):
+        return f'response_cache:generation:{user_id}'
+
+    def key(self, user_id):
+        ''' Builds the key of the current request's response '''
+        generation = self.backend.get(self.generation_key(user_id)) or '0'
+        args = urlencode(sorted(request.args.items(multi=True)))
+        digest = hashlib.sha1(
+            f'{request.path}?{args}'.encode('utf-8')).hexdigest()
+        return f'response_cache:{user_id}:{generation}:{digest}'
+
+    def cached(self, func):
+        ''' Serves a GET from the cache, or caches its response '''
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if self.backend is None or (request.if_modified_since and
+                                        not request.if_none_match):
+                # only the handler knows if its Last-Modified date is safe
+                return func(*args, **kwargs)
+            key = self.key(get_jwt_identity())
+            entry = self.backend.get(key)
+            if entry is None:
+                self.backend.incr('response_cache:misses')
+                g.response_cache_key = key
+                return func(*args, **kwargs)
+            self.backend.incr('response_cache:hits')
+            return self.cached_response(json.loads(entry))
+        return wrapper
+
+    def invalidates(self, func):
+        ''' Drops the cached responses of the user once a write is done '''
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.invalidate(get_jwt_identity())
+        return wrapper
+
+    def invalidate(self, user_id):
+        ''' Moves a user to a new generation so their entries are missed '''
+        if self.backend is not None:
+            self.backend.incr(self.generation_key(user_id))
+
+    @staticmethod
+    def cached_response(entry):
+        ''' Rebuilds a response from a cache entry, a 304 if the client
+            already has it
+        '''
+        headers = entry['headers']
+        etag = headers.get('ETag', '').strip('"')
+        if etag and request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(entry['body'])
+        for name, value in headers.items():
+            response.headers[name] = value
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    def store(self, response):
+        ''' Caches a successful response of a cache miss '''
+        key = g.pop('response_cache_key', None)
+        if key is None:
+            return response
+        response.headers['X-Cache'] = 'MISS'
+        if response.status_code == 200:
+            entry = {'body': response.get_data(as_text=True),
+                     'headers': {name: response.headers[name]
+                                 for name in CACHED_HEADERS
+                                 if name in response.headers}}
+            self.backend.set(key, json.dumps(entry),
+                             current_app.config['RESPONSE_CACHE_TTL'])
+        return response
+
+    def stats(self):
+        ''' Returns the hits and misses counted by the backend '''
+        if self.backend is None:
+            return {'backend': None, 'hits': 0, 'misses': 0, 'hit_rate': None}
+        hits = int(self.backend.get('response_cache:hits') or 0)
+        misses = int(self.backend.get('response_cache:misses') or 0)
+        return {'backend': self.backend.name, 'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 4)
+                if hits + misses else None}
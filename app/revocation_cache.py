@@ -0,0 +1,214 @@
+''' This script holds the revocation cache that sits in front of the
+    blacklisted table.
+
+    Revoked token ids are kept in a Bloom filter stored in a memory-mapped
+    file so that every worker process on a node reads and writes the same
+    bits. A token that is not in the filter is definitely not revoked and
+    the DB is never asked about it; on a filter hit the blacklisted table is
+    queried to rule out a false positive.
+
+    Bits can't be unset for a single key, so when rows are purged from the
+    blacklisted table its generation moves on, and the first worker of each
+    node to notice clears the filter and loads the remaining tokens again.
+'''
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .db import db
+from .models.blacklist import Blacklist, BlacklistGeneration
+
+# magic, number of bits, number of hashes, refresh watermark (epoch
+# seconds), generation of the blacklisted table the bits were loaded from
+HEADER = struct.Struct('<4sIIdQ')
+MAGIC = b'RBF2'
+
+
+class BloomFile(object):
+    ''' A Bloom filter backed by a shared, memory-mapped file '''
+
+    def __init__(self, path, bits, hashes):
+        ''' Initialise the filter with a file path, its size in bits and the
+            number of hash functions used per key
+        '''
+        self.path = path
+        self.bits = bits
+        self.hashes = hashes
+        self.size = HEADER.size + (bits + 7) // 8
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        ''' Maps the file into memory, creating it if it doesn't exist or if
+            it was written with a different layout.
+            The file is reopened after a fork so that each process holds its
+            own lock on it.
+        '''
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, HEADER.size, 0)
+            if (os.fstat(fd).st_size != self.size or
+                    header[:len(MAGIC)] != MAGIC or
+                    HEADER.unpack(header)[1:3] != (self.bits, self.hashes)):
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, HEADER.pack(MAGIC, self.bits, self.hashes, 0,
+                                          0), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._map = mmap.mmap(fd, self.size, mmap.MAP_SHARED)
+        self._pid = os.getpid()
+
+    def _positions(self, key):
+        ''' Yields the bit positions of a key using double hashing '''
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = struct.unpack('<QQ', digest)
+        for i in range(self.hashes):
+            yield (first + i * second) % self.bits
+
+    def __contains__(self, key):
+        self._open()
+        for position in self._positions(key):
+            byte = self._map[HEADER.size + position // 8]
+            if not byte & (1 << (position % 8)):
+                return False
+        return True
+
+    def lock(self):
+        ''' Takes the exclusive lock that guards writes to the file '''
+        self._open()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def unlock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def add(self, key):
+        ''' Sets the bits of a key. The caller must hold the lock since
+            setting a bit is a read-modify-write of the whole byte.
+        '''
+        for position in self._positions(key):
+            offset = HEADER.size + position // 8
+            self._map[offset] |= 1 << (position % 8)
+
+    def clear(self, generation):
+        ''' Unsets every bit, resets the watermark and records the
+            generation the bits are about to be loaded from. Requires the
+            lock.
+        '''
+        self._map[HEADER.size:] = bytes(self.size - HEADER.size)
+        self._write_header(0, generation)
+
+    def _write_header(self, watermark, generation):
+        self._map[:HEADER.size] = HEADER.pack(
+            MAGIC, self.bits, self.hashes, watermark, generation)
+
+    @property
+    def watermark(self):
+        self._open()
+        return HEADER.unpack(self._map[:HEADER.size])[3]
+
+    @watermark.setter
+    def watermark(self, value):
+        self._write_header(value, self.generation)
+
+    @property
+    def generation(self):
+        self._open()
+        return HEADER.unpack(self._map[:HEADER.size])[4]
+
+
+class RevocationCache(object):
+    ''' Keeps the Bloom filter of the current app in sync with the
+        blacklisted table and answers the "is this token revoked?" question
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Registers the filter of the app with the extension '''
+        app.extensions['revocation_cache'] = {
+            'filter': BloomFile(app.config['REVOCATION_CACHE_PATH'],
+                                app.config['REVOCATION_CACHE_BITS'],
+                                app.config['REVOCATION_CACHE_HASHES']),
+            'last_refresh': 0
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions['revocation_cache']
+
+    def refresh(self, force=False):
+        ''' Adds the tokens blacklisted since the last refresh to the filter.
+            Workers share the watermark in the file header, so each revoked
+            token only has to be read from the DB once per node. The query
+            overlaps the watermark to allow for clock skew between nodes.
+            Once the blacklisted table has been purged every token is read
+            again into a cleared filter.
+            The DB is read before the lock is taken so that the other
+            workers aren't kept waiting on it.
+        '''
+        state = self._state
+        now = time.time()
+        interval = current_app.config['REVOCATION_CACHE_REFRESH']
+        if not force and now - state['last_refresh'] < interval:
+            return
+        state['last_refresh'] = now
+
+        bloom = state['filter']
+        generation = BlacklistGeneration.current()
+        watermark = bloom.watermark if bloom.generation >= generation else 0
+        overlap = current_app.config['REVOCATION_CACHE_OVERLAP']
+        since = datetime.fromtimestamp(watermark) - timedelta(
+            seconds=overlap) if watermark else datetime.min
+        revoked = db.session.query(
+            Blacklist.token, Blacklist.blacklist_date).filter(
+                Blacklist.blacklist_date >= since).all()
+
+        bloom.lock()
+        try:
+            # every token was read if the filter is behind the table
+            if bloom.generation < generation:
+                bloom.clear(generation)
+            newest = bloom.watermark
+            for token, blacklist_date in revoked:
+                bloom.add(token)
+                newest = max(newest, blacklist_date.timestamp())
+            bloom.watermark = newest
+        finally:
+            bloom.unlock()
+
+    def add(self, token):
+        ''' Adds a token that has just been blacklisted on this node '''
+        bloom = self._state['filter']
+        bloom.lock()
+        try:
+            bloom.add(token)
+        finally:
+            bloom.unlock()
+
+    def is_revoked(self, token):
+        ''' Checks if a token is revoked. Only goes to the DB on a filter hit.
+
+            :param str token: The jti of the token
+            :return: Boolean
+        '''
+        if not current_app.config['REVOCATION_CACHE_ENABLED']:
+            return Blacklist.query.filter_by(token=token).first() is not None
+        self.refresh()
+        if token not in self._state['filter']:
+            return False
+        return Blacklist.query.filter_by(token=token).first() is not None
@@ -0,0 +1,58 @@
+''' This script brings the schema of an existing database in line with the
+    models, for the changes create_all doesn't make to tables that already
+    exist.
+'''
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import AddConstraint, DDL
+
+from .db import db
+
+
+def cascade_foreign_keys(connection):
+    ''' Recreates the foreign keys that lack the ON DELETE of the models.
+        SQLite can't alter a constraint, its tables have to be recreated.
+
+        :param connection: A connection in a transaction
+        :return: The names of the tables whose keys were recreated
+    '''
+    if connection.dialect.name == 'sqlite':
+        raise ValueError('SQLite can\'t alter foreign keys, recreate the '
+                         'database to get them')
+    inspector = inspect(connection)
+    changed = []
+    for table in db.metadata.sorted_tables:
+        existing = inspector.get_foreign_keys(table.name)
+        for constraint in table.foreign_key_constraints:
+            if constraint.ondelete is None:
+                continue
+            for reflected in existing:
+                ondelete = reflected.get('options', {}).get('ondelete')
+                if (reflected['constrained_columns'] !=
+                        list(constraint.column_keys) or
+                        (ondelete or '').upper() == constraint.ondelete):
+                    continue
+                connection.execute(DDL(
+                    f'ALTER TABLE {table.name} DROP CONSTRAINT '
+                    f'{reflected["name"]}'))
+                connection.execute(AddConstraint(constraint))
+                changed.append(table.name)
+    return changed
+
+
+def create_missing_indexes(connection):
+    ''' Creates the indexes of the models an existing database lacks
+
+        :param connection: A connection in a transaction
+        :return: The names of the indexes created
+    '''
+    inspector = inspect(connection)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(
+            table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(connection)
+                created.append(index.name)
+    return created
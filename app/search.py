@@ -0,0 +1,157 @@
+''' This script handles full-text search over recipe names and ingredients.
+
+    Postgres keeps a weighted tsvector column on the recipes table up to date
+    with a trigger and indexes it with GIN. SQLite keeps an FTS5 table in
+    sync with triggers so the search can be run locally. Other databases
+    fall back to a LIKE scan.
+'''
+
+from sqlalchemy import DDL, column, event, func, literal_column, or_, table
+
+from .db import db
+from .models.recipe import Recipe
+
+SEARCH_INDEX_DDL = {
+    'postgresql': [
+        'ALTER TABLE recipes ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        '''CREATE OR REPLACE FUNCTION recipes_search_vector_update()
+           RETURNS trigger AS $$
+           BEGIN
+               NEW.search_vector :=
+                   setweight(to_tsvector('english',
+                             coalesce(NEW.recipe_name, '')), 'A') ||
+                   setweight(to_tsvector('english',
+                             coalesce(NEW.ingredients, '')), 'B');
+               RETURN NEW;
+           END
+           $$ LANGUAGE plpgsql''',
+        'DROP TRIGGER IF EXISTS recipes_search_vector_trigger ON recipes',
+        '''CREATE TRIGGER recipes_search_vector_trigger
+           BEFORE INSERT OR UPDATE OF recipe_name, ingredients ON recipes
+           FOR EACH ROW EXECUTE PROCEDURE recipes_search_vector_update()''',
+        '''UPDATE recipes SET recipe_name = recipe_name
+           WHERE search_vector IS NULL''',
+        '''CREATE INDEX IF NOT EXISTS ix_recipes_search_vector
+           ON recipes USING gin(search_vector)''',
+    ],
+    'sqlite': [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+           recipe_name, ingredients, content='recipes',
+           content_rowid='recipe_id', tokenize='porter unicode61')''',
+        '''CREATE TRIGGER IF NOT EXISTS recipes_fts_insert
+           AFTER INSERT ON recipes BEGIN
+               INSERT INTO recipes_fts(rowid, recipe_name, ingredients)
+               VALUES (new.recipe_id, new.recipe_name, new.ingredients);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS recipes_fts_delete
+           AFTER DELETE ON recipes BEGIN
+               INSERT INTO recipes_fts(
+                   recipes_fts, rowid, recipe_name, ingredients)
+               VALUES ('delete', old.recipe_id, old.recipe_name,
+                       old.ingredients);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS recipes_fts_update
+           AFTER UPDATE OF recipe_name, ingredients ON recipes BEGIN
+               INSERT INTO recipes_fts(
+                   recipes_fts, rowid, recipe_name, ingredients)
+               VALUES ('delete', old.recipe_id, old.recipe_name,
+                       old.ingredients);
+               INSERT INTO recipes_fts(rowid, recipe_name, ingredients)
+               VALUES (new.recipe_id, new.recipe_name, new.ingredients);
+           END''',
+        "INSERT INTO recipes_fts(recipes_fts) VALUES ('rebuild')",
+    ],
+}
+
+DROP_SEARCH_INDEX_DDL = {
+    'sqlite': ['DROP TABLE IF EXISTS recipes_fts'],
+}
+
+PAUSE_SEARCH_INDEX_DDL = {
+    'sqlite': ['DROP TRIGGER IF EXISTS recipes_fts_insert',
+               'DROP TRIGGER IF EXISTS recipes_fts_delete',
+               'DROP TRIGGER IF EXISTS recipes_fts_update'],
+}
+
+# the parts of the search index made with DDL rather than the models
+SEARCH_INDEX_OBJECTS = {('column', 'search_vector'),
+                        ('index', 'ix_recipes_search_vector')}
+
+# bm25 weights of a match in the recipe name and in the ingredients, on
+# Postgres the name is weighted A and the ingredients B
+NAME_WEIGHT = 10.0
+INGREDIENTS_WEIGHT = 1.0
+
+recipes_fts = table('recipes_fts', column('rowid'))
+
+
+def create_search_index(target, connection, **kw):
+    ''' Creates the search index of the recipes table and fills it.
+        Safe to run again on a database that already has it.
+    '''
+    for statement in SEARCH_INDEX_DDL.get(connection.dialect.name, []):
+        connection.execute(DDL(statement))
+
+
+def drop_search_index(target, connection, **kw):
+    ''' Drops the parts of the search index that outlive the recipes table '''
+    for statement in DROP_SEARCH_INDEX_DDL.get(connection.dialect.name, []):
+        connection.execute(DDL(statement))
+
+
+def pause_search_index(connection):
+    ''' Stops keeping the search index in sync row by row, for bulk loads.
+        create_search_index resumes it and rebuilds the index in one go.
+    '''
+    for statement in PAUSE_SEARCH_INDEX_DDL.get(connection.dialect.name, []):
+        connection.execute(DDL(statement))
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    ''' Leaves the search index out of the migrations autogenerated by
+        manage.py db migrate, which would otherwise drop it since the
+        models don't have it
+    '''
+    if type_ == 'table' and name.startswith('recipes_fts'):
+        return False
+    return (type_, name) not in SEARCH_INDEX_OBJECTS
+
+
+event.listen(Recipe.__table__, 'after_create', create_search_index)
+event.listen(Recipe.__table__, 'before_drop', drop_search_index)
+
+
+def search_recipes(the_recipes, q):
+    ''' Narrows a query of recipes down to the ones matching the search
+        words, best match first
+
+        :param object the_recipes: A BaseQuery object of recipes
+        :param str q: The search words
+        :return: A BaseQuery object ordered by relevance
+    '''
+    words = q.lower().split()
+    the_recipes = the_recipes.order_by(None)
+    dialect = db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        query = func.plainto_tsquery('english', ' '.join(words))
+        vector = literal_column('recipes.search_vector')
+        return the_recipes.filter(vector.op('@@')(query)).order_by(
+            func.ts_rank(vector, query).desc(), Recipe.recipe_id.desc())
+
+    if dialect == 'sqlite':
+        # quote every word so FTS5 operators in the input are taken literally
+        query = ' '.join('"{}"'.format(word.replace('"', '""'))
+                         for word in words)
+        fts = literal_column('recipes_fts')
+        return the_recipes.join(
+            recipes_fts, recipes_fts.c.rowid == Recipe.recipe_id).filter(
+                fts.match(query)).order_by(
+                    func.bm25(fts, NAME_WEIGHT, INGREDIENTS_WEIGHT),
+                    Recipe.recipe_id.desc())
+
+    for word in words:
+        the_recipes = the_recipes.filter(or_(
+            Recipe.recipe_name.ilike(f'%{word}%'),
+            Recipe.ingredients.ilike(f'%{word}%')))
+    return the_recipes.order_by(Recipe.recipe_id.desc())
@@ -0,0 +1,248 @@
+''' This script fills a database with synthetic users, categories and
+    recipes for benchmarks and capacity planning.
+
+    The rows are generated from a seed value, so two runs with the same
+    seed on an empty database hold the same data. They are written with
+    COPY on Postgres and with executemany on the raw connection elsewhere,
+    bypassing the ORM, so the counters and the ingredient index are filled
+    in here. Every user gets the same bcrypt hash, computed once.
+'''
+
+import csv
+import io
+import random
+from datetime import datetime
+from itertools import accumulate
+
+from sqlalchemy import func, select
+
+from .db import db
+from .hashing import password_hasher
+from .models.category import Category
+from .models.ingredient import Ingredient
+from .models.recipe import Recipe
+from .models.user import User
+from .search import create_search_index, pause_search_index
+
+CATEGORY_WORDS = (
+    'breakfast', 'brunch', 'lunch', 'dinner', 'dessert', 'snacks', 'soups',
+    'salads', 'baking', 'grill', 'vegan', 'vegetarian', 'seafood', 'pasta',
+    'curries', 'holidays', 'party food', 'quick meals', 'family favourites',
+    'comfort food', 'street food', 'sides', 'drinks', 'sauces')
+ADJECTIVES = (
+    'spicy', 'creamy', 'roasted', 'grilled', 'crispy', 'slow cooked',
+    'smoky', 'lemony', 'garlic', 'herby', 'sticky', 'sweet', 'tangy',
+    'rustic', 'classic', 'easy', 'quick', 'hearty', 'light', 'golden',
+    'baked', 'stuffed', 'braised', 'fried', 'fresh', 'simple', 'rich',
+    'zesty', 'warm', 'summer')
+DISHES = (
+    'chicken', 'soup', 'stew', 'curry', 'pasta', 'risotto', 'salad', 'tart',
+    'pie', 'bread', 'pancakes', 'omelette', 'noodles', 'tacos', 'burger',
+    'lasagne', 'chili', 'casserole', 'fish', 'salmon', 'prawns', 'rice',
+    'dumplings', 'muffins', 'cake', 'cookies', 'porridge', 'gnocchi',
+    'falafel', 'hummus', 'frittata', 'quiche', 'pilaf', 'kebabs', 'wraps',
+    'sandwich', 'pizza', 'brownies', 'crumble', 'flatbread')
+# normalised ingredient names, most common first
+INGREDIENTS = (
+    'salt', 'olive oil', 'onion', 'garlic', 'butter', 'egg', 'flour',
+    'sugar', 'black pepper', 'milk', 'tomato', 'lemon', 'water', 'potato',
+    'carrot', 'chicken breast', 'rice', 'parsley', 'cheese', 'cream',
+    'ginger', 'chili', 'honey', 'lime', 'coriander', 'cumin', 'paprika',
+    'spinach', 'mushroom', 'bell pepper', 'bacon', 'yogurt', 'basil',
+    'thyme', 'soy sauce', 'vinegar', 'beef', 'pasta', 'celery', 'bread',
+    'chickpea', 'lentil', 'coconut milk', 'cinnamon', 'oregano', 'salmon',
+    'prawn', 'courgette', 'aubergine', 'avocado', 'pea', 'corn', 'apple',
+    'banana', 'oat', 'almond', 'walnut', 'chocolate', 'vanilla', 'mint')
+# how an ingredient is written, all of them normalise to the bare name
+QUANTITIES = ('', '1 ', '2 ', '3 ', '1 cup of ', '2 cups ', '1 tbsp ',
+              '2 tsp ', '200g ', '500 ml ', 'a pinch of ', '1 can of ',
+              'a handful of ')
+# Zipf weights, a few ingredients are in most recipes
+INGREDIENT_WEIGHTS = list(accumulate(
+    1 / rank for rank in range(1, len(INGREDIENTS) + 1)))
+# the columns of the generated row tuples
+COLUMNS = {
+    'users': ('user_id', 'username', 'email', 'password', 'is_admin',
+              'category_count', 'recipe_count'),
+    'categories': ('category_id', 'category_name', 'description',
+                   'date_created', 'date_modified', 'version', 'created_by',
+                   'recipe_count'),
+    'recipes': ('recipe_id', 'recipe_name', 'ingredients', 'created_by',
+                'date_created', 'date_modified', 'version', 'category_id',
+                'ingredient_count'),
+    'recipe_ingredients': ('recipe_id', 'ingredient_id'),
+}
+USERS_PER_CHUNK = 100
+# recipes draw their ingredients from this many generated lists
+INGREDIENT_LISTS = 4096
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def letters(number):
+    ''' Spells a number with letters, names can't have digits '''
+    word = ''
+    while True:
+        number, digit = divmod(number, 26)
+        word = chr(ord('a') + digit) + word
+        if not number:
+            return word
+
+
+def category_name(rotation, index):
+    ''' The name of the index-th category of a user, unique per user '''
+    word = CATEGORY_WORDS[(rotation + index) % len(CATEGORY_WORDS)]
+    lap = index // len(CATEGORY_WORDS)
+    return f'{word} {letters(lap)}' if lap else word
+
+
+def recipe_name(offset, index):
+    ''' The name of the index-th recipe of a category, unique per category '''
+    combinations = len(ADJECTIVES) * len(DISHES)
+    adjective, dish = divmod((offset + index) % combinations, len(DISHES))
+    name = f'{ADJECTIVES[adjective]} {DISHES[dish]}'
+    lap = index // combinations
+    return f'{name} {letters(lap)}' if lap else name
+
+
+def ingredients(generator):
+    ''' Picks the ingredients of a recipe and writes them out
+
+        :return: A tuple of the text and the list of ingredient names
+    '''
+    picks = generator.choices(INGREDIENTS, cum_weights=INGREDIENT_WEIGHTS,
+                              k=generator.randint(3, 10))
+    names, items, length = [], [], 0
+    for name in dict.fromkeys(picks):
+        item = generator.choice(QUANTITIES) + name
+        if length + len(item) + 2 > 256:
+            break
+        names.append(name)
+        items.append(item)
+        length += len(item) + 2
+    return ', '.join(items), names
+
+
+def generate(users, categories, recipes, seed_value, start, ingredient_ids,
+             password, now):
+    ''' Generates the rows of the users in chunks
+
+        :param tuple start: The last user, category and recipe ids in use
+        :return: A generator of dictionaries of row tuples by table name
+    '''
+    generator = random.Random(seed_value)
+    # picking from ready made lists keeps the generation off the profile
+    lists = []
+    for _ in range(INGREDIENT_LISTS):
+        text, names = ingredients(generator)
+        lists.append((text, len(names),
+                      [ingredient_ids[name] for name in names]))
+    user_id, category_id, recipe_id = start
+    for first in range(0, users, USERS_PER_CHUNK):
+        rows = {'users': [], 'categories': [], 'recipes': [],
+                'recipe_ingredients': []}
+        for _ in range(min(USERS_PER_CHUNK, users - first)):
+            user_id += 1
+            rows['users'].append((
+                user_id, f'user{user_id}', f'user{user_id}@example.com',
+                password, 0, categories, categories * recipes))
+            rotation = generator.randrange(len(CATEGORY_WORDS))
+            for index in range(categories):
+                category_id += 1
+                rows['categories'].append((
+                    category_id, category_name(rotation, index),
+                    'description', now, now, 1, user_id, recipes))
+                offset = generator.randrange(len(ADJECTIVES) * len(DISHES))
+                for number in range(recipes):
+                    recipe_id += 1
+                    text, count, ids = lists[
+                        generator.randrange(INGREDIENT_LISTS)]
+                    rows['recipes'].append((
+                        recipe_id, recipe_name(offset, number), text,
+                        user_id, now, now, 1, category_id, count))
+                    rows['recipe_ingredients'].extend(
+                        (recipe_id, an_id) for an_id in ids)
+        yield rows
+
+
+def copy_rows(connection, table, columns, rows):
+    ''' Loads rows with COPY through psycopg2 '''
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN '
+                       'WITH (FORMAT csv)', buffer)
+    cursor.close()
+
+
+def execute_rows(connection, table, columns, rows):
+    ''' Loads rows with one executemany on the DBAPI connection '''
+    if connection.dialect.paramstyle == 'qmark':
+        marks = ', '.join('?' for _ in columns)
+    else:
+        marks = ', '.join(f'%({column})s' for column in columns)
+        rows = [dict(zip(columns, row)) for row in rows]
+    cursor = connection.connection.cursor()
+    cursor.executemany(
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({marks})', rows)
+    cursor.close()
+
+
+def seed_ingredients(connection):
+    ''' Adds the ingredients the index lacks, returns their ids by name '''
+    table = Ingredient.__table__
+    names = select([table.c.name, table.c.ingredient_id])
+    existing = dict(connection.execute(names).fetchall())
+    missing = [{'name': name} for name in INGREDIENTS if name not in existing]
+    if missing:
+        connection.execute(table.insert(), missing)
+    return dict(connection.execute(names).fetchall())
+
+
+def seed(users, categories, recipes, seed_value=0, password='password'):
+    ''' Creates users, each with categories of recipes
+
+        :param int users: The number of users
+        :param int categories: The categories of each user
+        :param int recipes: The recipes of each category
+        :param int seed_value: The seed of the generated data
+        :param str password: The password of every user
+        :return: The number of users, categories and recipes created
+    '''
+    engine = db.engine
+    dialect = engine.dialect.name
+    load = copy_rows if dialect == 'postgresql' else execute_rows
+    hashed = password_hasher.hash(password)
+    now = datetime.now().strftime(DATE_FORMAT)
+
+    with engine.begin() as connection:
+        pause_search_index(connection)
+        ingredient_ids = seed_ingredients(connection)
+        start = tuple(connection.scalar(
+            select([func.coalesce(func.max(column), 0)]))
+            for column in (User.user_id, Category.category_id,
+                           Recipe.recipe_id))
+    try:
+        for rows in generate(users, categories, recipes, seed_value, start,
+                             ingredient_ids, hashed, now):
+            with engine.begin() as connection:
+                if dialect == 'sqlite':
+                    connection.execute('PRAGMA synchronous=OFF')
+                # in the order of their foreign keys
+                for table, columns in COLUMNS.items():
+                    load(connection, table, columns, rows[table])
+    finally:
+        # the chunks loaded before a failure are committed, so the index
+        # and the sequences have to catch up with them too
+        with engine.begin() as connection:
+            create_search_index(Recipe.__table__, connection)
+        if dialect == 'postgresql':
+            # COPY doesn't move the sequences past the ids it wrote
+            with engine.begin() as connection:
+                for table, column in (('users', 'user_id'),
+                                      ('categories', 'category_id'),
+                                      ('recipes', 'recipe_id')):
+                    connection.execute(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', "
+                        f"'{column}'), (SELECT max({column}) FROM {table}))")
+    return users, users * categories, users * categories * recipes
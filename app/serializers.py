@@ -1,11 +1,30 @@
-''' This script handles how data is formatted and returned on get requests '''
+''' This script handles how data is formatted and returned on get requests
 
+    The ModelSchemas describe the output of each model. FastSerializer
+    compiles a schema into a list of attribute getters that give the same
+    dictionaries without marshmallow's per-field machinery, which is what
+    the list endpoints use.
+'''
+
+from operator import attrgetter
+
+from flask import current_app, make_response
 from flask_marshmallow import Marshmallow
+from flask_restplus.representations import output_json as restplus_json
+from marshmallow import fields
+from marshmallow.utils import isoformat
+from sqlalchemy import inspect
+from sqlalchemy.orm.interfaces import MANYTOONE
 
 from app.models.category import Category
 from app.models.recipe import Recipe
 from app.models.user import User
 
+try:
+    import ujson
+except ImportError:     # the restplus (stdlib) encoder is used instead
+    ujson = None
+
 
 ma = Marshmallow()
 
@@ -20,6 +39,7 @@ class CategorySchema(ma.ModelSchema):
     """ Category model schema """
     class Meta:
         model = Category
+        exclude = ('version',)
     recipes = ma.Nested('RecipeSchema', many=True, load=True)
 
 
@@ -27,3 +47,103 @@ class RecipeSchema(ma.ModelSchema):
     """ Recipe model schema """
     class Meta:
         model = Recipe
+        exclude = ('ingredient_items', 'ingredient_count', 'version')
+
+
+def datetime_getter(name):
+    ''' Reads a datetime as the ISO 8601 UTC string marshmallow dumps '''
+    def get(obj):
+        value = getattr(obj, name)
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            # what isoformat gives after localizing to UTC, without pytz
+            return value.isoformat() + '+00:00'
+        return isoformat(value)
+    return get
+
+
+def related_getter(mapper, name):
+    ''' Reads the primary keys a Related or List(Related) field dumps.
+        A many-to-one relation is read from its foreign key column, so the
+        related object isn't loaded.
+    '''
+    prop = mapper.relationships[name]
+    key = inspect(prop.mapper.class_).primary_key[0].key
+    if prop.direction is MANYTOONE and len(prop.local_columns) == 1:
+        column, = prop.local_columns
+        return attrgetter(mapper.get_property_by_column(column).key)
+
+    def get(obj):
+        return [getattr(related, key) for related in getattr(obj, name)]
+    return get
+
+
+def nested_getter(name, serializer):
+    ''' Dumps a nested collection with the serializer of its model '''
+    def get(obj):
+        return serializer.dump_many(getattr(obj, name))
+    return get
+
+
+class FastSerializer(object):
+    ''' Dumps model objects to the dictionaries their ModelSchema would.
+        The objects must be persistent: many-to-one relations are read from
+        their foreign keys, which aren't set on new objects until a flush.
+
+        :param class schema_class: The ModelSchema to copy
+        :param dict nested: Serializers of the Nested fields by name
+    '''
+
+    def __init__(self, schema_class, nested=None):
+        mapper = inspect(schema_class.Meta.model)
+        self.getters = []
+        for name, field in schema_class._declared_fields.items():
+            if isinstance(field, fields.Nested):
+                get = nested_getter(name, nested[name])
+            elif name in mapper.relationships:
+                get = related_getter(mapper, name)
+            elif isinstance(field, fields.DateTime):
+                get = datetime_getter(name)
+            else:
+                get = attrgetter(name)
+            self.getters.append((name, get))
+        self.fields = frozenset(name for name, _ in self.getters)
+        self._selected = {None: self.getters}
+
+    def select(self, only=None):
+        ''' Returns the getters of the fields in only, all when it's None '''
+        key = None if only is None else frozenset(only)
+        if key not in self._selected:
+            self._selected[key] = [
+                (name, get) for name, get in self.getters if name in key]
+        return self._selected[key]
+
+    def dump(self, obj, only=None):
+        ''' Dumps one object '''
+        return {name: get(obj) for name, get in self.select(only)}
+
+    def dump_many(self, objs, only=None):
+        ''' Dumps a list of objects '''
+        getters = self.select(only)
+        return [{name: get(obj) for name, get in getters} for obj in objs]
+
+
+user_serializer = FastSerializer(UserSchema)
+recipe_serializer = FastSerializer(RecipeSchema)
+category_serializer = FastSerializer(
+    CategorySchema, nested={'recipes': recipe_serializer})
+
+
+def output_json(data, code, headers=None):
+    ''' Makes a response with a JSON body, encoded by ujson when it is
+        installed and FAST_JSON is set. ujson turns datetimes into epoch
+        numbers, the serializers above hand it strings instead.
+    '''
+    if ujson is None or not current_app.config['FAST_JSON']:
+        return restplus_json(data, code, headers)
+    dumped = ujson.dumps(data, ensure_ascii=False,
+                         escape_forward_slashes=False)
+    resp = make_response(dumped + '\n', code)
+    resp.headers.extend(headers or {})
+    return resp
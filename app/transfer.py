@@ -0,0 +1,237 @@
+''' This script exports a user's recipe book as NDJSON or CSV and imports
+    it back from NDJSON.
+
+    The rows are read through a server-side cursor in batches of
+    EXPORT_BATCH_SIZE and written out as they come, so an export holds one
+    batch and one output chunk in memory however big the account is. The
+    output can be gzipped on the fly.
+
+    An import reads the body a line at a time and writes every
+    IMPORT_BATCH_SIZE lines in one transaction with app.bulk, reporting on
+    each line once its batch is committed. Recipes name their category, so
+    they can use one created earlier in the same stream.
+'''
+
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+from itertools import islice
+
+from . import bulk
+from .db import db
+from .models.category import Category
+from .models.recipe import Recipe
+
+FORMATS = ('ndjson', 'csv')
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+CSV_COLUMNS = ('type', 'category_name', 'description', 'recipe_name',
+               'ingredients', 'date_created', 'date_modified')
+
+
+def _date(value):
+    ''' Formats a date like the API responses do '''
+    if value is None:
+        return None
+    return value.isoformat() + ('+00:00' if value.tzinfo is None else '')
+
+
+def export_records(user_id, batch_size):
+    ''' Reads a user's categories and then their recipes
+
+        :param int user_id: The owner of the recipe book
+        :param int batch_size: The rows fetched per round trip
+        :return: A generator of record dictionaries, recipes name their
+            category so the book can be imported again
+    '''
+    categories = db.session.query(
+        Category.category_name, Category.description,
+        Category.date_created, Category.date_modified).filter(
+            Category.created_by == user_id).order_by(
+                Category.category_id).yield_per(batch_size)
+    for name, description, created, modified in categories:
+        yield {'type': 'category', 'category_name': name,
+               'description': description, 'date_created': _date(created),
+               'date_modified': _date(modified)}
+
+    recipes = db.session.query(
+        Category.category_name, Recipe.recipe_name, Recipe.ingredients,
+        Recipe.date_created, Recipe.date_modified).join(
+            Recipe, Recipe.category_id == Category.category_id).filter(
+                Recipe.created_by == user_id).order_by(
+                    Recipe.recipe_id).yield_per(batch_size)
+    for category_name, name, ingredients, created, modified in recipes:
+        yield {'type': 'recipe', 'category_name': category_name,
+               'recipe_name': name, 'ingredients': ingredients,
+               'date_created': _date(created),
+               'date_modified': _date(modified)}
+
+
+def encode_ndjson(records):
+    ''' Writes each record as a line of JSON '''
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+def encode_csv(records):
+    ''' Writes the records as CSV rows under a header '''
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_COLUMNS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def chunked(lines, chunk_size):
+    ''' Joins the lines into bytes chunks of about chunk_size '''
+    parts, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(chunks):
+    ''' Compresses the chunks into a gzip stream as they come '''
+    # wbits of 31 writes the gzip header and trailer around the deflate data
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_book(user_id, fmt, gzip=False, batch_size=1000,
+                chunk_size=64 * 1024):
+    ''' Streams a user's recipe book
+
+        :param int user_id: The owner of the recipe book
+        :param str fmt: Either ndjson or csv
+        :param bool gzip: Whether to compress the output
+        :param int batch_size: The rows fetched per round trip
+        :param int chunk_size: The bytes written out at a time
+        :return: A generator of bytes
+    '''
+    encode = encode_csv if fmt == 'csv' else encode_ndjson
+    chunks = chunked(encode(export_records(user_id, batch_size)), chunk_size)
+    return gzipped(chunks) if gzip else chunks
+
+
+def read_records(stream, max_line=64 * 1024):
+    ''' Reads NDJSON records from a binary stream a line at a time
+
+        :param stream: The file or request stream to read from
+        :param int max_line: The longest line read, longer ones are skipped
+        :return: A generator of (line number, record) tuples, the record is
+            None if the line is not a JSON object
+    '''
+    line_no = 0
+    while True:
+        line = stream.readline(max_line + 1)
+        if not line:
+            return
+        line_no += 1
+        if len(line) > max_line:
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line + 1)
+            yield line_no, None
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except ValueError:
+            record = None
+        yield line_no, record if isinstance(record, dict) else None
+
+
+def _report(line_no, kind, result):
+    ''' Turns a bulk result into the report of a line '''
+    result.pop('index', None)
+    return dict(result, line=line_no, type=kind)
+
+
+def import_batch(user_id, batch, category_ids):
+    ''' Inserts the categories and then the recipes of a batch of records
+
+        :param int user_id: The owner of the recipe book
+        :param list batch: (line number, record) tuples
+        :param dict category_ids: The ids of the user's categories by name,
+            filled in as they are met
+        :return: The report of each line, in line order
+    '''
+    reports, categories, recipes = {}, [], []
+    for line_no, record in batch:
+        kind = record.get('type') if record is not None else None
+        if kind == 'category':
+            categories.append((line_no, record))
+        elif kind == 'recipe':
+            recipes.append((line_no, record))
+        else:
+            reports[line_no] = {'line': line_no, 'status': 'invalid',
+                                'message': 'The line is not a category or '
+                                'recipe record'}
+
+    if categories:
+        results, ids = bulk.add_categories(
+            user_id, [record for _, record in categories])
+        category_ids.update(ids)
+        for (line_no, _), result in zip(categories, results):
+            reports[line_no] = _report(line_no, 'category', result)
+
+    names = {record.get('category_name') for _, record in recipes}
+    names = [name for name in names
+             if isinstance(name, str) and name not in category_ids]
+    if names:
+        category_ids.update(db.session.query(
+            Category.category_name, Category.category_id).filter(
+                Category.created_by == user_id,
+                Category.category_name.in_(names)))
+
+    in_category = defaultdict(list)
+    for line_no, record in recipes:
+        name = record.get('category_name')
+        category_id = category_ids.get(name) if isinstance(name, str) else None
+        if category_id is None:
+            reports[line_no] = {'line': line_no, 'type': 'recipe',
+                                'status': 'invalid',
+                                'message': f'The category {name} does not '
+                                'exist'}
+        else:
+            in_category[category_id].append((line_no, record))
+    for category_id, lines in in_category.items():
+        results = bulk.add_recipes(user_id, category_id,
+                                   [record for _, record in lines])
+        for (line_no, _), result in zip(lines, results):
+            reports[line_no] = _report(line_no, 'recipe', result)
+    return [reports[line_no] for line_no in sorted(reports)]
+
+
+def import_book(user_id, records, batch_size=1000):
+    ''' Imports records in batches, one transaction each
+
+        :param int user_id: The owner of the recipe book
+        :param records: An iterable of (line number, record) tuples
+        :param int batch_size: The lines written per transaction
+        :return: A generator of per-line report dictionaries, a batch is
+            reported once it is committed
+    '''
+    category_ids = {}
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        reports = import_batch(user_id, batch, category_ids)
+        db.session.commit()
+        yield from reports
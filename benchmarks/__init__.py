@@ -0,0 +1 @@
+''' Performance benchmarks that drive the app through the Flask test client '''
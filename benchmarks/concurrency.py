@@ -0,0 +1,227 @@
+''' This script measures how many requests in flight one container holds
+    with each kind of gunicorn worker. It seeds a database, starts gunicorn
+    with gunicorn.conf.py for each worker class in turn and, at each level
+    of concurrency, keeps that many clients sending requests for a while:
+    mostly category lists, which wait on the database, and every
+    --login-every request a login, which runs bcrypt. The response cache
+    is turned off so every read reaches the database.
+
+    The users are seeded with the bcrypt cost the production config would
+    calibrate on this machine, or --bcrypt-rounds, and every server hashes
+    with that same cost, so no worker class pays for rehashing the
+    passwords on the first logins.
+
+    A level is held when its error rate and p95 latency stay under
+    --max-error-rate and --max-p95-ms. The highest level held by each
+    worker class and the results of every level are reported as JSON.
+
+    Usage:
+        python -m benchmarks.concurrency --workers 2 \\
+            --levels 8,32,128,512 --duration 10 \\
+            --database-url postgresql://localhost/bench_db
+'''
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+
+from benchmarks.endpoints import (
+    PASSWORD, HttpTransport, percentile, seed)
+from app import create_app
+from app.hashing import calibrated_rounds
+from instance.config import app_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(worker_class, args):
+    ''' Starts gunicorn and waits until it answers
+
+        :return: The gunicorn process
+    '''
+    gunicorn = shutil.which('gunicorn')
+    if gunicorn is None:
+        sys.exit('gunicorn is not installed')
+    env = dict(os.environ,
+               DATABASE_URL=args.database_url,
+               FLASK_CONFIG=os.environ.get('FLASK_CONFIG', 'production'),
+               RESPONSE_CACHE_URL='',
+               BCRYPT_TARGET_MS='0',
+               BCRYPT_LOG_ROUNDS=str(args.bcrypt_rounds),
+               GUNICORN_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_WORKER_CONNECTIONS=str(args.worker_connections),
+               PORT=str(args.port))
+    server = subprocess.Popen(
+        [gunicorn, '-c', 'gunicorn.conf.py', 'manage:app'], cwd=ROOT,
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f'gunicorn with {worker_class} workers exited')
+        try:
+            socket.create_connection(('127.0.0.1', args.port), 1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit(f'gunicorn with {worker_class} workers did not start')
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def send(transport, method, path, headers, body=None):
+    ''' Sends a request, a status of 0 means it got no response '''
+    try:
+        return transport.send(method, path, headers, body)[0]
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+def run_level(transport, tokens, level, duration, login_every):
+    ''' Keeps level clients busy for duration seconds
+
+        :return: A dictionary with the throughput, error rate and
+            latencies of the level
+    '''
+    deadline = time.monotonic() + duration
+    results = [[] for _ in range(level)]
+
+    def client(number):
+        user = number % len(tokens) + 1
+        headers = {'Authorization': f'Bearer {tokens[user]}'}
+        sent = 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            if login_every and sent % login_every == login_every - 1:
+                status = send(transport, 'POST', '/auth/login/', {},
+                              {'username': f'user{user}',
+                               'password': PASSWORD})
+            else:
+                status = send(transport, 'GET', '/categories/?limit=10',
+                              headers)
+            results[number].append((time.perf_counter() - start, status))
+            sent += 1
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(number,))
+               for number in range(level)]
+    for a_client in clients:
+        a_client.start()
+    for a_client in clients:
+        a_client.join()
+    elapsed = time.perf_counter() - started
+
+    done = [result for client_results in results
+            for result in client_results]
+    latencies = sorted(latency * 1000 for latency, _ in done)
+    errors = sum(not 200 <= status < 400 for _, status in done)
+    return {
+        'in_flight': level,
+        'requests': len(done),
+        'throughput': round(len(done) / elapsed, 1),
+        'error_rate': round(errors / len(done), 4) if done else 1.0,
+        'p50_ms': round(percentile(latencies, 50), 3) if done else None,
+        'p95_ms': round(percentile(latencies, 95), 3) if done else None,
+        'p99_ms': round(percentile(latencies, 99), 3) if done else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--categories', type=int, default=20,
+                        help='categories per user')
+    parser.add_argument('--recipes', type=int, default=5,
+                        help='recipes per category')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--reset', action='store_true',
+                        help='drop the tables the database already has')
+    parser.add_argument('--bcrypt-rounds', type=int,
+                        help='the cost of the password hashes, calibrated '
+                        'like in production by default')
+    parser.add_argument('--worker-classes', default='sync,gevent')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='gunicorn workers, the cores of a container')
+    parser.add_argument('--worker-connections', type=int, default=1000,
+                        help='requests each gevent worker serves at a time')
+    parser.add_argument('--levels', default='8,32,128,512',
+                        help='the numbers of clients to try')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds each level runs')
+    parser.add_argument('--login-every', type=int, default=20)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--max-p95-ms', type=float, default=1000)
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--output', help='write the report to this file')
+    args = parser.parse_args()
+    if args.bcrypt_rounds is None:
+        production = app_config['production']
+        args.bcrypt_rounds = production.BCRYPT_LOG_ROUNDS
+        if production.BCRYPT_TARGET_MS:
+            args.bcrypt_rounds = calibrated_rounds(
+                production.BCRYPT_TARGET_MS, production.BCRYPT_MIN_ROUNDS)
+
+    app = create_app(config_name='testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['BCRYPT_LOG_ROUNDS'] = args.bcrypt_rounds
+    seed(app, args.users, args.categories, args.recipes, args.seed,
+         args.reset)
+
+    transport = HttpTransport(f'http://127.0.0.1:{args.port}')
+    levels = [int(level) for level in args.levels.split(',')]
+    worker_classes = {}
+    for worker_class in args.worker_classes.split(','):
+        server = start_server(worker_class, args)
+        try:
+            tokens = {}
+            for user in range(1, args.users + 1):
+                _, data = transport.send(
+                    'POST', '/auth/login/', {},
+                    {'username': f'user{user}', 'password': PASSWORD})
+                tokens[user] = json.loads(data)['access_token']
+            results = [run_level(transport, tokens, level, args.duration,
+                                 args.login_every) for level in levels]
+        finally:
+            stop_server(server)
+        held = [result['in_flight'] for result in results
+                if result['error_rate'] <= args.max_error_rate and
+                result['p95_ms'] is not None and
+                result['p95_ms'] <= args.max_p95_ms]
+        worker_classes[worker_class] = {'held': max(held, default=0),
+                                        'levels': results}
+
+    report = {'dataset': {'users': args.users,
+                          'categories': args.categories,
+                          'recipes': args.recipes, 'seed': args.seed},
+              'workers': args.workers,
+              'bcrypt_rounds': args.bcrypt_rounds,
+              'worker_connections': args.worker_connections,
+              'duration': args.duration, 'login_every': args.login_every,
+              'max_error_rate': args.max_error_rate,
+              'max_p95_ms': args.max_p95_ms,
+              'worker_classes': worker_classes}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+''' This script measures the latency and throughput of every route of the
+    auth, categories and recipes namespaces on a seeded dataset of users x
+    categories x recipes. Each endpoint gets a number of requests from a
+    pool of threads, through the Flask test client or over HTTP against a
+    running server, and the throughput and p50/p95/p99 latencies are
+    reported as JSON. Reads run before the writes, and the deletes remove
+    the rows the creates added, so the dataset stays the same size.
+
+    The passwords are hashed with --bcrypt-rounds, the cost of a
+    deployment by default; pass the one a server under test calibrated.
+    The seed refuses to drop a database that has tables unless --reset is
+    given.
+
+    With --baseline the results are compared with an earlier report, and
+    the run fails if an endpoint got slower than the tolerance allows.
+
+    Usage:
+        python -m benchmarks.endpoints --users 20 --categories 10 \\
+            --recipes 10 --requests 200 --threads 8 --output bench.json \\
+            --database-url postgresql://localhost/bench_db
+        python -m benchmarks.endpoints --baseline bench.json --reset \\
+            --database-url postgresql://localhost/bench_db
+        python -m benchmarks.endpoints --url http://localhost:8000 \\
+            --database-url postgresql://localhost/bench_db --bcrypt-rounds 13
+'''
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from sqlalchemy import inspect  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from instance.config import Config  # noqa: E402
+from app import seed as seeding  # noqa: E402
+from app.seed import DISHES, INGREDIENTS, letters  # noqa: E402
+
+PASSWORD = 'password'
+
+
+def seed(app, users, categories, recipes, seed_value, reset=False):
+    ''' Creates users with categories of recipes on an empty database. The
+        ids are known: user u owns categories (u - 1) * categories + 1 on
+        and so on.
+
+        :param bool reset: Whether to drop the tables the database has
+    '''
+    with app.app_context():
+        if not reset and inspect(db.engine).get_table_names():
+            sys.exit(f'{db.engine.url!r} has tables, pass --reset to drop '
+                     'them')
+        db.drop_all()
+        db.create_all()
+        seeding.seed(users, categories, recipes, seed_value, PASSWORD)
+
+
+class TestClientTransport(object):
+    ''' Sends requests through a Flask test client per thread '''
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def send(self, method, path, headers, body):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        res = self.local.client.open(
+            '/api/v1' + path, method=method, headers=headers,
+            data=None if body is None else json.dumps(body),
+            content_type='application/json')
+        return res.status_code, res.get_data()
+
+
+class HttpTransport(object):
+    ''' Sends requests to a running server '''
+
+    def __init__(self, url):
+        self.url = url.rstrip('/') + '/api/v1'
+
+    def send(self, method, path, headers, body):
+        request = urllib.request.Request(
+            self.url + path, method=method,
+            data=None if body is None else json.dumps(body).encode('utf-8'),
+            headers=dict(headers, **{'Content-Type': 'application/json'}))
+        try:
+            with urllib.request.urlopen(request) as res:
+                return res.status, res.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+class Workload(object):
+    ''' The requests of each endpoint for a seeded dataset '''
+
+    def __init__(self, users, categories, recipes, transport):
+        self.users = users
+        self.categories = categories
+        self.recipes = recipes
+        self.transport = transport
+        self.access = {}
+        self.refresh = {}
+        # what the creates of each request number returned, the deletes of
+        # the same number remove it
+        self.created = {'categories': {}, 'recipes': {},
+                        'bulk_categories': {}, 'bulk_recipes': {}}
+
+    def user(self, number):
+        return number % self.users + 1
+
+    def category_id(self, number):
+        ''' A seeded category of the user of request number '''
+        first = (self.user(number) - 1) * self.categories + 1
+        return first + number // self.users % self.categories
+
+    def recipe_id(self, number):
+        ''' A seeded recipe of the category of request number '''
+        first = (self.category_id(number) - 1) * self.recipes + 1
+        return first + number // self.users % self.recipes
+
+    def login(self, number):
+        user = self.user(number)
+        status, data = self.transport.send(
+            'POST', '/auth/login/', {},
+            {'username': f'user{user}', 'password': PASSWORD})
+        tokens = json.loads(data)
+        self.access.setdefault(user, tokens['access_token'])
+        self.refresh.setdefault(user, []).append(tokens['refresh_token'])
+        return status
+
+    def call(self, method, path, body=None, token=None, collect=None):
+        ''' Sends one request, keeping what it creates under collect, a
+            tuple of the kind and the request number
+        '''
+        headers = {'Authorization': 'Bearer ' + token} if token else {}
+        status, data = self.transport.send(method, path, headers, body)
+        if collect is not None and status < 300:
+            kind, number = collect
+            self.created[kind][number] = json.loads(data)
+        return status
+
+    def created_ids(self, kind, number, key):
+        ''' The ids created by request number, or none if it failed '''
+        created = self.created[kind].get(number, {})
+        if 'results' in created:
+            return [result[key] for result in created['results']
+                    if key in result]
+        return [created.get(key, 0)]
+
+    def cases(self, run):
+        ''' The endpoints in the order they run, as (name, request) tuples.
+            Each request function is called with the request number.
+        '''
+        def token(number):
+            return self.access[self.user(number)]
+
+        return [
+            ('POST /auth/login/', self.login),
+            ('POST /auth/register/', lambda n: self.call(
+                'POST', '/auth/register/', {
+                    'username': f'new{run}x{n}', 'password': PASSWORD,
+                    'email': f'new{run}x{n}@email.com'})),
+            ('POST /auth/refresh/', lambda n: self.call(
+                'POST', '/auth/refresh/',
+                token=self.refresh[self.user(n)][0])),
+            ('PUT /auth/reset_password/', lambda n: self.call(
+                'PUT', '/auth/reset_password/', {
+                    'old_password': PASSWORD, 'new_password': PASSWORD},
+                token(n))),
+            ('GET /categories/', lambda n: self.call(
+                'GET', f'/categories/?page={n % 3 + 1}', token=token(n))),
+            ('GET /categories/?q=', lambda n: self.call(
+                'GET', f'/categories/?q={letters(n)[-1]}', token=token(n))),
+            ('GET /categories/<id>/', lambda n: self.call(
+                'GET', f'/categories/{self.category_id(n)}/',
+                token=token(n))),
+            ('GET /recipes/', lambda n: self.call(
+                'GET', f'/recipes/?page={n % 3 + 1}', token=token(n))),
+            ('GET /recipes/pantry/', lambda n: self.call(
+                'GET', '/recipes/pantry/?ingredients=' +
+                ','.join(INGREDIENTS[n % 10:n % 10 + 3]), token=token(n))),
+            ('GET /recipes/<category_id>/', lambda n: self.call(
+                'GET', f'/recipes/{self.category_id(n)}/', token=token(n))),
+            ('GET /recipes/<category_id>/?q=', lambda n: self.call(
+                'GET', '/recipes/{}/?q={}'.format(
+                    self.category_id(n), DISHES[n % len(DISHES)]),
+                token=token(n))),
+            ('GET /recipes/<category_id>/<id>/', lambda n: self.call(
+                'GET', f'/recipes/{self.category_id(n)}/{self.recipe_id(n)}/',
+                token=token(n))),
+            ('POST /categories/', lambda n: self.call(
+                'POST', '/categories/', {
+                    'category_name': f'new {letters(run)} {letters(n)}',
+                    'description': 'description'},
+                token(n), collect=('categories', n))),
+            ('POST /categories/bulk/', lambda n: self.call(
+                'POST', '/categories/bulk/', {'categories': [
+                    {'category_name': f'bulk {letters(run)} {letters(n)} '
+                     f'{letters(item)}'} for item in range(10)]},
+                token(n), collect=('bulk_categories', n))),
+            ('PUT /categories/<id>/', lambda n: self.call(
+                'PUT', f'/categories/{self.category_id(n)}/', {
+                    'category_name': f'edited {letters(run)} {letters(n)}',
+                    'description': 'edited'}, token(n))),
+            ('POST /recipes/<category_id>/', lambda n: self.call(
+                'POST', f'/recipes/{self.category_id(n)}/', {
+                    'recipe_name': f'new {letters(run)} {letters(n)}',
+                    'ingredients': 'flour, eggs, milk'},
+                token(n), collect=('recipes', n))),
+            ('POST /recipes/<category_id>/bulk/', lambda n: self.call(
+                'POST', f'/recipes/{self.category_id(n)}/bulk/', {'recipes': [
+                    {'recipe_name': f'bulk {letters(run)} {letters(n)} '
+                     f'{letters(item)}', 'ingredients': 'rice, beans'}
+                    for item in range(10)]},
+                token(n), collect=('bulk_recipes', n))),
+            ('PUT /recipes/<category_id>/<id>/', lambda n: self.call(
+                'PUT', f'/recipes/{self.category_id(n)}/{self.recipe_id(n)}/',
+                {'recipe_name': f'edited {letters(run)} {letters(n)}',
+                 'ingredients': 'salt, lemon'}, token(n))),
+            ('DELETE /recipes/<category_id>/<id>/', lambda n: self.call(
+                'DELETE', '/recipes/{}/{}/'.format(
+                    self.category_id(n),
+                    self.created_ids('recipes', n, 'recipe_id')[0]),
+                token=token(n))),
+            ('DELETE /recipes/<category_id>/bulk/', lambda n: self.call(
+                'DELETE', f'/recipes/{self.category_id(n)}/bulk/', {
+                    'ids': self.created_ids('bulk_recipes', n, 'recipe_id')},
+                token(n))),
+            ('DELETE /categories/<id>/', lambda n: self.call(
+                'DELETE', '/categories/{}/'.format(
+                    self.created_ids('categories', n, 'category_id')[0]),
+                token=token(n))),
+            ('DELETE /categories/bulk/', lambda n: self.call(
+                'DELETE', '/categories/bulk/', {
+                    'ids': self.created_ids('bulk_categories', n,
+                                            'category_id')},
+                token(n))),
+            ('DELETE /auth/logout/', lambda n: self.call(
+                'DELETE', '/auth/logout/',
+                token=self.refresh[self.user(n)].pop())),
+        ]
+
+
+def percentile(latencies, share):
+    ''' The nearest-rank percentile of sorted latencies '''
+    return latencies[max(0, math.ceil(share / 100 * len(latencies)) - 1)]
+
+
+def measure(request, requests, threads):
+    ''' Sends requests from a pool of threads and times each of them '''
+    def timed(number):
+        start = time.perf_counter()
+        status = request(number)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    return {
+        'requests': requests,
+        'errors': sum(status >= 400 for _, status in results),
+        'throughput': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+
+def compare(report, baseline, tolerance):
+    ''' Lists the endpoints whose p95 latency or throughput is worse than
+        the baseline by more than the tolerance
+    '''
+    regressions = []
+    for name, result in report['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {before["p95_ms"]}ms -> '
+                               f'{result["p95_ms"]}ms')
+        if result['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput {before["throughput"]}'
+                               f'/s -> {result["throughput"]}/s')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--categories', type=int, default=10,
+                        help='categories per user')
+    parser.add_argument('--recipes', type=int, default=10,
+                        help='recipes per category')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='requests per endpoint')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--reset', action='store_true',
+                        help='drop the tables the database already has')
+    parser.add_argument('--bcrypt-rounds', type=int,
+                        default=Config.BCRYPT_LOG_ROUNDS,
+                        help='the cost of the password hashes')
+    parser.add_argument('--url', help='a running server to send requests '
+                        'to, on the same --database-url')
+    parser.add_argument('--output', help='write the report to this file')
+    parser.add_argument('--baseline', help='an earlier report to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='the slowdown allowed before a regression')
+    args = parser.parse_args()
+
+    app = create_app(config_name='testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['BCRYPT_LOG_ROUNDS'] = args.bcrypt_rounds
+    seed(app, args.users, args.categories, args.recipes, args.seed,
+         args.reset)
+    transport = (HttpTransport(args.url) if args.url
+                 else TestClientTransport(app))
+    workload = Workload(args.users, args.categories, args.recipes, transport)
+    for number in range(args.users):
+        workload.login(number)      # every user has tokens from the start
+
+    endpoints = {}
+    for name, request in workload.cases(args.seed):
+        endpoints[name] = measure(request, args.requests, args.threads)
+    report = {'dataset': {'users': args.users,
+                          'categories': args.categories,
+                          'recipes': args.recipes, 'seed': args.seed},
+              'bcrypt_rounds': args.bcrypt_rounds,
+              'requests': args.requests, 'threads': args.threads,
+              'transport': 'http' if args.url else 'test_client',
+              'endpoints': endpoints}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output)
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file),
+                                  args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+''' This script measures requests/sec on POST /api/v1/auth/refresh/ with
+    and without the revocation cache in front of the blacklisted table.
+    Only refresh tokens are checked against the blacklist, access tokens
+    never reach it.
+
+    Usage:
+        python -m benchmarks.revocation_cache --requests 2000 \\
+            --revoked 50000 --database-url postgresql://localhost/bench_db
+'''
+
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from app import create_app, db  # noqa: E402
+from app.models.blacklist import Blacklist  # noqa: E402
+
+USER = {"username": "benchuser", "password": "password",
+        "email": "bench@email.com"}
+
+
+def seed(app, revoked):
+    ''' Creates the schema, a user and a number of revoked tokens '''
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        now = datetime.now()
+        db.session.execute(Blacklist.__table__.insert(), [
+            {'token': str(uuid.uuid4()), 'blacklist_date': now}
+            for _ in range(revoked)])
+        db.session.commit()
+    client = app.test_client()
+    client.post('/api/v1/auth/register/', data=USER)
+    res = client.post('/api/v1/auth/login/', data=USER)
+    return json.loads(res.data)['refresh_token']
+
+
+def run(app, token, requests):
+    ''' Times a number of sequential requests and returns requests/sec '''
+    client = app.test_client()
+    headers = dict(Authorization="Bearer " + token)
+    client.post('/api/v1/auth/refresh/', headers=headers)     # warm up
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.post('/api/v1/auth/refresh/', headers=headers)
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--revoked', type=int, default=10000)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    app = create_app(config_name='testing')
+    if args.database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    token = seed(app, args.revoked)
+
+    results = {}
+    for enabled in (False, True):
+        app.config['REVOCATION_CACHE_ENABLED'] = enabled
+        key = 'with_cache' if enabled else 'without_cache'
+        results[key] = round(run(app, token, args.requests), 1)
+    print(json.dumps({'endpoint': 'POST /api/v1/auth/refresh/',
+                      'requests_per_sec': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+''' This script compares the marshmallow schemas and the stdlib encoder
+    with the fast serializers and ujson on pages of 10, 100 and 1,000
+    recipes and categories, loaded from the database once per size.
+
+    Usage:
+        python -m benchmarks.serializers --repeat 50 \\
+            --database-url postgresql://localhost/bench_db
+'''
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from app import create_app, db  # noqa: E402
+from app.models.category import Category  # noqa: E402
+from app.models.recipe import Recipe  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.serializers import (  # noqa: E402
+    CategorySchema, RecipeSchema, category_serializer, recipe_serializer,
+    ujson)
+
+SIZES = (10, 100, 1000)
+RECIPES_PER_CATEGORY = 5
+
+
+def seed(app, rows):
+    ''' Creates a user with rows categories of RECIPES_PER_CATEGORY recipes
+        each, inserted in bulk since only their serialization is timed
+    '''
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        a_user = User('benchuser', 'bench@email.com')
+        a_user.password = 'not a hash'
+        db.session.add(a_user)
+        db.session.commit()
+        now = datetime.now()
+        db.session.execute(Category.__table__.insert(), [
+            {'category_id': number, 'category_name': f'category {number}',
+             'description': 'description', 'created_by': a_user.user_id,
+             'date_created': now, 'date_modified': now,
+             'recipe_count': RECIPES_PER_CATEGORY}
+            for number in range(1, rows + 1)])
+        db.session.execute(Recipe.__table__.insert(), [
+            {'recipe_name': f'recipe {number} {index}',
+             'ingredients': 'water, salt', 'category_id': number,
+             'created_by': a_user.user_id, 'date_created': now,
+             'date_modified': now}
+            for number in range(1, rows + 1)
+            for index in range(RECIPES_PER_CATEGORY)])
+        db.session.commit()
+
+
+def best_time(func, repeat):
+    ''' Returns the best of repeat runs of func in milliseconds '''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def compare(objs, schema, serializer, repeat):
+    ''' Times both paths over objs, from objects to a JSON string '''
+    fast_dumps = ujson.dumps if ujson is not None else json.dumps
+    assert serializer.dump_many(objs) == schema.dump(objs).data
+    return {
+        'marshmallow_json': best_time(
+            lambda: json.dumps(schema.dump(objs).data), repeat),
+        'fast_' + ('ujson' if ujson is not None else 'json'): best_time(
+            lambda: fast_dumps(serializer.dump_many(objs)), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    app = create_app(config_name='testing')
+    if args.database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    seed(app, max(SIZES))
+
+    results = {}
+    with app.app_context():
+        for size in SIZES:
+            the_recipes = Recipe.query.order_by(
+                Recipe.recipe_id).limit(size).all()
+            the_categories = Category.query.order_by(
+                Category.category_id).limit(size).all()
+            for a_category in the_categories:
+                a_category.recipes      # load them outside the timings
+            results[size] = {
+                'recipes': compare(
+                    the_recipes, RecipeSchema(many=True),
+                    recipe_serializer, args.repeat),
+                'categories': compare(
+                    the_categories, CategorySchema(many=True),
+                    category_serializer, args.repeat),
+            }
+        db.drop_all()
+    print(json.dumps({'unit': 'ms per page, best of {}'.format(args.repeat),
+                      'rows': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
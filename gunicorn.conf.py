@@ -0,0 +1,69 @@
+''' The gunicorn settings of the app, used by the Procfile.
+
+    GUNICORN_WORKER_CLASS picks the workers. sync workers serve one
+    request at a time each. gevent workers serve up to
+    GUNICORN_WORKER_CONNECTIONS requests at a time on greenlets, switching
+    while a request waits on Postgres or Redis. psycopg2 is made to yield
+    to the other greenlets with psycogreen, and bcrypt runs on real
+    threads so it doesn't stall them.
+
+    The bcrypt cost is calibrated once in the master, before the workers
+    are forked, so they all hash with it instead of each timing bcrypt
+    while the others are busy.
+
+    Usage:
+        gunicorn -c gunicorn.conf.py manage:app
+        GUNICORN_WORKER_CLASS=gevent gunicorn -c gunicorn.conf.py manage:app
+'''
+
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1))
+# requests each gevent worker serves at a time
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+if worker_class == 'gevent':
+    # the pool caps the queries a worker runs at a time, the greenlets past
+    # it wait for a connection and show up in GET /admin/pool/; keep
+    # workers * (size + overflow) under the server's max_connections
+    os.environ.setdefault('DATABASE_POOL_SIZE', '10')
+    os.environ.setdefault('DATABASE_MAX_OVERFLOW', '10')
+
+
+def on_starting(server):
+    ''' Checks the settings the workers would disagree on and calibrates
+        the bcrypt cost of the app for the workers to inherit
+    '''
+    # gunicorn only puts the app on the path when a worker loads it
+    if server.cfg.chdir not in sys.path:
+        sys.path.insert(0, server.cfg.chdir)
+    from app.hashing import calibrated_rounds
+    from instance.config import app_config
+    config = app_config.get(os.environ.get('FLASK_CONFIG'))
+    if config is None:
+        return
+    for setting in ('RESPONSE_CACHE_URL', 'REPLICA_STICKY_URL'):
+        if (server.cfg.workers > 1 and
+                getattr(config, setting).startswith('memory://')):
+            # each worker would miss the writes the others took
+            raise RuntimeError(f'{setting}=memory:// only works with one '
+                               'worker, use a redis:// URL')
+    if config.BCRYPT_TARGET_MS:
+        rounds = calibrated_rounds(config.BCRYPT_TARGET_MS,
+                                   config.BCRYPT_MIN_ROUNDS)
+        server.log.info('Hashing passwords with a bcrypt cost of %s', rounds)
+
+
+def post_fork(server, worker):
+    ''' Lets the greenlets of a gevent worker run while psycopg2 waits on
+        the network
+    '''
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -1,5 +1,28 @@
 ''' This script has the configuration settings for the different states '''
 import os
+import tempfile
+from datetime import timedelta
+
+from sqlalchemy.engine.url import make_url
+
+
+def worker_database_url(url, worker=None):
+    ''' Gives each worker of a sharded test run a database of its own
+
+        :param str url: The database URL of the test run
+        :param str worker: The worker id, like gw0 for pytest-xdist
+        :return: The URL with the worker id added to the database name,
+            in-memory SQLite databases are already private to a process
+    '''
+    url = make_url(url)
+    if not worker or url.database in (None, '', ':memory:'):
+        return str(url)
+    if url.drivername.startswith('sqlite'):
+        root, extension = os.path.splitext(url.database)
+        url.database = f'{root}_{worker}{extension}'
+    else:
+        url.database = f'{url.database}_{worker}'
+    return str(url)
 
 
 class Config(object):
@@ -16,27 +39,140 @@ class Config(object):
     else:
         SQLALCHEMY_DATABASE_URI = os.environ['DATABASE_URL']
 
+    # connections each worker keeps open and may open on top of them, keep
+    # workers * (size + overflow) under the server's max_connections
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+    SQLALCHEMY_POOL_TIMEOUT = 10        # seconds to wait for a connection
+    SQLALCHEMY_POOL_RECYCLE = 1800      # seconds before reconnecting
+    SQLALCHEMY_POOL_PRE_PING = True
+    # PgBouncer in transaction mode pools the connections instead
+    DATABASE_PGBOUNCER = os.environ.get('DATABASE_PGBOUNCER') == '1'
+    # milliseconds a Postgres statement may run, 0 for no limit, and the
+    # limits of the endpoints that need another one
+    DATABASE_STATEMENT_TIMEOUT = int(
+        os.environ.get('DATABASE_STATEMENT_TIMEOUT', 5000))
+    DATABASE_STATEMENT_TIMEOUTS = {
+        'transfer_export': 60000,
+        'transfer_import': 60000,
+        'admin_bulk_users': 60000,
+    }
+    # the limit of manage.py commands, which run outside of requests and
+    # work through whole tables
+    DATABASE_COMMAND_STATEMENT_TIMEOUT = int(
+        os.environ.get('DATABASE_COMMAND_STATEMENT_TIMEOUT', 0))
+
+    # read replicas that GET requests read from, comma separated URLs, and
+    # seconds a user reads from the primary after a write, longer than the
+    # replication lag
+    SQLALCHEMY_BINDS = {
+        f'replica{number}': url for number, url in enumerate(
+            os.environ.get('DATABASE_REPLICA_URLS', '').split(',')) if url}
+    REPLICA_STICKY_SECONDS = 5
+    REPLICA_RETRY_SECONDS = 30          # before trying a failed replica
+    # where the users who just wrote are kept: a redis:// URL shared by the
+    # workers, or memory:// in a single process; replicas are refused
+    # without one, a worker wouldn't know of the writes another one took
+    REPLICA_STICKY_URL = os.environ.get('REPLICA_STICKY_URL', '')
+
+    # access tokens aren't tracked once issued, so they are kept short and
+    # renewed with a refresh token; only refresh tokens get revoked
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    BLACKLIST_PURGE_BATCH = 1000
+
+    # bcrypt cost, calibrated once per process tree when a target time is
+    # set, gunicorn.conf.py does it in the master
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_MIN_ROUNDS = 10
+    BCRYPT_TARGET_MS = None
+    # threads hashing passwords per process
+    BCRYPT_WORKERS = 2
+    # hashes running or waiting for a thread at once across the workers of
+    # a node, the ones past it get a 503
+    BCRYPT_SLOTS = int(os.environ.get('BCRYPT_SLOTS',
+                                      2 * (os.cpu_count() or 1)))
+    BCRYPT_SLOTS_PATH = os.environ.get(
+        'BCRYPT_SLOTS_PATH',
+        os.path.join(tempfile.gettempdir(), 'recipeapi_hashing'))
+
+    # users inserted per transaction by the bulk provisioning endpoint
+    PROVISION_CHUNK_SIZE = 1000
+
+    # items accepted by one bulk create or delete request
+    BULK_MAX_ITEMS = 1000
+
+    # rows fetched per round trip and bytes written at a time by exports
+    EXPORT_BATCH_SIZE = 1000
+    EXPORT_CHUNK_SIZE = 64 * 1024
+
+    # lines written per transaction by imports
+    IMPORT_BATCH_SIZE = 1000
+
+    # Bloom filter of revoked tokens shared by the workers on a node
+    REVOCATION_CACHE_ENABLED = True
+    REVOCATION_CACHE_PATH = os.environ.get(
+        'REVOCATION_CACHE_PATH',
+        os.path.join(tempfile.gettempdir(), 'recipeapi_revoked.bloom'))
+    REVOCATION_CACHE_BITS = 2 ** 23     # 1MB, ~1% false positives at 870k
+    REVOCATION_CACHE_HASHES = 7
+    REVOCATION_CACHE_REFRESH = 5        # seconds between DB refreshes
+    REVOCATION_CACHE_OVERLAP = 60       # seconds re-read to cover clock skew
+
+    # newest recipes embedded in each category of a category response
+    RECIPE_PREVIEW_SIZE = 5
+
+    # cache of GET responses per user: a redis:// URL shared by the
+    # workers, or memory:// for an LRU in a single process, whose writes
+    # no other process would see; empty turns it off
+    RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL', '')
+    RESPONSE_CACHE_TTL = 60             # seconds
+    RESPONSE_CACHE_MAX_ENTRIES = 10000  # per process, memory:// only
+
+    # encode responses with ujson when it is installed
+    FAST_JSON = True
+
+    # return the SQL statement count and time of each request in headers
+    QUERY_STATS_HEADERS = False
+
 
 class DevelopmentConfig(Config):
     """Configurations for Development."""
     DEBUG = True
     RESTPLUS_VALIDATE = True
     RESTPLUS_MASK_SWAGGER = False
+    QUERY_STATS_HEADERS = True
+    # the development server runs in one process
+    RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL', 'memory://')
+    REPLICA_STICKY_URL = os.environ.get('REPLICA_STICKY_URL', 'memory://')
 
 
 class TestingConfig(Config):
     """Configurations for Testing, with a separate test database."""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'postgresql://localhost/test_db'
+    # sqlite:// runs the suite in memory, pytest -n gives each worker its
+    # own database
+    SQLALCHEMY_DATABASE_URI = worker_database_url(
+        os.environ.get('TEST_DATABASE_URL', 'postgresql://localhost/test_db'),
+        os.environ.get('PYTEST_XDIST_WORKER'))
     DEBUG = True
     SQLALCHEMY_ECHO = False
     PRESERVE_CONTEXT_ON_EXCEPTION = False
+    REVOCATION_CACHE_PATH = os.path.join(
+        tempfile.gettempdir(), f'recipeapi_revoked_test_{os.getpid()}.bloom')
+    BCRYPT_SLOTS_PATH = os.path.join(
+        tempfile.gettempdir(), f'recipeapi_hashing_test_{os.getpid()}')
+    BCRYPT_LOG_ROUNDS = 4
+    RESPONSE_CACHE_URL = 'memory://'
+    REPLICA_STICKY_URL = 'memory://'
+    QUERY_STATS_HEADERS = True
 
 
 class ProductionConfig(Config):
     """Configurations for Production."""
     DEBUG = False
     TESTING = False
+    BCRYPT_TARGET_MS = int(os.environ.get('BCRYPT_TARGET_MS', 250))
 
 
 app_config = {
@@ -1,13 +1,23 @@
 ''' This script manages migrations and starts the app '''
 
+import json
 import os
+import sys
+import time
 from unittest import TestLoader, TextTestRunner
 from flask import redirect
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 
-from app import create_app
+from app import (
+    create_app, counters, explain as query_plans, ingredients, provisioning,
+    response_cache, revocation_cache, schema, seed as seeding, transfer)
 from app.db import db
+from app.hashing import password_hasher
+from app.models.blacklist import Blacklist
+from app.models.user import User
+from app.models.recipe import Recipe
+from app.search import create_search_index, include_object
 
 
 # FLASK_CONFIG = development
@@ -15,7 +25,7 @@ app = create_app(config_name=os.getenv('FLASK_CONFIG'))
 # print("This is the app", app)
 # print("This is the app type", type(app))
 # print("This is the app config", app.config)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, include_object=include_object)
 manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
@@ -33,6 +43,161 @@ def test():
     return 1
 
 
+@manager.command
+def purge_blacklist():
+    """Deletes blacklisted tokens that have expired."""
+
+    purged = Blacklist.purge_expired(
+        app.config['JWT_REFRESH_TOKEN_EXPIRES'],
+        batch_size=app.config['BLACKLIST_PURGE_BATCH'])
+    if purged:
+        revocation_cache.refresh(force=True)
+    print(f'Purged {purged} expired tokens from the blacklist')
+
+
+@manager.command
+def rebuild_counters():
+    """Rebuilds the category and recipe counters from the rows."""
+
+    counters.rebuild_counters()
+    print('The counters have been rebuilt')
+
+
+@manager.command
+def index_ingredients():
+    """Parses the ingredients of every recipe into the ingredient index."""
+
+    indexed = ingredients.reindex_recipes()
+    print(f'Indexed the ingredients of {indexed} recipes')
+
+
+@manager.command
+def search_index():
+    """Creates the recipe search index on an existing database."""
+
+    with db.engine.begin() as connection:
+        create_search_index(Recipe.__table__, connection)
+    print('The recipe search index is up to date')
+
+
+@manager.command
+def cascade_deletes():
+    """Moves the foreign keys of an existing database to ON DELETE CASCADE."""
+
+    try:
+        with db.engine.begin() as connection:
+            changed = schema.cascade_foreign_keys(connection)
+    except ValueError as error:
+        print(error)
+        return 1
+    print(f'Recreated {len(changed)} foreign keys')
+
+
+@manager.command
+def create_indexes():
+    """Creates the indexes of the models an existing database lacks."""
+
+    with db.engine.begin() as connection:
+        created = schema.create_missing_indexes(connection)
+    for name in created:
+        print(f'Created {name}')
+    print(f'Created {len(created)} indexes')
+
+
+@manager.option('-s', '--strict', action='store_true', default=False,
+                help='Fail if a query reads a whole table')
+def explain(strict=False):
+    """Prints the query plans of the endpoints' queries."""
+
+    try:
+        report = query_plans.explain_endpoints()
+    except ValueError as error:
+        print(error)
+        return 1
+    for name, plan, scans in report:
+        print(f'== {name}' + (' (reads a whole table)' if scans else ''))
+        for line in plan:
+            print(f'   {line}')
+    scanning = [name for name, _, scans in report if scans]
+    print(f'{len(scanning)} of {len(report)} queries read a whole table',
+          file=sys.stderr)
+    if strict and scanning:
+        return 1
+
+
+@manager.option('-u', '--users', type=int, default=100)
+@manager.option('-c', '--categories', type=int, default=10,
+                help='Categories per user')
+@manager.option('-r', '--recipes', type=int, default=10,
+                help='Recipes per category')
+@manager.option('-s', '--seed', dest='seed_value', type=int, default=0,
+                help='The same seed generates the same data')
+def seed(users=100, categories=10, recipes=10, seed_value=0):
+    """Fills the database with synthetic users, categories and recipes."""
+
+    start = time.perf_counter()
+    created = seeding.seed(users, categories, recipes, seed_value)
+    print('Created {} users, {} categories and {} recipes in {:.1f}s'.format(
+        *created, time.perf_counter() - start))
+
+
+@manager.option('path', help='CSV or NDJSON file of users')
+@manager.option('-f', '--format', dest='fmt', choices=provisioning.FORMATS,
+                help='File format, guessed from the extension by default')
+@manager.option('-c', '--chunk-size', type=int, default=1000,
+                help='Users inserted per transaction')
+@manager.option('-p', '--processes', type=int, default=None,
+                help='Password hashing processes, all cores by default')
+def provision_users(path, fmt=None, chunk_size=1000, processes=None):
+    """Creates users in bulk and prints a per-row NDJSON report."""
+
+    fmt = fmt or ('csv' if path.endswith('.csv') else 'ndjson')
+    created = 0
+    with open(path, 'rb') as users_file, provisioning.hashing_processes(
+            password_hasher.rounds, processes) as hash_passwords:
+        rows = provisioning.read_users(users_file, fmt)
+        for row in provisioning.provision_users(rows, hash_passwords,
+                                                chunk_size=chunk_size):
+            created += row['status'] == 'created'
+            print(json.dumps(row))
+    print(f'{created} users were created', file=sys.stderr)
+
+
+@manager.option('path', help='NDJSON file of categories and recipes')
+@manager.option('username', help='The owner of the recipe book')
+@manager.option('-b', '--batch-size', type=int, default=1000,
+                help='Lines written per transaction')
+def import_book(username, path, batch_size=1000):
+    """Imports categories and recipes and prints a per-line NDJSON report."""
+
+    the_user = User.query.filter_by(username=username.lower()).first()
+    if the_user is None:
+        print(f'The username {username} does not exist')
+        return 1
+    created = 0
+    with open(path, 'rb') as book_file:
+        records = transfer.read_records(book_file)
+        for report in transfer.import_book(the_user.user_id, records,
+                                           batch_size=batch_size):
+            created += report['status'] == 'created'
+            print(json.dumps(report))
+    response_cache.invalidate(the_user.user_id)
+    print(f'{created} categories and recipes were created', file=sys.stderr)
+
+
+@manager.command
+def make_admin(username):
+    """Gives a user access to the admin endpoints."""
+
+    the_user = User.query.filter_by(username=username.lower()).first()
+    if the_user is None:
+        print(f'The username {username} does not exist')
+        return 1
+    the_user.is_admin = True
+    db.session.commit()
+    print(f'{username} is now an admin')
+
+
 @app.route('/')
 def main():
     ''' Load the documentation on heroku '''
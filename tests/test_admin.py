@@ -0,0 +1,69 @@
+''' This script tests the admin endpoints '''
+
+import json
+
+from app import db
+from app.models.user import User
+from tests.test_base import BaseTestCase
+
+
+class AdminTestCase(BaseTestCase):
+    ''' Tests for bulk user provisioning '''
+
+    def admin_token(self):
+        ''' Registers the test user, makes them an admin and logs them in '''
+        self.user_registration()
+        with self.app.app_context():
+            User.query.filter_by(username='username').update(
+                {'is_admin': True})
+            db.session.commit()
+        return json.loads(self.user_login().data)['access_token']
+
+    def test_bulk_users_requires_admin(self):
+        ''' Test that a regular user can't provision users '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        res = self.client().post('/api/v1/admin/users/', headers=dict(
+            Authorization="Bearer " + token), data='')
+        self.assertEqual(res.status_code, 403)
+
+    def test_bulk_users_from_ndjson(self):
+        ''' Test that users are created and bad rows are reported '''
+        token = self.admin_token()
+        body = '\n'.join([
+            json.dumps({'username': 'alice', 'password': 'password',
+                        'email': 'alice@email.com'}),
+            json.dumps({'username': 'username', 'password': 'password',
+                        'email': 'other@email.com'}),
+            json.dumps({'username': 'bob', 'password': 'pw',
+                        'email': 'bob@email.com'}),
+            json.dumps({'username': 1, 'password': 'password',
+                        'email': 'carol@email.com'})])
+        res = self.client().post('/api/v1/admin/users/?format=ndjson',
+                                 headers=dict(Authorization="Bearer " + token),
+                                 data=body)
+        self.assertEqual(res.status_code, 200)
+        output = json.loads(res.data)
+        self.assertEqual(output['created'], 1)
+        self.assertEqual([(row['line'], row['status'])
+                          for row in output['failed']],
+                         [(3, 'invalid'), (4, 'invalid'), (2, 'conflict')])
+        self.assertEqual(output['failed'][1]['message'],
+                         'The username should be a string')
+        with self.app.app_context():
+            alice = User.query.filter_by(username='alice').first()
+            self.assertTrue(alice.password_checker('password'))
+
+    def test_bulk_users_from_csv(self):
+        ''' Test that users can be provisioned from CSV '''
+        token = self.admin_token()
+        body = ('username,password,email\n'
+                'alice,password,alice@email.com\n'
+                'carol,password,alice@email.com\n')
+        res = self.client().post('/api/v1/admin/users/?format=csv',
+                                 headers=dict(Authorization="Bearer " + token),
+                                 data=body)
+        output = json.loads(res.data)
+        self.assertEqual(output['created'], 1)
+        self.assertEqual(output['failed'][0]['message'],
+                         'The email alice@email.com already exists')
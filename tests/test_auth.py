@@ -1,7 +1,16 @@
 ''' This scripts handles setting up the app context for the tests '''
 
+import fcntl
 import json
+import os
+from datetime import timedelta
+from unittest import mock
 
+from flask_jwt_extended import create_access_token
+
+from app.hashing import (
+    HashingSlots, calibrate_rounds, calibrated_rounds, hash_rounds)
+from app.models.user import User
 from tests.test_base import BaseTestCase
 
 
@@ -33,6 +42,7 @@ class UserTestCase(BaseTestCase):
         self.assertEqual(res_1.status_code, 201)
         res_2 = self.client().post('/api/v1/auth/login/', data=self.user)
         self.assertEqual(res_2.status_code, 200)
+        self.assertMaxQueries(res_2, 1)
         output = json.loads(res_2.data)
         self.assertEqual(output['message'], 'You have been signed in')
 
@@ -58,7 +68,7 @@ class UserTestCase(BaseTestCase):
         ''' Test for logout '''
         self.user_registration()        # login user
         loggedin_user = self.user_login()
-        token = json.loads(loggedin_user.data)['access_token']
+        token = json.loads(loggedin_user.data)['refresh_token']
         delete_res = self.client().delete('/api/v1/auth/logout/', headers=dict(
             Authorization="Bearer " + token))
         self.assertEqual(delete_res.status_code, 200)
@@ -77,3 +87,73 @@ class UserTestCase(BaseTestCase):
                                           Authorization="Bearer " + token,
                                           data=passwords))
         self.assertEqual(reset_res.status_code, 200)
+
+    def test_login_rehashes_outdated_password(self):
+        ''' Test that a password hashed with an old cost is rehashed '''
+        self.user_registration()
+        self.app.config['BCRYPT_LOG_ROUNDS'] = 5
+        res = self.user_login()
+        self.assertEqual(res.status_code, 200)
+        with self.app.app_context():
+            the_user = User.query.filter_by(username='username').first()
+            self.assertEqual(hash_rounds(the_user.password), 5)
+            self.assertTrue(the_user.password_checker('password'))
+
+    def test_busy_hasher_turns_requests_away(self):
+        ''' Test that a request is turned away with a 503 while another
+            process holds every hashing slot
+        '''
+        slots = HashingSlots(self.app.config['BCRYPT_SLOTS_PATH'], 1)
+        self.app.extensions['password_hasher']['slots'] = slots
+        other_process = os.open(f'{slots.path}.0', os.O_RDWR | os.O_CREAT)
+        fcntl.flock(other_process, fcntl.LOCK_EX)
+        try:
+            res = self.user_registration()
+        finally:
+            os.close(other_process)
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(self.user_registration().status_code, 201)
+
+    def test_calibration_runs_once(self):
+        ''' Test that the apps of a process share one calibration '''
+        with mock.patch('app.hashing.calibrate_rounds',
+                        return_value=7) as calibrate:
+            self.assertEqual(calibrated_rounds(123, 6), 7)
+            self.assertEqual(calibrated_rounds(123, 6), 7)
+        self.assertEqual(calibrate.call_count, 1)
+
+    def test_calibrate_rounds_respects_minimum(self):
+        ''' Test that calibration never picks a cost below the minimum '''
+        self.assertEqual(calibrate_rounds(0.001, 6), 6)
+
+    def test_refresh_token(self):
+        ''' Test that a refresh token gets a new access token '''
+        self.user_registration()
+        tokens = json.loads(self.user_login().data)
+        res = self.client().post('/api/v1/auth/refresh/', headers=dict(
+            Authorization="Bearer " + tokens['refresh_token']))
+        self.assertEqual(res.status_code, 200)
+        access_token = json.loads(res.data)['access_token']
+        res = self.client().get('/api/v1/categories/', headers=dict(
+            Authorization="Bearer " + access_token))
+        self.assertEqual(res.status_code, 200)
+
+    def test_logged_out_refresh_token_is_rejected(self):
+        ''' Test that a refresh token can't be used after logging out '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['refresh_token']
+        headers = dict(Authorization="Bearer " + token)
+        self.client().delete('/api/v1/auth/logout/', headers=headers)
+        res = self.client().post('/api/v1/auth/refresh/', headers=headers)
+        self.assertEqual(json.loads(res.data)['message'],
+                         'You must be logged in to access this page')
+
+    def test_long_lived_access_token_is_rejected(self):
+        ''' Test that access tokens from before refresh tokens are refused '''
+        with self.app.app_context():
+            token = create_access_token(identity=1,
+                                        expires_delta=timedelta(days=365))
+        res = self.client().get('/api/v1/categories/', headers=dict(
+            Authorization="Bearer " + token))
+        self.assertEqual(json.loads(res.data)['message'],
+                         'You must be logged in to access this page')
@@ -1,18 +1,128 @@
-''' This script holds the universal configurations of the test cases '''
+''' This script holds the universal configurations of the test cases.
+
+    The schema is created once per process. Each test then runs in a
+    transaction on one connection that is rolled back when it ends, and
+    the commits of the code under test only release savepoints inside it.
+    Test cases that write through the engine themselves set rollback to
+    False and get the schema dropped and created again after each test.
+'''
 
 import json
 from unittest import TestCase
 
+from flask import _app_ctx_stack, g, has_request_context
+from flask_sqlalchemy import get_state
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine.url import make_url
+
 from app import create_app, db
+from app.replicas import RoutingSession
+
+# statements the harness runs on top of the ones of the code under test
+HARNESS_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT',
+                      'ROLLBACK TO SAVEPOINT')
+
+# the engine connector of the first app, shared by the apps of the process
+_connector = None
+
+
+class SavepointSession(RoutingSession):
+    ''' A session that works in a savepoint of the test's transaction, so
+        committing or rolling back leaves the transaction open
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.begin_nested()
+
+    def commit(self):
+        super().commit()
+        self.begin_nested()
+
+    def rollback(self):
+        super().rollback()
+        self.begin_nested()
+
+    def close(self):
+        # like closing a real session, drops what wasn't committed
+        if self.transaction is not None and self.transaction.nested:
+            self.transaction.rollback()
+        super().close()
+
+
+def create_database(url):
+    ''' Creates the Postgres database of a test worker if it is missing '''
+    server_url = make_url(str(url))
+    server_url.database = 'postgres'
+    server = create_engine(server_url, isolation_level='AUTOCOMMIT')
+    with server.connect() as connection:
+        if not connection.scalar('SELECT 1 FROM pg_database WHERE '
+                                 'datname = %s', url.database):
+            connection.execute(f'CREATE DATABASE "{url.database}"')
+    server.dispose()
+
+
+def begin_explicitly(connection):
+    ''' Lets SQLAlchemy rather than pysqlite begin the transactions of a
+        connection, pysqlite commits before a SAVEPOINT otherwise
+
+        :return: A function that hands the connection back to pysqlite
+    '''
+    dbapi_connection = connection.connection.connection
+    isolation_level = dbapi_connection.isolation_level
+    dbapi_connection.isolation_level = None
+
+    @event.listens_for(connection, 'begin')
+    def begin(conn):
+        conn.execute('BEGIN')
+
+    def restore():
+        dbapi_connection.isolation_level = isolation_level
+    return restore
+
+
+def uncount_harness_statements(connection):
+    ''' Keeps the savepoints of the harness out of the query counts the
+        tests check
+    '''
+    @event.listens_for(connection, 'after_cursor_execute')
+    def uncount(conn, cursor, statement, parameters, context, executemany):
+        if (statement.startswith(HARNESS_STATEMENTS) and
+                has_request_context() and 'query_count' in g):
+            g.query_count -= 1
+
+
+def share_engine(app):
+    ''' Points the app at the engine of the first app of the process, so
+        the schema is created once and an in-memory database outlives a test
+    '''
+    global _connector
+    state = get_state(app)
+    if _connector is not None:
+        state.connectors[None] = _connector
+        return
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'postgresql':
+            create_database(engine.url)
+        db.drop_all()
+        db.create_all()
+    _connector = state.connectors[None]
 
 
 class BaseTestCase(TestCase):
     ''' Setup the shared testing settings '''
 
+    # whether the test runs in a transaction that is rolled back
+    rollback = True
+
     def setUp(self):
 
         self.app = create_app(config_name="testing")
         self.client = self.app.test_client
+        share_engine(self.app)
+        if self.rollback:
+            self.begin()
 
         self.user = {"username": "username",
                      "password": "password", "email": "email@email.com"}
@@ -27,8 +137,30 @@ class BaseTestCase(TestCase):
         self.wrong_cred = {'username': 'username',
                            'password': '12345'}
 
+    def begin(self):
+        ''' Binds the sessions of the test to a transaction of their own '''
         with self.app.app_context():
-            db.create_all()
+            self.connection = db.engine.connect()
+        self.restore = None
+        if self.connection.dialect.name == 'sqlite':
+            self.restore = begin_explicitly(self.connection)
+        uncount_harness_statements(self.connection)
+        self.transaction = self.connection.begin()
+        self.session = db.session
+        db.session = orm.scoped_session(orm.sessionmaker(
+            class_=SavepointSession, db=db, bind=self.connection, binds={},
+            query_cls=db.Query), scopefunc=_app_ctx_stack.__ident_func__)
+        # cleanups run even when the rest of setUp fails
+        self.addCleanup(self.end)
+
+    def end(self):
+        ''' Rolls back everything the test wrote '''
+        db.session.remove()
+        db.session = self.session
+        self.transaction.rollback()
+        if self.restore is not None:
+            self.restore()
+        self.connection.close()
 
     def user_registration(self):
         ''' This method registers a user '''
@@ -49,8 +181,37 @@ class BaseTestCase(TestCase):
                                       Authorization="Bearer " + token),
                                   data=self.category)
 
+    def sign_in(self, category=True):
+        ''' Registers and logs in the test user, whose headers are kept in
+            self.headers, and creates a category of theirs
+
+            :param bool category: Whether to create the category
+            :return: The id of the category, None without one
+        '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        self.headers = dict(Authorization="Bearer " + token)
+        if not category:
+            return None
+        return json.loads(self.client().post(
+            '/api/v1/categories/', headers=self.headers,
+            data=self.category).data)['category_id']
+
+    def assertMaxQueries(self, response, budget):
+        ''' Asserts that a request ran no more SQL statements than budget
+
+            :param response: A test client response
+            :param int budget: The most statements the request may run
+        '''
+        count = int(response.headers['X-Query-Count'])
+        self.assertLessEqual(
+            count, budget,
+            f'{count} queries were run, the budget is {budget}')
+
     def tearDown(self):
+        if self.rollback:
+            return
+        db.session.remove()
         with self.app.app_context():
-
-            db.session.close()
             db.drop_all()
+            db.create_all()
@@ -0,0 +1,55 @@
+''' This script tests the expiry and purging of blacklisted tokens '''
+
+import json
+from datetime import datetime, timedelta
+
+from app import db
+from app.models.blacklist import Blacklist
+from tests.test_base import BaseTestCase
+
+
+class BlacklistTestCase(BaseTestCase):
+    ''' Tests for the blacklist storage '''
+
+    def test_logout_stores_token_expiry(self):
+        ''' Test that logging out records when the token expires '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['refresh_token']
+        self.client().delete('/api/v1/auth/logout/', headers=dict(
+            Authorization="Bearer " + token))
+        with self.app.app_context():
+            blacklisted = Blacklist.query.first()
+            self.assertGreater(blacklisted.expires, datetime.now())
+
+    def test_purge_keeps_live_tokens(self):
+        ''' Test that the purge only removes tokens that can't validate '''
+        now = datetime.now()
+        max_age = timedelta(days=365)
+        with self.app.app_context():
+            db.session.add_all([
+                Blacklist('expired', now - timedelta(seconds=1)),
+                Blacklist('live', now + timedelta(seconds=1)),
+                Blacklist('legacy_live'),
+                Blacklist('legacy_expired')])
+            db.session.commit()
+            Blacklist.query.filter_by(token='legacy_expired').update(
+                {'blacklist_date': now - max_age - timedelta(seconds=1)})
+            db.session.commit()
+
+            purged = Blacklist.purge_expired(max_age, batch_size=1, now=now)
+            self.assertEqual(purged, 2)
+            remaining = {row.token for row in Blacklist.query}
+            self.assertEqual(remaining, {'live', 'legacy_live'})
+
+    def test_purged_logout_stays_revoked_until_expiry(self):
+        ''' Test that a logged out token is still rejected after a purge '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['refresh_token']
+        headers = dict(Authorization="Bearer " + token)
+        self.client().delete('/api/v1/auth/logout/', headers=headers)
+        with self.app.app_context():
+            Blacklist.purge_expired(
+                self.app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+        res = self.client().post('/api/v1/auth/refresh/', headers=headers)
+        self.assertEqual(json.loads(res.data)['message'],
+                         'You must be logged in to access this page')
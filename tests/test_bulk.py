@@ -0,0 +1,121 @@
+''' This script tests the bulk create and delete endpoints '''
+
+import json
+
+from app import db
+from app.models.category import Category
+from app.models.ingredient import recipe_ingredients
+from app.models.recipe import Recipe
+from app.models.user import User
+from tests.test_base import BaseTestCase
+
+
+class BulkTestCase(BaseTestCase):
+    ''' Tests for creating and deleting many categories and recipes '''
+
+    def setUp(self):
+        super().setUp()
+        self.category_id = self.sign_in()
+
+    def send(self, method, url, body):
+        return getattr(self.client(), method)(
+            url, headers=self.headers, data=json.dumps(body),
+            content_type='application/json')
+
+    def create_recipes(self, recipes):
+        return self.send('post', f'/api/v1/recipes/{self.category_id}/bulk/',
+                         {'recipes': recipes})
+
+    def test_bulk_create_categories(self):
+        ''' Test that the valid categories are created and the others are
+            reported by their index
+        '''
+        res = self.send('post', '/api/v1/categories/bulk/', {'categories': [
+            {'category_name': 'soups', 'description': 'warm'},
+            {'category_name': '123', 'description': 'digits'},
+            {'category_name': 'category', 'description': 'exists'},
+            {'category_name': 'soups', 'description': 'twice'},
+            {'category_name': 'salads'}]})
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['created', 'invalid', 'conflict', 'conflict',
+                          'created'])
+        self.assertMaxQueries(res, 5)
+        with self.app.app_context():
+            self.assertEqual(Category.query.count(), 3)
+            self.assertEqual(User.query.one().category_count, 3)
+            soups = Category.query.get(data['results'][0]['category_id'])
+            self.assertEqual(soups.category_name, 'soups')
+
+    def test_bulk_create_recipes(self):
+        ''' Test that created recipes are counted, indexed and searchable '''
+        res = self.create_recipes([
+            {'recipe_name': 'pancakes', 'ingredients': 'flour, eggs, milk'},
+            {'recipe_name': 'omelette', 'ingredients': 'eggs, salt'},
+            {'recipe_name': 'pancakes', 'ingredients': 'flour'},
+            {'ingredients': 'no name'}])
+        data = json.loads(res.data)
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['created', 'created', 'conflict', 'invalid'])
+        with self.app.app_context():
+            self.assertEqual(Category.query.one().recipe_count, 2)
+            self.assertEqual(User.query.one().recipe_count, 2)
+            self.assertEqual(Recipe.query.filter_by(
+                recipe_name='pancakes').one().ingredient_count, 3)
+
+        pantry = json.loads(self.client().get(
+            '/api/v1/recipes/pantry/?ingredients=eggs',
+            headers=self.headers).data)
+        self.assertEqual(len(pantry['recipes']), 2)
+        search = json.loads(self.client().get(
+            f'/api/v1/recipes/{self.category_id}/?q=omelette',
+            headers=self.headers).data)
+        self.assertEqual(search['recipes'][0]['recipe_name'], 'omelette')
+
+    def test_bulk_delete(self):
+        ''' Test that deleting categories removes their recipes, index rows
+            and counters
+        '''
+        created = json.loads(self.create_recipes([
+            {'recipe_name': 'pancakes', 'ingredients': 'flour, eggs'},
+            {'recipe_name': 'omelette', 'ingredients': 'eggs'}]).data)
+        recipe_id = created['results'][0]['recipe_id']
+        res = self.send('delete', f'/api/v1/recipes/{self.category_id}/bulk/',
+                        {'ids': [recipe_id, 999, 'x']})
+        self.assertEqual([result['status'] for result in
+                          json.loads(res.data)['results']],
+                         ['invalid', 'deleted', 'not_found'])
+        with self.app.app_context():
+            self.assertEqual(Category.query.one().recipe_count, 1)
+
+        res = self.send('delete', '/api/v1/categories/bulk/',
+                        {'ids': [self.category_id]})
+        self.assertEqual(json.loads(res.data)['deleted'], 1)
+        with self.app.app_context():
+            self.assertEqual(Category.query.count(), 0)
+            self.assertEqual(Recipe.query.count(), 0)
+            self.assertEqual(db.session.query(recipe_ingredients).count(), 0)
+            user = User.query.one()
+            self.assertEqual((user.category_count, user.recipe_count), (0, 0))
+
+    def test_bulk_writes_invalidate_the_cache(self):
+        ''' Test that a bulk write drops the user's cached responses '''
+        self.client().get('/api/v1/categories/', headers=self.headers)
+        self.send('post', '/api/v1/categories/bulk/',
+                  {'categories': [{'category_name': 'soups'}]})
+        res = self.client().get('/api/v1/categories/', headers=self.headers)
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(json.loads(res.data)['categories']), 2)
+
+    def test_bulk_body_is_checked(self):
+        ''' Test that a body without a list, or too long a list, is a 400 '''
+        res = self.send('post', '/api/v1/categories/bulk/', {'categories': 1})
+        self.assertEqual(res.status_code, 400)
+        self.app.config['BULK_MAX_ITEMS'] = 1
+        res = self.send('delete', '/api/v1/categories/bulk/', {'ids': [1, 2]})
+        self.assertEqual(res.status_code, 400)
+        res = self.send('post', '/api/v1/recipes/999/bulk/', {'recipes': []})
+        self.assertEqual(res.status_code, 404)
@@ -2,6 +2,14 @@
 
 import json
 
+from sqlalchemy import event
+
+from app import db
+from app.get_helper import dump_categories
+from app.models.category import Category
+from app.models.ingredient import recipe_ingredients
+from app.models.recipe import Recipe
+from app.models.user import User
 from tests.test_base import BaseTestCase
 
 
@@ -85,6 +93,12 @@ class CategoryTestCase(BaseTestCase):
         self.assertEqual(view_res.status_code, 200)
         self.assertIn(b'category', view_res.data)
 
+        search_res = self.client().get('/api/v1/categories/?q=one',
+                                       headers=dict(
+                                           Authorization="Bearer " + token))
+        self.assertEqual(len(json.loads(search_res.data)['categories']), 1)
+        self.assertMaxQueries(search_res, 3)
+
     def test_edit_category(self):
         ''' Test that the API can view all categories '''
         self.user_registration()
@@ -121,3 +135,149 @@ class CategoryTestCase(BaseTestCase):
         self.assertEqual(delete_res.status_code, 200)
         delete_res = json.loads(delete_res.data)
         self.assertEqual(delete_res['message'], 'Category was deleted')
+
+    def test_delete_category_leaves_recipes_to_the_database(self):
+        ''' Test that deleting a category removes its recipes without
+            loading them
+        '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        headers = dict(Authorization="Bearer " + token)
+        category_id = json.loads(self.create_category().data)['category_id']
+        for recipe in (self.recipe, self.recipe1):
+            self.client().post(f'/api/v1/recipes/{category_id}/',
+                               headers=headers, data=recipe)
+
+        loaded = []
+
+        def recipe_loaded(target, context):
+            loaded.append(target)
+
+        event.listen(Recipe, 'load', recipe_loaded)
+        try:
+            res = self.client().delete(f'/api/v1/categories/{category_id}/',
+                                       headers=headers)
+        finally:
+            event.remove(Recipe, 'load', recipe_loaded)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(loaded, [])
+        with self.app.app_context():
+            self.assertEqual(Recipe.query.count(), 0)
+            self.assertEqual(db.session.query(recipe_ingredients).count(), 0)
+            user = User.query.one()
+            self.assertEqual((user.category_count, user.recipe_count), (0, 0))
+
+        category_id = json.loads(self.create_category().data)['category_id']
+        self.client().post(f'/api/v1/recipes/{category_id}/',
+                           headers=headers, data=self.recipe)
+        with self.app.app_context():
+            db.session.delete(User.query.one())
+            db.session.commit()
+            self.assertEqual(Recipe.query.count(), 0)
+            self.assertEqual(db.session.query(recipe_ingredients).count(), 0)
+
+    def test_view_categories_by_cursor(self):
+        ''' Test that the API can page through categories with a cursor '''
+        self.user_registration()
+        loggedin_user = self.user_login()
+        token = json.loads(loggedin_user.data)['access_token']
+        headers = dict(Authorization="Bearer " + token)
+        for name in ('one', 'two', 'three', 'four', 'five', 'six'):
+            self.client().post('/api/v1/categories/', headers=headers,
+                               data={"category_name": f'category {name}',
+                                     "description": "description"})
+
+        first = json.loads(self.client().get(
+            '/api/v1/categories/?per_page=5&cursor=', headers=headers).data)
+        self.assertEqual(len(first['categories']), 5)
+        self.assertNotIn('categoryPages', first)
+        second = json.loads(self.client().get(
+            '/api/v1/categories/?per_page=5&cursor={}'.format(
+                first['next_cursor']), headers=headers).data)
+        self.assertEqual([a_category['category_name']
+                          for a_category in second['categories']],
+                         ['category one'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_invalid_cursor(self):
+        ''' Test that the API rejects a cursor it didn't issue '''
+        self.user_registration()
+        loggedin_user = self.user_login()
+        token = json.loads(loggedin_user.data)['access_token']
+        res = self.client().get('/api/v1/categories/?cursor=notacursor',
+                                headers=dict(Authorization="Bearer " + token))
+        self.assertEqual(res.status_code, 400)
+
+    def test_category_recipes_are_a_capped_preview(self):
+        ''' Test that categories embed their newest recipes up to the preview
+            size with one query for the whole page
+        '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        headers = dict(Authorization="Bearer " + token)
+        self.app.config['RECIPE_PREVIEW_SIZE'] = 2
+        for name in ('one', 'two', 'three'):
+            category_id = json.loads(self.client().post(
+                '/api/v1/categories/', headers=headers,
+                data={"category_name": f'category {name}',
+                      "description": "description"}).data)['category_id']
+            for recipe_name in ('soup', 'stew', 'pie'):
+                self.client().post(
+                    f'/api/v1/recipes/{category_id}/', headers=headers,
+                    data={"recipe_name": recipe_name,
+                          "ingredients": "water"})
+
+        res = self.client().get('/api/v1/categories/', headers=headers)
+        categories = json.loads(res.data)['categories']
+        self.assertEqual(len(categories), 3)
+        for a_category in categories:
+            self.assertEqual(a_category['recipe_count'], 3)
+            self.assertEqual([a_recipe['recipe_name'] for a_recipe in
+                              a_category['recipes']], ['pie', 'stew'])
+        self.assertMaxQueries(res, 3)
+
+        res = self.client().get(f'/api/v1/categories/{category_id}/',
+                                headers=headers)
+        self.assertEqual(len(json.loads(res.data)['recipes']), 2)
+
+    def test_recipe_previews_leave_the_collection_alone(self):
+        ''' Test that dumping a preview doesn't truncate the recipes the
+            session holds for a category
+        '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        headers = dict(Authorization="Bearer " + token)
+        self.app.config['RECIPE_PREVIEW_SIZE'] = 1
+        category_id = json.loads(self.create_category().data)['category_id']
+        for recipe_name in ('soup', 'stew'):
+            self.client().post(
+                f'/api/v1/recipes/{category_id}/', headers=headers,
+                data={"recipe_name": recipe_name, "ingredients": "water"})
+        with self.app.app_context():
+            a_category = Category.query.get(category_id)
+            dumped, = dump_categories([a_category], {})
+            self.assertEqual(len(dumped['recipes']), 1)
+            self.assertEqual(len(a_category.recipes), 2)
+
+    def test_category_fields_and_expand(self):
+        ''' Test that clients can pick the category fields and leave the
+            recipes out
+        '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        headers = dict(Authorization="Bearer " + token)
+        self.create_category()
+
+        res = self.client().get(
+            '/api/v1/categories/?fields=category_id,category_name&expand=',
+            headers=headers)
+        a_category, = json.loads(res.data)['categories']
+        self.assertEqual(set(a_category), {'category_id', 'category_name'})
+        self.assertMaxQueries(res, 2)
+
+        res = self.client().get('/api/v1/categories/?fields=password',
+                                headers=headers)
+        self.assertEqual(res.status_code, 400)
+        res = self.client().get('/api/v1/categories/?expand=user',
+                                headers=headers)
+        self.assertEqual(res.status_code, 400)
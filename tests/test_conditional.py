@@ -0,0 +1,80 @@
+''' This script tests the conditional GETs of categories and recipes '''
+
+import json
+
+from tests.test_base import BaseTestCase
+
+
+class ConditionalTestCase(BaseTestCase):
+    ''' Tests for the ETag and Last-Modified validators '''
+
+    def setUp(self):
+        super().setUp()
+        self.category_id = self.sign_in()
+        self.recipe_id = json.loads(self.client().post(
+            f'/api/v1/recipes/{self.category_id}/', headers=self.headers,
+            data=self.recipe).data)['recipe_id']
+
+    def get(self, url, **headers):
+        ''' Sends an authorised GET with extra headers '''
+        headers.update(self.headers)
+        return self.client().get(url, headers=headers)
+
+    def test_unchanged_list_is_not_sent_again(self):
+        ''' Test that a matching ETag gets a 304 without loading rows '''
+        for url in ('/api/v1/categories/', '/api/v1/recipes/',
+                    f'/api/v1/recipes/{self.category_id}/'):
+            res = self.get(url)
+            self.assertEqual(res.status_code, 200)
+            etag = res.headers['ETag']
+            self.assertIn('Last-Modified', res.headers)
+
+            res = self.get(url, **{'If-None-Match': etag})
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res.data, b'')
+            self.assertEqual(res.headers['ETag'], etag)
+            self.assertMaxQueries(res, 1)
+
+    def test_changes_give_a_new_etag(self):
+        ''' Test that adding, editing or deleting a row changes the ETag '''
+        etag = self.get('/api/v1/categories/').headers['ETag']
+        self.client().put(
+            f'/api/v1/recipes/{self.category_id}/{self.recipe_id}/',
+            headers=self.headers, data={"recipe_name": "renamed recipe"})
+        res = self.get('/api/v1/categories/', **{'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+        etag = res.headers['ETag']
+        self.client().delete(
+            f'/api/v1/recipes/{self.category_id}/{self.recipe_id}/',
+            headers=self.headers)
+        res = self.get('/api/v1/categories/', **{'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+
+    def test_etag_depends_on_the_query(self):
+        ''' Test that other pages and fieldsets don't share an ETag '''
+        etag = self.get('/api/v1/categories/').headers['ETag']
+        res = self.get('/api/v1/categories/?expand=',
+                       **{'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+
+    def test_if_modified_since(self):
+        ''' Test that single items honour If-Modified-Since and lists don't,
+            since a deletion doesn't move their Last-Modified date
+        '''
+        url = f'/api/v1/recipes/{self.category_id}/{self.recipe_id}/'
+        last_modified = self.get(url).headers['Last-Modified']
+        res = self.get(url, **{'If-Modified-Since': last_modified})
+        self.assertEqual(res.status_code, 304)
+
+        url = f'/api/v1/recipes/{self.category_id}/'
+        last_modified = self.get(url).headers['Last-Modified']
+        res = self.get(url, **{'If-Modified-Since': last_modified})
+        self.assertEqual(res.status_code, 200)
+
+    def test_missing_recipe_is_not_found(self):
+        ''' Test that a missing recipe is a 404 with no validators '''
+        res = self.get(f'/api/v1/recipes/{self.category_id}/0/')
+        self.assertEqual(res.status_code, 404)
+        self.assertNotIn('ETag', res.headers)
@@ -0,0 +1,65 @@
+''' This script tests the category and recipe counters '''
+
+import json
+
+from app import db
+from app.counters import rebuild_counters
+from app.models.category import Category
+from app.models.user import User
+from tests.test_base import BaseTestCase
+
+
+class CounterTestCase(BaseTestCase):
+    ''' Tests for the counters kept on categories and users '''
+
+    def setUp(self):
+        super().setUp()
+        self.category_id = self.sign_in()
+        for recipe in (self.recipe, self.recipe1):
+            self.client().post('/api/v1/recipes/{}/'.format(
+                self.category_id), headers=self.headers, data=recipe)
+
+    def counts(self):
+        ''' Returns the counters of the test user and category '''
+        with self.app.app_context():
+            the_user = User.query.filter_by(username='username').first()
+            the_category = Category.query.get(self.category_id)
+            return (the_user.category_count, the_user.recipe_count,
+                    the_category.recipe_count if the_category else None)
+
+    def test_counters_follow_inserts_and_deletes(self):
+        ''' Test that the counters change with the rows they count '''
+        self.assertEqual(self.counts(), (1, 2, 2))
+        res = self.client().get('/api/v1/categories/{}/'.format(
+            self.category_id), headers=self.headers)
+        self.assertEqual(json.loads(res.data)['recipe_count'], 2)
+
+        recipes = json.loads(self.client().get(
+            '/api/v1/recipes/', headers=self.headers).data)['recipes']
+        self.client().delete('/api/v1/recipes/{}/{}/'.format(
+            self.category_id, recipes[0]['recipe_id']), headers=self.headers)
+        self.assertEqual(self.counts(), (1, 1, 1))
+
+    def test_counters_follow_cascade_delete(self):
+        ''' Test that deleting a category discounts its recipes '''
+        self.client().delete('/api/v1/categories/{}/'.format(
+            self.category_id), headers=self.headers)
+        self.assertEqual(self.counts(), (0, 0, None))
+
+    def test_rebuild_counters(self):
+        ''' Test that drifted counters can be rebuilt from the rows '''
+        with self.app.app_context():
+            User.query.update({'recipe_count': 42, 'category_count': 0})
+            Category.query.update({'recipe_count': 0})
+            db.session.commit()
+            rebuild_counters()
+        self.assertEqual(self.counts(), (1, 2, 2))
+
+    def test_pages_come_from_counters(self):
+        ''' Test that the number of pages is read from the counters '''
+        with self.app.app_context():
+            User.query.update({'recipe_count': 11})
+            db.session.commit()
+        res = self.client().get('/api/v1/recipes/?per_page=5',
+                                headers=self.headers)
+        self.assertEqual(json.loads(res.data)['recipePages'], 3)
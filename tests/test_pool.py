@@ -0,0 +1,90 @@
+''' This script tests the connection pool and the statement timeouts '''
+
+import json
+import os
+import tempfile
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool
+
+from app import db
+from app.models.user import User
+from app.pool import InstrumentedQueuePool, statement_timeout
+from tests.test_base import BaseTestCase
+
+
+class PoolTestCase(BaseTestCase):
+    ''' Tests for the pool settings and statistics '''
+
+    def pool_options(self, url):
+        options = {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10}
+        db.apply_driver_hacks(self.app, make_url(url), options)
+        return options
+
+    def test_pool_follows_the_config(self):
+        ''' Test that Postgres gets the instrumented pool, or none behind
+            PgBouncer
+        '''
+        options = self.pool_options('postgresql://localhost/recipe_db')
+        self.assertIs(options['poolclass'], InstrumentedQueuePool)
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['pool_size'], 5)
+
+        self.app.config['DATABASE_PGBOUNCER'] = True
+        options = self.pool_options('postgresql://localhost/recipe_db')
+        self.assertIs(options['poolclass'], NullPool)
+        self.assertNotIn('pool_size', options)
+
+        options = self.pool_options('sqlite:///recipe.db')
+        self.assertIs(options['poolclass'], NullPool)
+
+    def test_pool_counts_waits_and_dead_connections(self):
+        ''' Test that timeouts and dead connections are counted, and that a
+            dead connection is replaced before it is handed out
+        '''
+        path = os.path.join(tempfile.mkdtemp(), 'pool.db')
+        engine = create_engine(
+            f'sqlite:///{path}', poolclass=InstrumentedQueuePool,
+            pool_size=1, max_overflow=0, pool_timeout=0.05,
+            pool_pre_ping=True)
+        connection = engine.connect()
+        with self.assertRaises(exc.TimeoutError):
+            engine.connect()
+        self.assertEqual(engine.pool.stats()['checked_out'], 1)
+        dbapi_connection = connection.connection.connection
+        connection.close()
+        # the database drops the connection while it is idle in the pool
+        dbapi_connection.close()
+
+        with engine.connect() as connection:
+            self.assertEqual(connection.scalar('SELECT 1'), 1)
+        stats = engine.pool.stats()
+        self.assertEqual((stats['checkouts'], stats['timeouts'],
+                          stats['dead_connections']), (3, 1, 1))
+        self.assertGreaterEqual(stats['wait_ms_max'], 50)
+        engine.dispose()
+        self.assertEqual(engine.pool.stats()['dead_connections'], 1)
+
+    def test_statement_timeout_per_endpoint(self):
+        ''' Test that an endpoint can have its own statement timeout '''
+        with self.app.test_request_context('/api/v1/transfer/export/'):
+            self.assertEqual(statement_timeout(), 60000)
+        with self.app.test_request_context('/api/v2/categories/'):
+            self.assertEqual(statement_timeout(), 5000)
+        # manage.py commands get the command timeout, none by default
+        with self.app.app_context():
+            self.assertEqual(statement_timeout(), 0)
+
+    def test_pool_stats_need_admin(self):
+        ''' Test that admins can read the pool statistics of a worker '''
+        self.user_registration()
+        headers = dict(Authorization="Bearer " + json.loads(
+            self.user_login().data)['access_token'])
+        res = self.client().get('/api/v1/admin/pool/', headers=headers)
+        self.assertEqual(res.status_code, 403)
+        with self.app.app_context():
+            User.query.update({'is_admin': True})
+            db.session.commit()
+        res = self.client().get('/api/v1/admin/pool/', headers=headers)
+        self.assertEqual(json.loads(res.data)['pid'], os.getpid())
@@ -2,6 +2,11 @@
 
 import json
 
+from app import db
+from app.ingredients import insert_ingredients, parse_ingredients
+from app.models.category import Category
+from app.models.ingredient import Ingredient
+from app.models.recipe import Recipe
 from tests.test_base import BaseTestCase
 
 
@@ -69,6 +74,12 @@ class RecipeTestCase(BaseTestCase):
         view_res = json.loads(view_res.data)
         self.assertIn('recipe_name', view_res)
 
+        list_res = self.client().get('/api/v1/recipes/{}/'.format(
+            category_res['category_id']),
+            headers=dict(Authorization="Bearer " + token))
+        self.assertEqual(list_res.status_code, 200)
+        self.assertMaxQueries(list_res, 2)
+
     def test_view_all_recipes(self):
         """ Test that the API can view several recipes """
 
@@ -141,3 +152,162 @@ class RecipeTestCase(BaseTestCase):
         delete_res = json.loads(delete_res.data)
         # print(self.recipe)
         self.assertEqual(delete_res['message'], 'Recipe was deleted')
+
+    def create_recipes(self, token, category_id, recipes):
+        ''' This helper creates recipes from (name, ingredients) pairs '''
+        for recipe_name, ingredients in recipes:
+            res = self.client().post('/api/v1/recipes/{}/'.format(
+                category_id), headers=dict(Authorization="Bearer " + token),
+                data={"recipe_name": recipe_name, "ingredients": ingredients})
+            self.assertEqual(res.status_code, 201)
+
+    def test_search_recipes(self):
+        """ Test that the search matches ingredients and ranks the recipes
+            whose name matches first
+        """
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        category_res = json.loads(self.create_category().data)
+        self.create_recipes(token, category_res['category_id'], [
+            ('bread', 'flour, tomatoes, water'),
+            ('tomato soup', 'water, salt'),
+            ('pancakes', 'flour, eggs, milk')])
+
+        res = self.client().get('/api/v1/recipes/?q=tomato', headers=dict(
+            Authorization="Bearer " + token))
+        self.assertEqual(res.status_code, 200)
+        output = json.loads(res.data)
+        self.assertEqual([a_recipe['recipe_name']
+                          for a_recipe in output['recipes']],
+                         ['tomato soup', 'bread'])
+        self.assertEqual(output['message'],
+                         'These are the recipe search results')
+
+    def test_search_recipes_in_category_is_paginated(self):
+        """ Test that a search in a category only returns its recipes, a
+            page at a time
+        """
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        category_res = json.loads(self.create_category().data)
+        category1_res = json.loads(self.client().post(
+            '/api/v1/categories/', headers=dict(
+                Authorization="Bearer " + token), data=self.category1).data)
+        self.create_recipes(token, category_res['category_id'], [
+            (f'cake {name}', 'flour') for name in
+            ('one', 'two', 'three', 'four', 'five', 'six', 'seven')])
+        self.create_recipes(token, category1_res['category_id'], [
+            ('cake', 'flour')])
+
+        res = self.client().get(
+            '/api/v1/recipes/{}/?q=cake&per_page=5&page=2'.format(
+                category_res['category_id']), headers=dict(
+                    Authorization="Bearer " + token))
+        output = json.loads(res.data)
+        self.assertEqual(output['recipePages'], 2)
+        self.assertEqual(len(output['recipes']), 2)
+        self.assertTrue(all(a_recipe['category'] ==
+                            category_res['category_id']
+                            for a_recipe in output['recipes']))
+
+    def test_view_recipes_by_cursor(self):
+        """ Test that the API can page through recipes with a cursor """
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        category_res = json.loads(self.create_category().data)
+        self.create_recipes(token, category_res['category_id'], [
+            (f'cake {name}', 'flour') for name in
+            ('one', 'two', 'three', 'four', 'five', 'six')])
+        headers = dict(Authorization="Bearer " + token)
+
+        seen, cursor = [], ''
+        while cursor is not None:
+            res = json.loads(self.client().get(
+                '/api/v1/recipes/?per_page=5&cursor=' + cursor,
+                headers=headers).data)
+            seen.extend(a_recipe['recipe_name'] for a_recipe in res['recipes'])
+            cursor = res['next_cursor']
+        self.assertEqual(seen[0], 'cake six')
+        self.assertEqual(len(seen), 6)
+
+    def test_parse_ingredients(self):
+        """ Test that ingredients are split and normalised for the index """
+        self.assertEqual(
+            parse_ingredients('2 cups of Tomatoes, salt and 3 eggs; salt'),
+            ['egg', 'salt', 'tomato'])
+
+    def test_pantry_ranks_by_coverage(self):
+        """ Test that the recipes covered best by the ingredients at hand
+            come first
+        """
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        headers = dict(Authorization="Bearer " + token)
+        category_res = json.loads(self.create_category().data)
+        self.create_recipes(token, category_res['category_id'], [
+            ('omelette', 'eggs, salt, cheese'),
+            ('boiled eggs', 'eggs, water'),
+            ('toast', 'bread, butter')])
+
+        res = self.client().get(
+            '/api/v1/recipes/pantry/?ingredients=egg,water', headers=headers)
+        output = json.loads(res.data)
+        self.assertEqual([(a_recipe['recipe_name'], a_recipe['missing'])
+                          for a_recipe in output['recipes']],
+                         [('boiled eggs', 0), ('omelette', 2)])
+
+    def test_recipes_flushed_together_share_ingredients(self):
+        """ Test that a new ingredient used by several recipes of one flush
+            is only added once
+        """
+        self.user_registration()
+        category_id = json.loads(self.create_category().data)['category_id']
+        with self.app.app_context():
+            a_category = Category.query.get(category_id)
+            db.session.add_all([
+                Recipe('soup', 'salt, water', category_id,
+                       a_category.created_by),
+                Recipe('brine', 'salt, water', category_id,
+                       a_category.created_by)])
+            db.session.commit()
+            self.assertEqual(
+                sorted(an_ingredient.name
+                       for an_ingredient in Ingredient.query),
+                ['salt', 'water'])
+
+    def test_ingredients_added_elsewhere_are_left_alone(self):
+        """ Test that adding an ingredient another transaction has just
+            added doesn't fail
+        """
+        with self.app.app_context():
+            db.session.add(Ingredient('salt'))
+            db.session.commit()
+            insert_ingredients(db.session, ['salt', 'pepper'])
+            db.session.commit()
+            self.assertEqual(
+                sorted(an_ingredient.name
+                       for an_ingredient in Ingredient.query),
+                ['pepper', 'salt'])
+
+    def test_pantry_follows_recipe_edits(self):
+        """ Test that editing the ingredients of a recipe updates the index """
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        headers = dict(Authorization="Bearer " + token)
+        category_res = json.loads(self.create_category().data)
+        self.create_recipes(token, category_res['category_id'], [
+            ('toast', 'bread, butter')])
+        recipes = json.loads(self.client().get(
+            '/api/v1/recipes/', headers=headers).data)['recipes']
+        recipe_id = recipes[0]['recipe_id']
+        self.client().put('/api/v1/recipes/{}/{}/'.format(
+            category_res['category_id'], recipe_id), headers=headers,
+            data={"recipe_name": "toast", "ingredients": "bread, jam"})
+
+        res = self.client().get('/api/v1/recipes/pantry/?ingredients=butter',
+                                headers=headers)
+        self.assertEqual(json.loads(res.data)['message'],
+                         'None of your recipes use these ingredients')
+        res = self.client().get('/api/v1/recipes/pantry/?ingredients=jam',
+                                headers=headers)
+        self.assertEqual(len(json.loads(res.data)['recipes']), 1)
@@ -0,0 +1,75 @@
+''' This script tests the routing of reads to a read replica '''
+
+import json
+import os
+import tempfile
+
+from sqlalchemy import create_engine
+
+from app import db
+from app.replicas import read_replicas
+from tests.test_base import BaseTestCase
+
+
+class ReplicaTestCase(BaseTestCase):
+    ''' Tests for reading GET requests from a second SQLite database '''
+
+    def setUp(self):
+        super().setUp()
+        self.sign_in(category=False)
+
+        # the replica has a category the primary doesn't
+        url = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "replica.db")}'
+        replica = create_engine(url)
+        db.Model.metadata.create_all(replica)
+        replica.execute("INSERT INTO users (user_id, username, email, "
+                        "password, is_admin, category_count, recipe_count) "
+                        "VALUES (1, 'username', 'email', 'x', 0, 1, 0)")
+        replica.execute("INSERT INTO categories (category_name, description, "
+                        "created_by, version, recipe_count) VALUES "
+                        "('replica', 'only there', 1, 1, 0)")
+        replica.dispose()
+        self.app.config['SQLALCHEMY_BINDS'] = {'replica0': url}
+
+    def category_names(self):
+        res = self.client().get('/api/v1/categories/', headers=self.headers)
+        return [category['category_name']
+                for category in json.loads(res.data)['categories']]
+
+    def test_reads_follow_the_writes_of_the_user(self):
+        ''' Test that GETs read from the replica, except for a while after
+            the user wrote something
+        '''
+        self.assertEqual(self.category_names(), ['replica'])
+        res = self.create_category()
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self.category_names(), ['category'])
+
+        self.app.config['REPLICA_STICKY_SECONDS'] = 0
+        self.client().post('/api/v1/categories/', headers=self.headers,
+                           data=self.category1)
+        self.assertEqual(self.category_names(), ['replica'])
+
+    def test_reads_fall_back_to_the_primary(self):
+        ''' Test that the primary serves the reads when the replica is down '''
+        self.app.config['SQLALCHEMY_BINDS'] = {
+            'replica0': 'sqlite:////nonexistent/replica.db'}
+        self.app.config['REPLICA_STICKY_SECONDS'] = 0
+        self.create_category()
+        self.assertEqual(self.category_names(), ['category'])
+        self.assertEqual(
+            list(self.app.extensions['read_replicas']['down']), ['replica0'])
+
+    def test_reads_skip_the_health_check(self):
+        ''' Test that picking a replica doesn't connect to it '''
+        self.app.config['SQLALCHEMY_BINDS'] = {
+            'replica0': 'sqlite:////nonexistent/replica.db'}
+        with self.app.test_request_context('/api/v1/categories/'):
+            self.assertIsNotNone(read_replicas.pick())
+        self.assertEqual(self.app.extensions['read_replicas']['down'], {})
+
+    def test_replicas_need_a_shared_backend(self):
+        ''' Test that the app refuses replicas without REPLICA_STICKY_URL '''
+        self.app.config['REPLICA_STICKY_URL'] = ''
+        with self.assertRaises(ValueError):
+            read_replicas.init_app(self.app)
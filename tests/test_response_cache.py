@@ -0,0 +1,108 @@
+''' This script tests the response cache of the categories and recipes '''
+
+import json
+
+from app import db
+from app.models.user import User
+from app.response_cache import MemoryBackend, RedisBackend
+from tests.test_base import BaseTestCase
+
+
+class FakeRedis(object):
+    ''' The part of the redis-py client the cache uses, kept in a dict '''
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = value.encode('utf-8')
+
+    def incr(self, name):
+        self.data[name] = str(int(self.data.get(name, b'0')) + 1).encode()
+        return int(self.data[name])
+
+
+class ResponseCacheTestCase(BaseTestCase):
+    ''' Tests for the per-user response cache '''
+
+    def setUp(self):
+        super().setUp()
+        self.sign_in()
+
+    def get_categories(self, headers=None):
+        return self.client().get('/api/v1/categories/',
+                                 headers=headers or self.headers)
+
+    def check_cache(self):
+        ''' Runs a miss, a hit and an invalidating write '''
+        res = self.get_categories()
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        res = self.get_categories()
+        self.assertEqual(res.headers['X-Cache'], 'HIT')
+        self.assertEqual(res.content_type, 'application/json')
+        self.assertMaxQueries(res, 0)
+        self.assertEqual(len(json.loads(res.data)['categories']), 1)
+
+        self.client().post('/api/v1/categories/', headers=self.headers,
+                           data=self.category1)
+        res = self.get_categories()
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(json.loads(res.data)['categories']), 2)
+
+    def test_memory_cache(self):
+        ''' Test that the LRU serves repeated reads until the user writes '''
+        self.check_cache()
+
+    def test_redis_cache(self):
+        ''' Test the Redis backend against a fake client '''
+        self.app.extensions['response_cache'] = RedisBackend(FakeRedis())
+        self.check_cache()
+
+    def test_users_are_cached_apart(self):
+        ''' Test that users neither share nor invalidate entries '''
+        self.get_categories()
+        self.client().post('/api/v1/auth/register/', data={
+            "username": "other", "password": "password",
+            "email": "other@email.com"})
+        token = json.loads(self.client().post('/api/v1/auth/login/', data={
+            "username": "other", "password": "password"}).data)['access_token']
+        other = dict(Authorization="Bearer " + token)
+        res = self.get_categories(other)
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        self.client().post('/api/v1/categories/', headers=other,
+                           data=self.category1)
+        self.assertEqual(self.get_categories().headers['X-Cache'], 'HIT')
+
+    def test_cached_etag_gets_not_modified(self):
+        ''' Test that a hit with a matching ETag is a 304 '''
+        etag = self.get_categories().headers['ETag']
+        res = self.client().get('/api/v1/categories/', headers=dict(
+            self.headers, **{'If-None-Match': etag}))
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['X-Cache'], 'HIT')
+
+    def test_memory_backend_bounds(self):
+        ''' Test that the LRU evicts the oldest entry and expired ones '''
+        backend = MemoryBackend(2)
+        backend.set('a', '1', 60)
+        backend.set('b', '2', 60)
+        backend.get('a')
+        backend.set('c', '3', 60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), '1')
+        backend.set('d', '4', -1)
+        self.assertIsNone(backend.get('d'))
+
+    def test_cache_stats(self):
+        ''' Test that admins can read the hits and misses '''
+        self.get_categories()
+        self.get_categories()
+        with self.app.app_context():
+            User.query.update({'is_admin': True})
+            db.session.commit()
+        res = self.client().get('/api/v1/admin/cache/', headers=self.headers)
+        self.assertEqual(json.loads(res.data), {
+            'backend': 'memory', 'hits': 1, 'misses': 1, 'hit_rate': 0.5})
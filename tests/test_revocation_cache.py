@@ -0,0 +1,63 @@
+''' This script tests the revocation cache in front of the blacklist '''
+
+import os
+import tempfile
+from unittest import mock
+
+from app import db, revocation_cache
+from app.models.blacklist import Blacklist, BlacklistGeneration
+from app.revocation_cache import BloomFile
+from tests.test_base import BaseTestCase
+
+
+class RevocationCacheTestCase(BaseTestCase):
+    ''' Tests for the Bloom filter of revoked tokens '''
+
+    def test_bloom_file_is_shared(self):
+        ''' Test that bits set through one mapping are seen by another '''
+        path = os.path.join(tempfile.mkdtemp(), 'revoked.bloom')
+        writer = BloomFile(path, 1024, 3)
+        writer.lock()
+        writer.add('some-jti')
+        writer.unlock()
+        reader = BloomFile(path, 1024, 3)
+        self.assertIn('some-jti', reader)
+        self.assertNotIn('another-jti', reader)
+
+    def test_unrevoked_token_skips_db(self):
+        ''' Test that a token missing from the filter isn't looked up '''
+        with self.app.app_context():
+            revocation_cache.refresh(force=True)
+            with mock.patch.object(Blacklist, 'query') as query:
+                self.assertFalse(revocation_cache.is_revoked('unknown-jti'))
+                self.assertFalse(query.filter_by.called)
+
+    def test_refresh_picks_up_other_nodes(self):
+        ''' Test that tokens blacklisted elsewhere are added on refresh '''
+        with self.app.app_context():
+            revocation_cache.refresh(force=True)
+            db.session.add(Blacklist('remote-jti'))
+            db.session.commit()
+            revocation_cache.refresh(force=True)
+            self.assertTrue(revocation_cache.is_revoked('remote-jti'))
+
+    def test_purge_elsewhere_rebuilds_filter(self):
+        ''' Test that the filter is cleared and reloaded once another node
+            purged the blacklisted table
+        '''
+        path = os.path.join(tempfile.mkdtemp(), 'revoked.bloom')
+        bloom = BloomFile(path, 1024, 3)
+        self.app.extensions['revocation_cache']['filter'] = bloom
+        with self.app.app_context():
+            db.session.add_all([Blacklist('purged-jti'),
+                                Blacklist('kept-jti')])
+            db.session.commit()
+            revocation_cache.refresh(force=True)
+            self.assertIn('purged-jti', bloom)
+
+            Blacklist.query.filter_by(token='purged-jti').delete()
+            BlacklistGeneration.bump()
+            revocation_cache.refresh(force=True)
+            self.assertNotIn('purged-jti', bloom)
+            self.assertIn('kept-jti', bloom)
+            self.assertEqual(bloom.generation, 1)
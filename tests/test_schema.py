@@ -0,0 +1,55 @@
+''' This script tests the schema upgrades and the query plan report '''
+
+import json
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import DDL
+
+from app import db
+from app.explain import explain_endpoints, full_scan
+from app.schema import create_missing_indexes
+from app.search import include_object
+from tests.test_base import BaseTestCase
+
+
+class SchemaTestCase(BaseTestCase):
+    ''' Tests for the index upgrade and manage.py explain '''
+
+    # these commit through the engine
+    rollback = False
+
+    def test_missing_indexes_are_created(self):
+        ''' Test that an index dropped from the database is created again '''
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(DDL(
+                    'DROP INDEX ix_categories_created_by_category_name'))
+                self.assertEqual(create_missing_indexes(connection),
+                                 ['ix_categories_created_by_category_name'])
+                self.assertEqual(create_missing_indexes(connection), [])
+
+    def test_migrations_leave_search_index_alone(self):
+        ''' Test that an autogenerated migration doesn't drop the search
+            index, which isn't in the models
+        '''
+        with self.app.app_context():
+            with db.engine.connect() as connection:
+                context = MigrationContext.configure(
+                    connection, opts={'include_object': include_object})
+                self.assertEqual(compare_metadata(context, db.metadata), [])
+
+    def test_endpoint_queries_use_indexes(self):
+        ''' Test that no query of the endpoints reads a whole table '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        category_id = json.loads(self.create_category().data)['category_id']
+        self.client().post(f'/api/v1/recipes/{category_id}/',
+                           headers=dict(Authorization="Bearer " + token),
+                           data=self.recipe)
+        with self.app.app_context():
+            report = explain_endpoints()
+        self.assertEqual(len(report), 12)
+        self.assertEqual([name for name, _, scans in report if scans], [])
+        self.assertTrue(full_scan('SCAN recipes', 'sqlite'))
+        self.assertFalse(full_scan('SCAN anon_1', 'sqlite'))
@@ -0,0 +1,83 @@
+''' This script tests the synthetic data seeding '''
+
+import json
+from unittest import mock
+
+from app.counters import rebuild_counters
+from app.ingredients import parse_ingredients
+from app.models.category import Category
+from app.models.recipe import Recipe
+from app.models.user import User
+from app.seed import INGREDIENTS, generate, seed
+from app.validation_helper import name_validator
+from tests.test_base import BaseTestCase
+
+
+class SeedTestCase(BaseTestCase):
+    ''' Tests for manage.py seed '''
+
+    # these commit through the engine
+    rollback = False
+
+    def test_seeded_rows_are_consistent(self):
+        ''' Test that seeded rows are valid, counted and indexed '''
+        with self.app.app_context():
+            self.assertEqual(seed(3, 30, 4, seed_value=7), (3, 90, 360))
+            counts = [(user.category_count, user.recipe_count)
+                      for user in User.query.order_by(User.user_id)]
+            rebuild_counters()
+            self.assertEqual(counts, [(user.category_count,
+                                       user.recipe_count) for user in
+                                      User.query.order_by(User.user_id)])
+            for a_category in Category.query:
+                self.assertTrue(name_validator(a_category.category_name))
+                self.assertEqual(a_category.recipe_count, 4)
+            for a_recipe in Recipe.query:
+                self.assertTrue(name_validator(a_recipe.recipe_name))
+                self.assertEqual(
+                    sorted(item.name for item in a_recipe.ingredient_items),
+                    parse_ingredients(a_recipe.ingredients))
+            a_recipe = Recipe.query.filter_by(created_by=1).first()
+
+        token = json.loads(self.client().post('/api/v1/auth/login/', data={
+            'username': 'user1', 'password': 'password'}).data)['access_token']
+        res = self.client().get(
+            f'/api/v1/recipes/{a_recipe.category_id}/?q='
+            f'{a_recipe.recipe_name.split()[-1]}',
+            headers=dict(Authorization="Bearer " + token))
+        self.assertIn(a_recipe.recipe_name, [
+            found['recipe_name'] for found in json.loads(res.data)['recipes']])
+
+    def test_same_seed_same_rows(self):
+        ''' Test that the rows only depend on the seed value '''
+        ids = {name: number for number, name in enumerate(INGREDIENTS)}
+
+        def rows(seed_value):
+            return list(generate(150, 2, 3, seed_value, (0, 0, 0), ids,
+                                 'hash', 'now'))
+
+        self.assertEqual(rows(1), rows(1))
+        self.assertNotEqual(rows(1), rows(2))
+
+    def test_failed_seed_resumes_search_index(self):
+        ''' Test that recipes are still indexed for search after a seed
+            failed half way
+        '''
+        with self.app.app_context():
+            with mock.patch('app.seed.execute_rows',
+                            side_effect=RuntimeError('disk full')):
+                with self.assertRaises(RuntimeError):
+                    seed(1, 1, 1)
+
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        headers = dict(Authorization="Bearer " + token)
+        category_id = json.loads(self.create_category().data)['category_id']
+        self.client().post(f'/api/v1/recipes/{category_id}/',
+                           headers=headers,
+                           data={'recipe_name': 'lentil soup',
+                                 'ingredients': 'lentils, water'})
+        res = self.client().get(f'/api/v1/recipes/{category_id}/?q=lentil',
+                                headers=headers)
+        self.assertEqual([found['recipe_name'] for found in
+                          json.loads(res.data)['recipes']], ['lentil soup'])
@@ -0,0 +1,69 @@
+''' This script tests that the fast serializers match the ModelSchemas '''
+
+import json
+
+from app import db
+from app.models.category import Category
+from app.models.recipe import Recipe
+from app.models.user import User
+from app.serializers import (
+    CategorySchema, RecipeSchema, UserSchema, category_serializer,
+    recipe_serializer, user_serializer)
+from tests.test_base import BaseTestCase
+
+
+class SerializerTestCase(BaseTestCase):
+    ''' Tests for the fast serialization path '''
+
+    def test_fast_serializers_match_schemas(self):
+        ''' Test that each model dumps the same with both serializers '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        category_id = json.loads(self.create_category().data)['category_id']
+        for recipe_name in ('soup', 'stew'):
+            self.client().post(
+                f'/api/v1/recipes/{category_id}/',
+                headers=dict(Authorization="Bearer " + token),
+                data={"recipe_name": recipe_name, "ingredients": "water"})
+
+        with self.app.app_context():
+            a_user = User.query.first()
+            a_category = Category.query.first()
+            the_recipes = Recipe.query.all()
+            self.assertEqual(user_serializer.dump(a_user),
+                             UserSchema().dump(a_user).data)
+            self.assertEqual(category_serializer.dump(a_category),
+                             CategorySchema().dump(a_category).data)
+            self.assertEqual(recipe_serializer.dump_many(the_recipes),
+                             RecipeSchema(many=True).dump(the_recipes).data)
+            only = ['category_id', 'recipe_count']
+            self.assertEqual(category_serializer.dump(a_category, only),
+                             CategorySchema(only=only).dump(a_category).data)
+
+    def test_responses_are_the_same_without_fast_json(self):
+        ''' Test that both JSON encoders give the same response body '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        self.create_category()
+        headers = dict(Authorization="Bearer " + token)
+        fast = self.client().get('/api/v1/categories/', headers=headers)
+        self.app.config['FAST_JSON'] = False
+        plain = self.client().get('/api/v1/categories/', headers=headers)
+        self.assertEqual(fast.content_type, plain.content_type)
+        self.assertEqual(json.loads(fast.data), json.loads(plain.data))
+
+    def test_new_recipe_dates_are_serialized(self):
+        ''' Test that datetimes are dumped as strings, not epoch numbers '''
+        self.user_registration()
+        token = json.loads(self.user_login().data)['access_token']
+        category_id = json.loads(self.create_category().data)['category_id']
+        recipe_id = json.loads(self.client().post(
+            f'/api/v1/recipes/{category_id}/',
+            headers=dict(Authorization="Bearer " + token),
+            data=self.recipe).data)['recipe_id']
+        res = self.client().get(f'/api/v1/recipes/{category_id}/{recipe_id}/',
+                                headers=dict(Authorization="Bearer " + token))
+        with self.app.app_context():
+            expected = RecipeSchema().dump(
+                db.session.query(Recipe).get(recipe_id)).data
+        self.assertEqual(json.loads(res.data), expected)
@@ -0,0 +1,98 @@
+''' This script tests exporting recipe books '''
+
+import csv
+import gzip
+import io
+import json
+
+from tests.test_base import BaseTestCase
+
+
+class TransferTestCase(BaseTestCase):
+    ''' Tests for streaming a user's categories and recipes out '''
+
+    def setUp(self):
+        super().setUp()
+        category_id = self.sign_in()
+        self.client().post(f'/api/v1/recipes/{category_id}/',
+                           headers=self.headers, data=self.recipe)
+        self.client().post('/api/v1/categories/', headers=self.headers,
+                           data=self.category1)
+
+    def export(self, query='', **headers):
+        return self.client().get(f'/api/v1/transfer/export/{query}',
+                                 headers=dict(self.headers, **headers))
+
+    def test_export_ndjson(self):
+        ''' Test that categories come before the recipes naming them '''
+        res = self.export()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        records = [json.loads(line) for line in
+                   res.get_data(as_text=True).splitlines()]
+        self.assertEqual([record['type'] for record in records],
+                         ['category', 'category', 'recipe'])
+        self.assertEqual(records[1]['category_name'], 'category one')
+        self.assertEqual(records[2]['category_name'], 'category')
+        self.assertEqual(records[2]['recipe_name'], 'recipe')
+
+    def test_export_csv_gzipped(self):
+        ''' Test that the CSV is compressed when the client accepts gzip '''
+        res = self.export('?format=csv', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        text = gzip.decompress(res.data).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2]['ingredients'], 'description')
+        self.assertEqual(self.export('?format=csv').headers.get(
+            'Content-Encoding'), None)
+
+    def send_import(self, lines, headers=None):
+        body = '\n'.join(line if isinstance(line, str) else json.dumps(line)
+                         for line in lines)
+        res = self.client().post('/api/v1/transfer/import/',
+                                 headers=headers or self.headers, data=body,
+                                 content_type='application/x-ndjson')
+        return [json.loads(line) for line in
+                res.get_data(as_text=True).splitlines()]
+
+    def test_import_resolves_categories_by_name(self):
+        ''' Test that recipes can use categories from earlier batches and
+            that bad lines are reported without stopping the import
+        '''
+        self.app.config['IMPORT_BATCH_SIZE'] = 2
+        reports = self.send_import([
+            {'type': 'category', 'category_name': 'soups'},
+            'not json',
+            {'type': 'recipe', 'category_name': 'soups',
+             'recipe_name': 'broth', 'ingredients': 'water, bones'},
+            {'type': 'recipe', 'category_name': 'category',
+             'recipe_name': 'recipe', 'ingredients': 'again'},
+            {'type': 'recipe', 'category_name': 'missing',
+             'recipe_name': 'stew'},
+            {'type': 'category', 'category_name': 'category'}])
+        self.assertEqual(
+            [(report['line'], report['status']) for report in reports],
+            [(1, 'created'), (2, 'invalid'), (3, 'created'),
+             (4, 'conflict'), (5, 'invalid'), (6, 'conflict')])
+
+        pantry = json.loads(self.client().get(
+            '/api/v1/recipes/pantry/?ingredients=bones',
+            headers=self.headers).data)
+        self.assertEqual(pantry['recipes'][0]['recipe_name'], 'broth')
+        categories = json.loads(self.client().get(
+            '/api/v1/categories/', headers=self.headers).data)
+        self.assertEqual(len(categories['categories']), 3)
+
+    def test_export_imports_into_another_account(self):
+        ''' Test that an export can be imported as it is '''
+        lines = self.export().get_data(as_text=True).splitlines()
+        self.client().post('/api/v1/auth/register/', data={
+            "username": "other", "password": "password",
+            "email": "other@email.com"})
+        token = json.loads(self.client().post('/api/v1/auth/login/', data={
+            "username": "other", "password": "password"}).data)['access_token']
+        reports = self.send_import(
+            lines, headers=dict(Authorization="Bearer " + token))
+        self.assertEqual([report['status'] for report in reports],
+                         ['created'] * 3)